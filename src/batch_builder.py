@@ -0,0 +1,255 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from dotenv import load_dotenv
+
+import pymupdf
+
+from catalog_database import connect_catalog_database, write_model_catalog
+from multi_model_catalog import merge_model_catalogs
+from page_table_cache import PageTableCache, evict_documents
+from pdf_command_builder import (
+    LOG_FORMAT,
+    LOG_LEVELS,
+    ScanOptions,
+    build_command_catalog,
+    derive_model_name,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_command_line_args(env_filepath: str = ".env"):
+    load_dotenv(env_filepath)
+    parser = argparse.ArgumentParser(
+        description="Extracts command information from a batch of PDF manuals, and merges it into a single multi-model JSON catalog."
+    )
+    parser.add_argument(
+        "inputs",
+        type=str,
+        nargs="+",
+        help="Directories of PDF manuals, or glob patterns matching them.",
+    )
+    parser.add_argument(
+        "--output-file-path",
+        type=str,
+        help="The JSON file or SQLite database to output the merged catalog to.",
+        default=os.environ.get("OUTPUT_FILE_PATH") or "catalog.json",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=["json", "sqlite"],
+        help="json writes the merged multi-model catalog, sqlite stores every model in an indexed catalog database.",
+        default="json",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of manuals to process at the same time.",
+        default=os.cpu_count() or 1,
+    )
+    parser.add_argument(
+        "--no-prefilter",
+        action="store_true",
+        help="Run table detection on every page, instead of only pages whose text holds the command table headings.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="The directory to cache the raw table detection output of each page in.",
+        default=os.environ.get("CACHE_DIR") or ".page_table_cache",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither read from nor write to the page table cache.",
+    )
+    parser.add_argument(
+        "--cache-max-size-mb",
+        type=int,
+        help="The size the cache gets trimmed back to, evicting the least recently used manuals first.",
+        default=512,
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        choices=LOG_LEVELS,
+        help="DEBUG also logs every table, command and variable as it gets parsed.",
+        default="INFO",
+    )
+    return parser.parse_args()
+
+
+def find_manuals(inputs: list[str]) -> list[str]:
+    # Directories contribute the PDFs directly inside them, anything else is treated as a glob pattern
+    pdf_file_paths = []
+    for manual_input in inputs:
+        if os.path.isdir(manual_input):
+            matches = [
+                os.path.join(manual_input, file_name)
+                for file_name in os.listdir(manual_input)
+                if file_name.lower().endswith(".pdf")
+            ]
+        else:
+            matches = glob.glob(manual_input)
+        if not matches:
+            logger.warning("No manuals found for %s", manual_input)
+        for pdf_file_path in sorted(matches):
+            if pdf_file_path not in pdf_file_paths:
+                pdf_file_paths.append(pdf_file_path)
+    return pdf_file_paths
+
+
+def _configure_worker_logging(log_level: str) -> None:
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+
+
+def build_manual_catalog(
+    pdf_file_path: str,
+    output_file_path: str,
+    scan_options: ScanOptions,
+    cache_dir: str | None,
+    cache_max_size_bytes: int,
+) -> tuple[str, dict, str | None]:
+    # Runs in a worker process. Each manual is scanned serially, since the manuals are already spread across
+    # the workers. Cache eviction is left to the parent, so workers never evict a manual another one is using:
+    # the key of the manual's cache entry is handed back for it to protect.
+    with pymupdf.open(pdf_file_path) as doc:
+        model_name = derive_model_name(doc)
+        cache = None
+        if cache_dir is not None:
+            cache = PageTableCache(cache_dir, pdf_file_path, cache_max_size_bytes)
+        scan_summary = build_command_catalog(
+            doc, output_file_path, "json", scan_options, cache, model_name=model_name
+        )
+    return (
+        model_name,
+        asdict(scan_summary),
+        None if cache is None else cache.document_key,
+    )
+
+
+def build_batch_catalog(
+    pdf_file_paths: list[str],
+    output_file_path: str,
+    workers: int,
+    scan_options: ScanOptions = ScanOptions(),
+    cache_dir: str | None = None,
+    cache_max_size_bytes: int = 512 * 1024 * 1024,
+    log_level: str = "INFO",
+    output_format: str = "json",
+) -> list[str]:
+    # Returns the manuals that failed to process
+    work_dir = tempfile.mkdtemp(prefix="batch_builder-")
+    manual_results: dict[str, tuple[str, str]] = {}
+    processed_document_keys: set[str] = set()
+    failed_pdf_file_paths = []
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max(1, min(workers, len(pdf_file_paths))),
+            initializer=_configure_worker_logging,
+            initargs=(log_level,),
+        ) as executor:
+            futures = {}
+            for manual_index, pdf_file_path in enumerate(pdf_file_paths):
+                catalog_file_path = os.path.join(work_dir, f"{manual_index}.json")
+                future = executor.submit(
+                    build_manual_catalog,
+                    pdf_file_path,
+                    catalog_file_path,
+                    scan_options,
+                    cache_dir,
+                    cache_max_size_bytes,
+                )
+                futures[future] = (pdf_file_path, catalog_file_path)
+            for future in as_completed(futures):
+                pdf_file_path, catalog_file_path = futures[future]
+                try:
+                    model_name, scan_summary, document_key = future.result()
+                except Exception as e:
+                    logger.error("Could not process %s: %s", pdf_file_path, e)
+                    failed_pdf_file_paths.append(pdf_file_path)
+                    continue
+                logger.info(
+                    "Found %d commands for %s in %s",
+                    scan_summary["commands_found"],
+                    model_name,
+                    pdf_file_path,
+                )
+                manual_results[pdf_file_path] = (model_name, catalog_file_path)
+                if document_key is not None:
+                    processed_document_keys.add(document_key)
+
+        # Merged in input order, so the catalog doesn't depend on which manual finished first
+        model_catalogs = {}
+        for pdf_file_path in pdf_file_paths:
+            if pdf_file_path not in manual_results:
+                continue
+            model_name, catalog_file_path = manual_results[pdf_file_path]
+            with open(catalog_file_path, "r", encoding="utf8") as f:
+                model_catalog = json.load(f)[model_name]
+            if model_name in model_catalogs:
+                unique_model_name = f"{model_name} ({os.path.basename(pdf_file_path)})"
+                logger.warning(
+                    "%s holds the same model as an earlier manual (%s), storing it as %s",
+                    pdf_file_path,
+                    model_name,
+                    unique_model_name,
+                )
+                model_name = unique_model_name
+            model_catalogs[model_name] = model_catalog
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if output_format == "sqlite":
+        logger.info("Writing %d models to %s...", len(model_catalogs), output_file_path)
+        connection = connect_catalog_database(output_file_path)
+        for model_name, model_catalog in model_catalogs.items():
+            write_model_catalog(connection, model_name, model_catalog)
+        connection.commit()
+        connection.close()
+    else:
+        merged_catalog = merge_model_catalogs(model_catalogs)
+        logger.info(
+            "Writing %d models with %d distinct command definitions to %s...",
+            len(merged_catalog["Models"]),
+            len(merged_catalog["Command Definitions"]),
+            output_file_path,
+        )
+        with open(output_file_path, "w", encoding="utf8") as f:
+            json.dump(merged_catalog, f, indent=4)
+    if cache_dir is not None and manual_results:
+        evict_documents(cache_dir, cache_max_size_bytes, processed_document_keys)
+    return failed_pdf_file_paths
+
+
+if __name__ == "__main__":
+    args = parse_command_line_args()
+    logging.basicConfig(level=args.log_level, format=LOG_FORMAT)
+    pdf_file_paths = find_manuals(args.inputs)
+    if not pdf_file_paths:
+        logger.error("No PDF manuals to process.")
+        exit(1)
+    logger.info(
+        "Processing %d manuals with %d workers...", len(pdf_file_paths), args.workers
+    )
+    failed_pdf_file_paths = build_batch_catalog(
+        pdf_file_paths,
+        args.output_file_path,
+        args.workers,
+        ScanOptions(use_prefilter=not args.no_prefilter),
+        None if args.no_cache else args.cache_dir,
+        args.cache_max_size_mb * 1024 * 1024,
+        args.log_level,
+        args.format,
+    )
+    if failed_pdf_file_paths:
+        exit(1)
@@ -0,0 +1,288 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from time import perf_counter
+from typing import Final
+
+import pymupdf
+
+from memory_usage import get_peak_rss_mb
+from pdf_command_builder import ScanOptions, build_command_catalog
+from page_table_cache import PageTableCache
+from synthetic_manual import generate_synthetic_manual
+
+logger = logging.getLogger(__name__)
+
+# serial      - one process, every page in the TOC ranges goes through table detection
+# prefilter   - one process, pages without the table headings skip table detection
+# workers-<N> - the prefiltered scan spread over N worker processes
+# warm-cache  - the prefiltered scan, with every page table already in the on-disk cache
+SERIAL_MODE: Final = "serial"
+PREFILTER_MODE: Final = "prefilter"
+WARM_CACHE_MODE: Final = "warm-cache"
+WORKERS_MODE_PREFIX: Final = "workers-"
+
+
+def build_benchmark_modes(worker_counts: list[int]) -> list[str]:
+    return (
+        [SERIAL_MODE, PREFILTER_MODE]
+        + [
+            f"{WORKERS_MODE_PREFIX}{workers}"
+            for workers in worker_counts
+            if workers > 1
+        ]
+        + [WARM_CACHE_MODE]
+    )
+
+
+def run_benchmark_once(pdf_file_path: str, mode: str, work_dir: str) -> dict:
+    # Runs a single build in this process, which is always a fresh one so peak RSS isn't inflated by earlier runs
+    scan_options = ScanOptions(use_prefilter=mode != SERIAL_MODE)
+    if mode.startswith(WORKERS_MODE_PREFIX):
+        scan_options = ScanOptions(workers=int(mode[len(WORKERS_MODE_PREFIX) :]))
+    cache = None
+    if mode == WARM_CACHE_MODE:
+        # Filled by the parent process before the timed runs
+        cache = PageTableCache(
+            os.path.join(work_dir, "cache"), pdf_file_path, 1024 * 1024 * 1024
+        )
+    doc = pymupdf.open(pdf_file_path)
+    start = perf_counter()
+    scan_summary = build_command_catalog(
+        doc, os.path.join(work_dir, f"{mode}.json"), "json", scan_options, cache
+    )
+    seconds = perf_counter() - start
+    peak_rss_mb, children_peak_rss_mb = get_peak_rss_mb()
+    return {
+        "seconds": seconds,
+        "pages_in_document": scan_summary.pages_in_document,
+        "pages_scanned": scan_summary.pages_scanned,
+        "pages_from_cache": scan_summary.pages_from_cache,
+        "commands_found": scan_summary.commands_found,
+        "peak_rss_mb": peak_rss_mb,
+        "children_peak_rss_mb": children_peak_rss_mb,
+    }
+
+
+def run_benchmark_subprocess(pdf_file_path: str, mode: str, work_dir: str) -> dict:
+    completed_process = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--run-once",
+            mode,
+            "--pdf-file-path",
+            pdf_file_path,
+            "--work-dir",
+            work_dir,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(completed_process.stdout)
+
+
+def summarize_runs(mode: str, runs: list[dict]) -> dict:
+    seconds = [run["seconds"] for run in runs]
+    median_seconds = statistics.median(seconds)
+    pages_in_document = runs[0]["pages_in_document"]
+    commands_found = runs[0]["commands_found"]
+    peak_rss = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+    children_peak_rss = [
+        run["children_peak_rss_mb"]
+        for run in runs
+        if run["children_peak_rss_mb"] is not None
+    ]
+    return {
+        "mode": mode,
+        "runs": len(runs),
+        "median_seconds": round(median_seconds, 4),
+        "min_seconds": round(min(seconds), 4),
+        "max_seconds": round(max(seconds), 4),
+        "pages_per_second": round(pages_in_document / median_seconds, 1),
+        "rows_per_second": round(commands_found / median_seconds, 1),
+        "pages_scanned": runs[0]["pages_scanned"],
+        "commands_found": commands_found,
+        "peak_rss_mb": round(max(peak_rss), 1) if peak_rss else None,
+        "children_peak_rss_mb": (
+            round(max(children_peak_rss), 1) if children_peak_rss else None
+        ),
+    }
+
+
+def obtain_synthetic_manual(
+    manual_dir: str, pages: int, categories: int, commands_per_category: int, seed: int
+) -> dict:
+    # The generator is deterministic, so a manual built with the same arguments is reused between benchmark runs
+    pdf_file_path = os.path.join(
+        manual_dir,
+        f"synthetic-{pages}p-{categories}c-{commands_per_category}r-{seed}s.pdf",
+    )
+    os.makedirs(manual_dir, exist_ok=True)
+    if not os.path.exists(pdf_file_path):
+        generate_synthetic_manual(
+            pdf_file_path, pages, categories, commands_per_category, seed=seed
+        )
+    return {
+        "pdf_file_path": pdf_file_path,
+        "pages": pages,
+        "categories": categories,
+        "commands_per_category": commands_per_category,
+        "expected_rows": categories * commands_per_category,
+        "seed": seed,
+    }
+
+
+def log_results_table(results: list[dict], baseline_results: dict[str, dict]) -> None:
+    logger.info(
+        "%-12s %10s %10s %12s %12s %10s %10s",
+        "mode",
+        "median s",
+        "min s",
+        "pages/s",
+        "rows/s",
+        "rss MB",
+        "vs base",
+    )
+    for result in results:
+        change = ""
+        if result["mode"] in baseline_results:
+            baseline_seconds = baseline_results[result["mode"]]["median_seconds"]
+            change = f"{(result['median_seconds'] / baseline_seconds - 1) * 100:+.1f}%"
+        peak_rss = [
+            value
+            for value in (result["peak_rss_mb"], result["children_peak_rss_mb"])
+            if value is not None
+        ]
+        logger.info(
+            "%-12s %10.3f %10.3f %12.1f %12.1f %10s %10s",
+            result["mode"],
+            result["median_seconds"],
+            result["min_seconds"],
+            result["pages_per_second"],
+            result["rows_per_second"],
+            f"{max(peak_rss):.1f}" if peak_rss else "n/a",
+            change,
+        )
+
+
+def parse_command_line_args():
+    parser = argparse.ArgumentParser(
+        description="Measures pdf_command_builder throughput and memory on a synthetic programmer manual."
+    )
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--commands-per-category", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="*",
+        default=[os.cpu_count() or 1],
+        help="Worker counts to benchmark the multi-process mode with (default: the CPU count).",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Runs per mode, the median is reported.",
+    )
+    parser.add_argument(
+        "--manual-dir",
+        type=str,
+        default=os.path.join(tempfile.gettempdir(), "synthetic_manuals"),
+        help="Where the generated manuals are kept between benchmark runs.",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Writes the results to this JSON file.",
+    )
+    parser.add_argument(
+        "--baseline-report",
+        type=str,
+        default=None,
+        help="A report from an earlier run (e.g. another commit), to compare the median times against.",
+    )
+    # Used internally, to run a single timed build in a fresh process
+    parser.add_argument("--run-once", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--pdf-file-path", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", type=str, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_command_line_args()
+    if args.run_once is not None:
+        logging.basicConfig(level=logging.WARNING)
+        print(
+            json.dumps(
+                run_benchmark_once(args.pdf_file_path, args.run_once, args.work_dir)
+            )
+        )
+        exit(0)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    manual = obtain_synthetic_manual(
+        args.manual_dir,
+        args.pages,
+        args.categories,
+        args.commands_per_category,
+        args.seed,
+    )
+    baseline_results = {}
+    if args.baseline_report is not None:
+        with open(args.baseline_report, "r", encoding="utf8") as f:
+            baseline_results = {
+                result["mode"]: result for result in json.load(f)["results"]
+            }
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="benchmark_builder-")
+    try:
+        for mode in build_benchmark_modes(args.workers):
+            if mode == WARM_CACHE_MODE:
+                # Untimed run that fills the cache
+                run_benchmark_subprocess(manual["pdf_file_path"], mode, work_dir)
+            logger.info("Benchmarking %s...", mode)
+            runs = [
+                run_benchmark_subprocess(manual["pdf_file_path"], mode, work_dir)
+                for _ in range(args.repeat)
+            ]
+            result = summarize_runs(mode, runs)
+            if result["commands_found"] != manual["expected_rows"]:
+                logger.warning(
+                    "%s found %d command rows, the manual has %d",
+                    mode,
+                    result["commands_found"],
+                    manual["expected_rows"],
+                )
+            results.append(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    log_results_table(results, baseline_results)
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "manual": manual,
+                    "environment": {
+                        "python": platform.python_version(),
+                        "pymupdf": pymupdf.VersionBind,
+                        "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=4,
+            )
+        logger.info("Wrote the benchmark report to %s", args.report)
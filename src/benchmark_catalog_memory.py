@@ -0,0 +1,128 @@
+import argparse
+import gc
+import json
+import os
+import tracemalloc
+
+from time import perf_counter
+from typing import Callable
+
+from dotenv import load_dotenv
+
+from catalog_database import read_all_catalog_models
+from compact_catalog import CompactCatalog, ColumnarCatalog
+
+
+def parse_command_line_args(env_filepath: str = ".env"):
+    load_dotenv(env_filepath)
+    parser = argparse.ArgumentParser(
+        description="Measures the memory a loaded catalog takes as nested dicts and lists, as a compact catalog and as a columnar catalog."
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="The catalog to load, JSON, NDJSON or SQLite.",
+        default=os.environ.get("OUTPUT_FILE_PATH") or "output.json",
+    )
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=1,
+        help="Load the catalog's models this many times over, under different names, like a station holding a family of similar models.",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Writes the results to this JSON file.",
+    )
+    return parser.parse_args()
+
+
+def load_catalog_copies(catalog_text: str, copies: int) -> dict:
+    # Every copy is parsed separately, so nothing is shared between them, as when each model was loaded on its own
+    catalog = {}
+    for copy in range(copies):
+        for model_name, model_catalog in json.loads(catalog_text).items():
+            catalog[f"{model_name}-{copy}" if copies > 1 else model_name] = (
+                model_catalog
+            )
+    return catalog
+
+
+def measure(build: Callable[[], object]) -> tuple[object, int, float]:
+    # Returns what build made, the bytes it still holds once it's done, and how long it took
+    gc.collect()
+    tracemalloc.start()
+    start = perf_counter()
+    result = build()
+    duration = perf_counter() - start
+    gc.collect()
+    retained_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained_bytes, duration
+
+
+def count_commands(catalog: dict) -> int:
+    return sum(
+        len(command_definitions)
+        for model_catalog in catalog.values()
+        for command_definitions in model_catalog["Detailed Commands"].values()
+    )
+
+
+if __name__ == "__main__":
+    args = parse_command_line_args()
+    # Catalogs are read as JSON text, whatever format they're stored in, so every representation starts from the
+    # same parse
+    catalog_text = json.dumps(read_all_catalog_models(args.catalog))
+    dict_catalog = load_catalog_copies(catalog_text, args.copies)
+    command_count = count_commands(dict_catalog)
+    results = []
+    for scenario, build in (
+        ("dicts", lambda: load_catalog_copies(catalog_text, args.copies)),
+        (
+            "compact",
+            lambda: CompactCatalog.from_catalog(
+                load_catalog_copies(catalog_text, args.copies)
+            ),
+        ),
+        (
+            "columnar",
+            lambda: ColumnarCatalog.from_catalog(
+                load_catalog_copies(catalog_text, args.copies)
+            ),
+        ),
+    ):
+        catalog, retained_bytes, duration = measure(build)
+        results.append(
+            {
+                "scenario": scenario,
+                "retained_mb": round(retained_bytes / (1024 * 1024), 3),
+                "bytes_per_command": round(retained_bytes / command_count, 1),
+                "build_ms": round(duration * 1000, 3),
+            }
+        )
+        del catalog
+    baseline_bytes = results[0]["bytes_per_command"]
+    print(f"{command_count} commands in {len(dict_catalog)} models")
+    print(
+        f"{'scenario':<10} {'retained MB':>12} {'bytes/command':>14} {'vs dicts':>9} {'build ms':>10}"
+    )
+    for result in results:
+        print(
+            f"{result['scenario']:<10} {result['retained_mb']:>12.3f} {result['bytes_per_command']:>14.1f} "
+            f"{baseline_bytes / result['bytes_per_command']:>8.1f}x {result['build_ms']:>10.1f}"
+        )
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "catalog": args.catalog,
+                    "copies": args.copies,
+                    "commands": command_count,
+                    "results": results,
+                },
+                f,
+                indent=4,
+            )
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import json
+import statistics
+import struct
+
+from time import perf_counter
+from typing import Callable, Final
+
+import numpy as np
+
+from response_decoder import decode_block_data, decode_number_list
+from scpi_transport import MESSAGE_TERMINATOR, ScpiConnection
+
+ASCII_WAVEFORM_QUERY: Final = ":WAVeform:DATA? ASCII"
+BLOCK_WAVEFORM_QUERY: Final = ":WAVeform:DATA? WORD"
+
+
+def generate_waveform(points: int) -> tuple[bytes, bytes]:
+    # A noisy sine wave, as the fixed width NR3 list and the big endian 16 bit block a scope would send for it
+    rng = np.random.default_rng(0)
+    volts = np.sin(np.linspace(0, 20 * np.pi, points)) + rng.normal(0, 0.01, points)
+    ascii_data = ",".join(f"{value:+.5E}" for value in volts).encode("ascii")
+    block_data = np.round(volts * 16000).astype(">i2").tobytes()
+    return ascii_data, block_data
+
+
+def decode_number_list_in_python(data: bytes) -> list[float]:
+    return [float(value) for value in data.split(b",")]
+
+
+def decode_block_in_python(data: bytes) -> tuple[int, ...]:
+    return struct.unpack(f">{len(data) // 2}h", data)
+
+
+def time_repeats(function: Callable[[], object], repeat: int) -> list[float]:
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        durations.append(perf_counter() - start)
+    return durations
+
+
+async def serve_waveforms(ascii_data: bytes, block_data: bytes) -> asyncio.Server:
+    # Answers the two waveform queries, so transfers go through ScpiConnection like they would from a scope
+    byte_count = str(len(block_data)).encode("ascii")
+    block_response = (
+        b"#" + str(len(byte_count)).encode("ascii") + byte_count + block_data
+    )
+
+    async def serve_connection(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        while line := await reader.readline():
+            if line.strip() == ASCII_WAVEFORM_QUERY.encode("ascii"):
+                writer.write(ascii_data + MESSAGE_TERMINATOR)
+            else:
+                writer.write(block_response + MESSAGE_TERMINATOR)
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(serve_connection, "127.0.0.1", 0)
+
+
+async def time_transfers(
+    ascii_data: bytes, block_data: bytes, repeat: int
+) -> dict[str, list[float]]:
+    server = await serve_waveforms(ascii_data, block_data)
+    port = server.sockets[0].getsockname()[1]
+    durations = {"ascii_transfer_decode": [], "block_transfer_decode": []}
+    async with ScpiConnection("127.0.0.1", port, timeout=60) as connection:
+        for _ in range(repeat):
+            start = perf_counter()
+            decode_number_list(await connection.query_raw(ASCII_WAVEFORM_QUERY))
+            durations["ascii_transfer_decode"].append(perf_counter() - start)
+            start = perf_counter()
+            decode_block_data(await connection.query_raw(BLOCK_WAVEFORM_QUERY), ">i2")
+            durations["block_transfer_decode"].append(perf_counter() - start)
+    server.close()
+    await server.wait_closed()
+    return durations
+
+
+def summarize(scenario: str, points: int, durations: list[float]) -> dict:
+    median = statistics.median(durations)
+    return {
+        "scenario": scenario,
+        "median_ms": round(median * 1000, 3),
+        "min_ms": round(min(durations) * 1000, 3),
+        "points_per_sec": round(points / median),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measures decoding of waveform responses: NR3 lists and 16 bit blocks, in pure Python and with NumPy, on their own and through a local TCP transfer."
+    )
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Writes the results to this JSON file.",
+    )
+    args = parser.parse_args()
+    ascii_data, block_data = generate_waveform(args.points)
+    expected = np.array(decode_number_list_in_python(ascii_data))
+    if not np.array_equal(decode_number_list(ascii_data), expected):
+        raise AssertionError("The NumPy NR3 decoding doesn't match float()")
+    results = [
+        summarize(
+            "ascii_python",
+            args.points,
+            time_repeats(lambda: decode_number_list_in_python(ascii_data), args.repeat),
+        ),
+        summarize(
+            "ascii_numpy",
+            args.points,
+            time_repeats(lambda: decode_number_list(ascii_data), args.repeat),
+        ),
+        summarize(
+            "block_python",
+            args.points,
+            time_repeats(lambda: decode_block_in_python(block_data), args.repeat),
+        ),
+        summarize(
+            "block_numpy",
+            args.points,
+            time_repeats(lambda: decode_block_data(block_data, ">i2"), args.repeat),
+        ),
+    ]
+    for scenario, durations in asyncio.run(
+        time_transfers(ascii_data, block_data, args.repeat)
+    ).items():
+        results.append(summarize(scenario, args.points, durations))
+    print(f"{'scenario':<24} {'median ms':>10} {'min ms':>10} {'points/s':>14}")
+    for result in results:
+        print(
+            f"{result['scenario']:<24} {result['median_ms']:>10.3f} {result['min_ms']:>10.3f} {result['points_per_sec']:>14,}"
+        )
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf8") as f:
+            json.dump({"points": args.points, "results": results}, f, indent=4)
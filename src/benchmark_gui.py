@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+
+from time import perf_counter
+from typing import Callable, Final
+
+# Clicks alternate between these rows, which are always on screen
+CLICKED_ROWS: Final = [0, 1, 2, 3]
+
+
+class SyntheticCatalogLoader:
+    # Serves generated command names from memory, with the same interface as CatalogLoader, so only the widgets
+    # get measured
+    def __init__(self, category_count: int, rows_per_category: int):
+        self.model_names = ["BENCH1000A"]
+        self.categories = [f":CATegory{index}" for index in range(category_count)]
+        self.names_by_category = {
+            category: [
+                f"{category}:MNEMonic{index} <value>"
+                for index in range(rows_per_category)
+            ]
+            for category in self.categories
+        }
+
+    def request_categories(self, callback: Callable[[list[str]], None]) -> None:
+        callback(self.categories)
+
+    def request_names(
+        self, send_mode: str, category: str, callback: Callable[[list[str]], None]
+    ) -> None:
+        callback(self.names_by_category[category])
+
+
+def summarize_latencies(scenario: str, latencies: list[float]) -> dict:
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "scenario": scenario,
+        "clicks": len(latencies_ms),
+        "median_ms": round(statistics.median(latencies_ms), 3),
+        "p95_ms": round(latencies_ms[int(len(latencies_ms) * 0.95) - 1], 3),
+        "max_ms": round(latencies_ms[-1], 3),
+    }
+
+
+def run_gui_benchmark(category_count: int, rows: int, clicks: int) -> list[dict]:
+    # Kivy reads its configuration when it's first imported, so it's only imported once the environment is set
+    from kivy.config import Config
+
+    # Frames are drawn as fast as possible, instead of being capped at 60 per second
+    Config.set("graphics", "maxfps", "0")
+    from kivy.base import EventLoop
+    from kivy.core.window import Window
+
+    from main_gui import RV, ColumnDetails, ColumnedBoxLayout
+
+    EventLoop.ensure_window()
+    columned_box_layout = ColumnedBoxLayout(
+        orientation="horizontal",
+        column_text_data=ColumnDetails(
+            catalog_loader=SyntheticCatalogLoader(category_count, rows),
+            command_type_picker=["Query", "Command"],
+        ),
+    )
+    first_column = RV(column_index=0, column_data=["Query", "Command"])
+    columned_box_layout.add_widget(first_column)
+    columned_box_layout.enable_columns[0] = first_column
+    Window.add_widget(columned_box_layout)
+    EventLoop.idle()
+
+    def click(column_index: int, row_index: int) -> float:
+        # Click to the end of the next frame, which includes any layout and view refreshes the click caused
+        column = columned_box_layout.enable_columns[column_index]
+        view = column.view_adapter.get_visible_view(row_index)
+        start = perf_counter()
+        view.dispatch("on_release")
+        EventLoop.idle()
+        return perf_counter() - start
+
+    # Opens all three columns, so every scenario starts from a full layout
+    click(0, 0)
+    click(1, 0)
+    results = []
+    # Selecting a command in the last column only changes the selection
+    results.append(
+        summarize_latencies(
+            "select_command",
+            [
+                click(2, CLICKED_ROWS[index % len(CLICKED_ROWS)])
+                for index in range(clicks)
+            ],
+        )
+    )
+    # Picking another category swaps the last column for a column of `rows` commands
+    results.append(
+        summarize_latencies(
+            "switch_category",
+            [
+                click(1, CLICKED_ROWS[(index + 1) % len(CLICKED_ROWS)])
+                for index in range(clicks)
+            ],
+        )
+    )
+    # Picking Query or Command closes the command column and swaps the category column
+    latencies = []
+    for index in range(clicks):
+        latencies.append(click(0, (index + 1) % 2))
+        click(1, 0)
+    results.append(summarize_latencies("switch_mode", latencies))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measures click to render latency of the GUI columns, in a headless Kivy window."
+    )
+    parser.add_argument("--rows", type=int, default=5000, help="Commands per category.")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--clicks", type=int, default=200, help="Clicks per scenario.")
+    parser.add_argument(
+        "--show",
+        action="store_true",
+        help="Show the window, instead of rendering offscreen.",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Writes the results to this JSON file.",
+    )
+    args = parser.parse_args()
+    if not args.show:
+        # Machines without a GPU can also set KIVY_GL_BACKEND=mock, which skips the drawing itself
+        os.environ.setdefault("SDL_VIDEODRIVER", "offscreen")
+    os.environ["KIVY_NO_ARGS"] = "1"
+    os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+    results = run_gui_benchmark(args.categories, args.rows, args.clicks)
+    print(f"{'scenario':<16} {'median ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for result in results:
+        print(
+            f"{result['scenario']:<16} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['max_ms']:>10.3f}"
+        )
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf8") as f:
+            json.dump(
+                {"rows": args.rows, "categories": args.categories, "results": results},
+                f,
+                indent=4,
+            )
+    sys.exit(0)
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Final
+
+from gui_catalog import SNAPSHOT_FILE_SUFFIX
+
+SOURCE_DIR: Final = os.path.dirname(os.path.abspath(__file__))
+# Runs the GUI in a child process, printing a timestamp at each milestone, and quitting once it reached them all
+STARTUP_SCRIPT: Final = """
+import sys
+import time
+
+catalog_file_path = sys.argv[1]
+import main_gui
+
+print("imported", time.time(), flush=True)
+from kivy.clock import Clock
+from kivy.core.window import Window
+
+app = main_gui.MyApp(catalog_file_path=catalog_file_path)
+pending = {"first_frame", "catalog_ready", "search_ready"}
+
+
+def reach(milestone):
+    print(milestone, time.time(), flush=True)
+    pending.discard(milestone)
+    if not pending:
+        Clock.schedule_once(lambda dt: app.stop())
+
+
+def on_start(*_):
+    app.catalog_loader.request_categories(lambda categories: reach("catalog_ready"))
+    app.catalog_loader.request_search_index(lambda search_index: reach("search_ready"))
+
+
+def on_first_frame(*_):
+    Window.unbind(on_flip=on_first_frame)
+    reach("first_frame")
+
+
+app.bind(on_start=on_start)
+Window.bind(on_flip=on_first_frame)
+app.run()
+"""
+MILESTONES: Final = ["imported", "first_frame", "catalog_ready", "search_ready"]
+
+
+def get_gui_environment() -> dict[str, str]:
+    environment = dict(os.environ)
+    environment.setdefault("SDL_VIDEODRIVER", "offscreen")
+    environment["KIVY_NO_ARGS"] = "1"
+    environment.setdefault("KIVY_NO_CONSOLELOG", "1")
+    return environment
+
+
+def time_startup(catalog_file_path: str, use_snapshot: bool) -> dict[str, float]:
+    # Seconds from launching the interpreter to each milestone. Without the snapshot, the GUI reads the catalog
+    # itself and builds the snapshot, as it does the first time it opens a catalog. That removes the snapshot next
+    # to the catalog, so this is only run on a copy.
+    snapshot_file_path = catalog_file_path + SNAPSHOT_FILE_SUFFIX
+    if not use_snapshot and os.path.exists(snapshot_file_path):
+        os.remove(snapshot_file_path)
+    start = time.time()
+    process = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, catalog_file_path],
+        cwd=SOURCE_DIR,
+        env=get_gui_environment(),
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    milestones = {}
+    for line in process.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] in MILESTONES:
+            milestones[parts[0]] = float(parts[1]) - start
+    if process.returncode != 0 or "first_frame" not in milestones:
+        raise RuntimeError(f"The GUI didn't start:\n{process.stderr[-2000:]}")
+    return milestones
+
+
+def get_import_times(module_name: str, top: int) -> list[dict]:
+    # -X importtime writes "import time: <self us> | <cumulative us> | <indented package>" for every import. The
+    # packages the module pulls in directly are the ones indented one level past it.
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=SOURCE_DIR,
+        env=get_gui_environment(),
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    import_times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, package = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        indent = len(package) - len(package.lstrip()) - 1
+        import_times.append(
+            {
+                "package": package.strip(),
+                "indent": indent,
+                "cumulative_ms": int(cumulative) / 1000,
+            }
+        )
+    total = next(
+        (
+            entry
+            for entry in import_times
+            if entry["package"] == module_name and entry["indent"] == 0
+        ),
+        None,
+    )
+    direct_imports = [entry for entry in import_times if entry["indent"] in (0, 2)]
+    direct_imports.sort(key=lambda entry: entry["cumulative_ms"], reverse=True)
+    return ([total] if total else []) + [
+        entry for entry in direct_imports if entry is not total
+    ][:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measures how long the GUI takes to start: the import time of each package it pulls in, and the time from launch to its first frame and to its catalog being ready."
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default=os.path.join(SOURCE_DIR, "..", "output.db"),
+        help="The catalog the GUI opens.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--top", type=int, default=12, help="The number of slowest imports to list."
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Writes the results to this JSON file.",
+    )
+    args = parser.parse_args()
+    import_times = get_import_times("main_gui", args.top)
+    print(f"{'import':<40} {'cumulative ms':>14}")
+    for entry in import_times:
+        print(f"{entry['package']:<40} {entry['cumulative_ms']:>14.1f}")
+    results = {}
+    # The runs work on a copy of the catalog, so the snapshot the GUI keeps next to the real one is left alone
+    with tempfile.TemporaryDirectory(prefix="benchmark_gui_startup-") as temporary_dir:
+        catalog_file_path = os.path.join(temporary_dir, os.path.basename(args.catalog))
+        shutil.copyfile(args.catalog, catalog_file_path)
+        # The run without the snapshot leaves one behind for the runs with it
+        for scenario, use_snapshot in (
+            ("without snapshot", False),
+            ("with snapshot", True),
+        ):
+            runs = [
+                time_startup(catalog_file_path, use_snapshot)
+                for _ in range(args.repeat)
+            ]
+            results[scenario] = {
+                milestone: round(
+                    statistics.median(run[milestone] for run in runs) * 1000, 1
+                )
+                for milestone in MILESTONES
+                if all(milestone in run for run in runs)
+            }
+    print(f"{'milestone':<16} " + " ".join(f"{scenario:>18}" for scenario in results))
+    for milestone in MILESTONES:
+        print(
+            f"{milestone:<16} "
+            + " ".join(
+                f"{scenario_results.get(milestone, float('nan')):>15.1f} ms"
+                for scenario_results in results.values()
+            )
+        )
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "catalog": args.catalog,
+                    "imports": import_times,
+                    "startup_ms": results,
+                },
+                f,
+                indent=4,
+            )
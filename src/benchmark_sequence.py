@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+
+from dataclasses import asdict
+from time import perf_counter
+
+from dotenv import load_dotenv
+
+from benchmark_transport import start_simulated_scope
+from catalog_database import read_catalog_file
+from command_details import ReturnElement
+from command_validator import CommandValidator, CompiledCommand, get_sample_values
+from sequence_compiler import (
+    DEFAULT_MAX_MESSAGE_BYTES,
+    CompiledSequence,
+    SequenceCompiler,
+    run_compiled_sequence,
+    run_script,
+)
+from scpi_transport import ScpiConnection
+
+
+def parse_command_line_args(env_filepath: str = ".env"):
+    load_dotenv(env_filepath)
+    parser = argparse.ArgumentParser(
+        description="Runs a generated setup script against a simulated instrument, one unit at a time and compiled into batched program messages, and compares them."
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="The catalog the script is generated from and the instrument answers from.",
+        default=os.environ.get("OUTPUT_FILE_PATH") or "output.json",
+    )
+    parser.add_argument("--model-name", type=str, default=None)
+    parser.add_argument(
+        "--channels",
+        type=int,
+        default=2,
+        help="The numeric suffix values every per-channel setting gets written for.",
+    )
+    parser.add_argument(
+        "--max-message-bytes", type=int, default=DEFAULT_MAX_MESSAGE_BYTES
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=1.0,
+        help="The simulated network round trip of the instrument.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Writes the results to this JSON file.",
+    )
+    return parser.parse_args()
+
+
+def get_other_sample_values(compiled_command: CompiledCommand) -> dict[str, object]:
+    # Valid values that differ from get_sample_values where the variable allows it
+    values = get_sample_values(compiled_command)
+    for variable in compiled_command.parameters:
+        if variable.value_type == ReturnElement.ENUM_FORMAT.value:
+            if len(variable.spellings) > 1:
+                values[variable.name] = max(variable.spellings)
+        elif variable.value_type in (
+            ReturnElement.NR1_FORMAT.value,
+            ReturnElement.NR3_FORMAT.value,
+        ):
+            values[variable.name] = 2
+    return values
+
+
+def generate_setup_script(model_catalog: dict, channels: int) -> list[str]:
+    # A reset, every setting written twice (setup scripts often re-apply the same defaults), every setting read
+    # back, and then a change and read back of each setting, which needs a sync point every time
+    command_validator = CommandValidator(model_catalog)
+    writes = []
+    changes = []
+    queries = []
+    for command_definitions in model_catalog["Detailed Commands"].values():
+        for command_definition in command_definitions:
+            command_name = command_definition["command_name"]
+            query_name = command_definition["query_name"]
+            if not command_name or not query_name:
+                continue
+            compiled_command = command_validator.compile(command_name)
+            compiled_query = command_validator.compile(query_name)
+            for channel in range(1, channels + 1):
+                values = get_sample_values(compiled_command)
+                other_values = get_other_sample_values(compiled_command)
+                query_values = get_sample_values(compiled_query)
+                for _, variable in compiled_command.header_variables:
+                    values[variable.name] = channel
+                    other_values[variable.name] = channel
+                for _, variable in compiled_query.header_variables:
+                    query_values[variable.name] = channel
+                try:
+                    write = compiled_command.format(**values)
+                    change = compiled_command.format(**other_values)
+                    query = compiled_query.format(**query_values)
+                except ValueError:
+                    continue
+                if write not in writes:
+                    writes.append(write)
+                    changes.append(change)
+                    queries.append(query)
+                if not compiled_command.header_variables:
+                    break
+    script = ["*RST"] + writes + writes + queries
+    for change, query in zip(changes, queries):
+        script += [change, query]
+    return script
+
+
+async def run_benchmark(
+    address: tuple[str, int],
+    script: list[str],
+    compiled_sequence: CompiledSequence,
+    repeat: int,
+) -> list[dict]:
+    durations = {"script": [], "compiled": []}
+    responses = {}
+    async with ScpiConnection(*address, timeout=30) as connection:
+        for _ in range(repeat):
+            start = perf_counter()
+            responses["script"] = await run_script(connection, script)
+            durations["script"].append(perf_counter() - start)
+            start = perf_counter()
+            responses["compiled"] = await run_compiled_sequence(
+                connection, compiled_sequence
+            )
+            durations["compiled"].append(perf_counter() - start)
+    if responses["script"] != responses["compiled"]:
+        raise AssertionError(
+            "The compiled sequence's responses don't match the script's"
+        )
+    return [
+        {
+            "scenario": scenario,
+            "median_ms": round(statistics.median(scenario_durations) * 1000, 3),
+            "min_ms": round(min(scenario_durations) * 1000, 3),
+        }
+        for scenario, scenario_durations in durations.items()
+    ]
+
+
+if __name__ == "__main__":
+    args = parse_command_line_args()
+    catalog = read_catalog_file(args.catalog, args.model_name)
+    model_name, model_catalog = next(iter(catalog.items()))
+    script = generate_setup_script(model_catalog, args.channels)
+    compiled_sequence = SequenceCompiler(model_catalog, args.max_message_bytes).compile(
+        script
+    )
+    process, address = start_simulated_scope(args.catalog, model_name, args.latency_ms)
+    try:
+        results = asyncio.run(
+            run_benchmark(address, script, compiled_sequence, args.repeat)
+        )
+    finally:
+        process.terminate()
+        process.wait()
+    summary = asdict(compiled_sequence.summary)
+    for key, value in summary.items():
+        print(f"{key:<20} {value:>8}")
+    print(f"{'scenario':<12} {'median ms':>10} {'min ms':>10}")
+    for result in results:
+        print(
+            f"{result['scenario']:<12} {result['median_ms']:>10.3f} {result['min_ms']:>10.3f}"
+        )
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "model_name": model_name,
+                    "latency_ms": args.latency_ms,
+                    "summary": summary,
+                    "results": results,
+                },
+                f,
+                indent=4,
+            )
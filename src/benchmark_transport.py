@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from time import perf_counter
+from typing import Final
+
+from dotenv import load_dotenv
+
+from catalog_database import read_catalog_file
+from scpi_syntax import get_concrete_header
+from scpi_transport import ScpiConnection, ScpiConnectionPool, parse_address
+
+SIMULATED_SCOPE_PATH: Final = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "simulated_scope.py"
+)
+
+
+def parse_command_line_args(env_filepath: str = ".env"):
+    load_dotenv(env_filepath)
+    parser = argparse.ArgumentParser(
+        description="Measures SCPI query throughput and latency against simulated instruments, sent one at a time, pipelined, and pipelined across a pool of instruments."
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="The catalog the simulated instruments answer from.",
+        default=os.environ.get("OUTPUT_FILE_PATH") or "output.json",
+    )
+    parser.add_argument("--model-name", type=str, default=None)
+    parser.add_argument(
+        "--queries", type=int, default=2000, help="Queries sent per scenario."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=50,
+        help="Queries sent before waiting for their responses, when pipelining.",
+    )
+    parser.add_argument(
+        "--instruments",
+        type=int,
+        default=4,
+        help="Simulated instruments the pool scenario queries at once.",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=1.0,
+        help="The simulated network round trip of every instrument.",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Writes the results to this JSON file.",
+    )
+    return parser.parse_args()
+
+
+def start_simulated_scope(
+    catalog_file_path: str, model_name: str | None, latency_ms: float
+) -> tuple[subprocess.Popen, tuple[str, int]]:
+    # Each instrument gets its own process, so the server doesn't compete with the client for the event loop
+    command = [
+        sys.executable,
+        SIMULATED_SCOPE_PATH,
+        "--catalog",
+        catalog_file_path,
+        "--port",
+        "0",
+        "--latency-ms",
+        str(latency_ms),
+    ]
+    if model_name is not None:
+        command += ["--model-name", model_name]
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    address = process.stdout.readline().strip()
+    if not address:
+        process.kill()
+        raise RuntimeError(f"The simulated instrument didn't start: {command}")
+    return process, parse_address(address)
+
+
+def summarize(
+    scenario: str, query_count: int, elapsed: float, latencies: list[float]
+) -> dict:
+    # Latencies are per round trip: one query when sent one at a time, one batch when pipelined
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "scenario": scenario,
+        "queries": query_count,
+        "queries_per_sec": round(query_count / elapsed, 1),
+        "round_trips": len(latencies_ms),
+        "median_ms": round(statistics.median(latencies_ms), 3),
+        "p95_ms": round(latencies_ms[max(0, int(len(latencies_ms) * 0.95) - 1)], 3),
+        "max_ms": round(latencies_ms[-1], 3),
+    }
+
+
+async def run_transport_benchmark(
+    addresses: list[tuple[str, int]], queries: list[str], batch_size: int
+) -> list[dict]:
+    results = []
+    host, port = addresses[0]
+    async with ScpiConnection(host, port) as connection:
+        latencies = []
+        start = perf_counter()
+        for query in queries:
+            query_start = perf_counter()
+            await connection.query(query)
+            latencies.append(perf_counter() - query_start)
+        results.append(
+            summarize("sequential", len(queries), perf_counter() - start, latencies)
+        )
+
+        latencies = []
+        start = perf_counter()
+        for index in range(0, len(queries), batch_size):
+            batch_start = perf_counter()
+            await connection.query_many(queries[index : index + batch_size])
+            latencies.append(perf_counter() - batch_start)
+        results.append(
+            summarize("pipelined", len(queries), perf_counter() - start, latencies)
+        )
+
+    async with ScpiConnectionPool() as pool:
+        # Opening the connections isn't part of the measurement
+        for host, port in addresses:
+            await pool.get(host, port)
+        latencies = []
+        start = perf_counter()
+        for index in range(0, len(queries), batch_size):
+            batch_start = perf_counter()
+            for responses in await pool.query_instruments(
+                addresses, queries[index : index + batch_size]
+            ):
+                if isinstance(responses, Exception):
+                    raise responses
+            latencies.append(perf_counter() - batch_start)
+        results.append(
+            summarize(
+                f"pool_{len(addresses)}_instruments",
+                len(queries) * len(addresses),
+                perf_counter() - start,
+                latencies,
+            )
+        )
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_command_line_args()
+    catalog = read_catalog_file(args.catalog, args.model_name)
+    model_name, model_catalog = next(iter(catalog.items()))
+    catalog_queries = [
+        get_concrete_header(query_name)
+        for query_names in model_catalog["Scope Queries"].values()
+        for query_name in query_names
+    ]
+    if not catalog_queries:
+        print(f"{model_name} has no queries to send.")
+        exit(1)
+    queries = [
+        catalog_queries[index % len(catalog_queries)] for index in range(args.queries)
+    ]
+    processes = []
+    try:
+        for _ in range(max(1, args.instruments)):
+            processes.append(
+                start_simulated_scope(args.catalog, model_name, args.latency_ms)
+            )
+        results = asyncio.run(
+            run_transport_benchmark(
+                [address for _, address in processes], queries, args.batch_size
+            )
+        )
+    finally:
+        for process, _ in processes:
+            process.terminate()
+            process.wait()
+    print(
+        f"{'scenario':<22} {'queries/s':>10} {'median ms':>10} {'p95 ms':>10} {'max ms':>10}"
+    )
+    for result in results:
+        print(
+            f"{result['scenario']:<22} {result['queries_per_sec']:>10.1f} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['max_ms']:>10.3f}"
+        )
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "model_name": model_name,
+                    "latency_ms": args.latency_ms,
+                    "batch_size": args.batch_size,
+                    "results": results,
+                },
+                f,
+                indent=4,
+            )
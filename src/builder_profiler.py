@@ -0,0 +1,105 @@
+import json
+import logging
+
+from contextlib import nullcontext
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# Shared by every disabled timer, so timing a stage costs nothing when profiling is off
+NULL_CONTEXT = nullcontext()
+
+
+class TimedStage:
+    __slots__ = ("stage_timer", "stage", "start")
+
+    def __init__(self, stage_timer: "StageTimer", stage: str):
+        self.stage_timer = stage_timer
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stage_timer.add(self.stage, perf_counter() - self.start)
+
+
+class StageTimer:
+    # Totals the time and call count of each stage. Page results carry one of these back from the worker
+    # processes, so it has to stay picklable.
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        # stage -> [seconds, calls]
+        self.stages: dict[str, list] = {}
+
+    def time(self, stage: str) -> TimedStage | nullcontext:
+        return TimedStage(self, stage) if self.enabled else NULL_CONTEXT
+
+    def add(self, stage: str, seconds: float, calls: int = 1) -> None:
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += calls
+
+    def merge(self, other: "StageTimer") -> None:
+        for stage, (seconds, calls) in other.stages.items():
+            self.add(stage, seconds, calls)
+
+    def to_dict(self) -> dict:
+        return {
+            stage: {"seconds": round(seconds, 6), "calls": calls}
+            for stage, (seconds, calls) in self.stages.items()
+        }
+
+
+class BuilderProfiler:
+    # Collects the run-level stages (TOC scan, output writing) alongside the per-page stage timings, and turns
+    # them into a JSON report that can be compared across releases
+    def __init__(self, pdf_file_path: str, workers: int, enabled: bool = True):
+        self.pdf_file_path = pdf_file_path
+        self.workers = workers
+        self.run_timer = StageTimer(enabled)
+        self.page_timers: dict[int, StageTimer] = {}
+        self.start = perf_counter()
+
+    def time(self, stage: str) -> TimedStage | nullcontext:
+        return self.run_timer.time(stage)
+
+    def add_page(self, page_number: int, page_timer: StageTimer) -> None:
+        self.page_timers[page_number] = page_timer
+
+    def build_report(self, slowest_page_count: int) -> dict:
+        stage_totals = StageTimer()
+        stage_totals.merge(self.run_timer)
+        for page_timer in self.page_timers.values():
+            stage_totals.merge(page_timer)
+        pages = [
+            {
+                "page": page_number + 1,
+                "seconds": round(page_timer.stages.get("page", [0.0])[0], 6),
+                "stages": page_timer.to_dict(),
+            }
+            for page_number, page_timer in sorted(self.page_timers.items())
+        ]
+        return {
+            "pdf_file_path": self.pdf_file_path,
+            "workers": self.workers,
+            "wall_seconds": round(perf_counter() - self.start, 6),
+            "stages": stage_totals.to_dict(),
+            "slowest_pages": sorted(
+                pages, key=lambda page: page["seconds"], reverse=True
+            )[:slowest_page_count],
+            "pages": pages,
+        }
+
+    def write_report(self, report_file_path: str, slowest_page_count: int) -> None:
+        report = self.build_report(slowest_page_count)
+        with open(report_file_path, "w", encoding="utf8") as f:
+            json.dump(report, f, indent=4)
+        logger.info("Wrote the profile report to %s", report_file_path)
+        for stage, totals in report["stages"].items():
+            logger.info(
+                "  %-14s %10.3fs over %d calls",
+                stage,
+                totals["seconds"],
+                totals["calls"],
+            )
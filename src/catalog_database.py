@@ -0,0 +1,427 @@
+import argparse
+import json
+import logging
+import sqlite3
+
+from dataclasses import asdict
+from typing import Final
+
+from catalog_stream import read_ndjson_catalog
+from multi_model_catalog import MODELS_KEY, expand_model_catalog
+
+logger = logging.getLogger(__name__)
+
+# Commands hold both the command and query of a table row, like CommandDetails does. The variable names of the
+# command and query are kept as JSON lists, while the variable_list entries get their own rows, with the values of
+# enum variables in enum_values.
+SCHEMA: Final = """
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    model_id INTEGER NOT NULL REFERENCES models(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    UNIQUE (model_id, name)
+);
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    page INTEGER,
+    command_name TEXT,
+    query_name TEXT,
+    return_description TEXT,
+    has_variables_in_command INTEGER NOT NULL,
+    has_inline_variables_in_command INTEGER NOT NULL,
+    has_variables_in_query INTEGER NOT NULL,
+    has_inline_variables_in_query INTEGER NOT NULL,
+    command_variable_names TEXT NOT NULL,
+    query_variable_names TEXT NOT NULL,
+    is_implemented INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS commands_by_category ON commands (category_id, position);
+CREATE INDEX IF NOT EXISTS commands_by_command_name ON commands (command_name);
+CREATE INDEX IF NOT EXISTS commands_by_query_name ON commands (query_name);
+CREATE TABLE IF NOT EXISTS variables (
+    id INTEGER PRIMARY KEY,
+    command_id INTEGER NOT NULL REFERENCES commands(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value_type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS variables_by_command ON variables (command_id, position);
+CREATE INDEX IF NOT EXISTS variables_by_name ON variables (name);
+CREATE TABLE IF NOT EXISTS enum_values (
+    variable_id INTEGER NOT NULL REFERENCES variables(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (variable_id, position)
+) WITHOUT ROWID;
+"""
+# Same values as ReturnElement.ENUM_FORMAT and ReturnElement.INLINE_ENUM_FORMAT
+ENUM_VALUE_TYPE: Final = "ENUM"
+INLINE_ENUM_VALUE_TYPE: Final = "INLINE_ENUM"
+INLINE_PARAMS_NAMES: Final = ["INLINE_COMMAND_PARAMS", "INLINE_QUERY_PARAMS"]
+COMMAND_COLUMNS: Final = [
+    "command_name",
+    "query_name",
+    "return_description",
+    "has_variables_in_command",
+    "has_inline_variables_in_command",
+    "has_variables_in_query",
+    "has_inline_variables_in_query",
+    "command_variable_names",
+    "query_variable_names",
+    "is_implemented",
+]
+LIST_COLUMNS: Final = ["command_variable_names", "query_variable_names"]
+
+
+def connect_catalog_database(
+    database_file_path: str, read_only: bool = False
+) -> sqlite3.Connection:
+    if read_only:
+        connection = sqlite3.connect(f"file:{database_file_path}?mode=ro", uri=True)
+    else:
+        connection = sqlite3.connect(database_file_path)
+        connection.executescript(SCHEMA)
+    connection.execute("PRAGMA foreign_keys = ON")
+    return connection
+
+
+def insert_command(
+    connection: sqlite3.Connection,
+    category_id: int,
+    position: int,
+    page: int | None,
+    command_definition: dict,
+) -> None:
+    command_id = connection.execute(
+        f"INSERT INTO commands (category_id, position, page, {', '.join(COMMAND_COLUMNS)}) "
+        f"VALUES (?, ?, ?, {', '.join('?' for _ in COMMAND_COLUMNS)})",
+        [category_id, position, page]
+        + [
+            (
+                json.dumps(command_definition[column])
+                if column in LIST_COLUMNS
+                else command_definition[column]
+            )
+            for column in COMMAND_COLUMNS
+        ],
+    ).lastrowid
+    for variable_position, variable in enumerate(command_definition["variable_list"]):
+        for name, value in variable.items():
+            if not isinstance(value, list):
+                connection.execute(
+                    "INSERT INTO variables (command_id, position, name, value_type) VALUES (?, ?, ?, ?)",
+                    (command_id, variable_position, name, value),
+                )
+                continue
+            value_type = (
+                INLINE_ENUM_VALUE_TYPE
+                if name in INLINE_PARAMS_NAMES
+                else ENUM_VALUE_TYPE
+            )
+            variable_id = connection.execute(
+                "INSERT INTO variables (command_id, position, name, value_type) VALUES (?, ?, ?, ?)",
+                (command_id, variable_position, name, value_type),
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO enum_values (variable_id, position, value) VALUES (?, ?, ?)",
+                [
+                    (variable_id, value_position, enum_value)
+                    for value_position, enum_value in enumerate(value)
+                ],
+            )
+
+
+def replace_model(
+    connection: sqlite3.Connection, model_name: str, command_categories: list[str]
+) -> dict[str, int]:
+    # Rewriting a model drops its old categories, commands and variables first. Returns the category ids by name.
+    connection.execute("DELETE FROM models WHERE name = ?", (model_name,))
+    model_id = connection.execute(
+        "INSERT INTO models (name) VALUES (?)", (model_name,)
+    ).lastrowid
+    return {
+        category: connection.execute(
+            "INSERT INTO categories (model_id, position, name) VALUES (?, ?, ?)",
+            (model_id, position, category),
+        ).lastrowid
+        for position, category in enumerate(command_categories)
+    }
+
+
+class SqliteCatalogWriter:
+    # Inserts the commands of each page as it gets processed, but only commits once the whole manual is done, so
+    # a crashed run leaves the previous catalog of the model untouched
+    def __init__(
+        self, output_file_path: str, model_name: str, command_categories: list[str]
+    ):
+        self.output_file_path = output_file_path
+        self.commands_written = 0
+        self.connection = connect_catalog_database(output_file_path)
+        self.category_ids = replace_model(
+            self.connection, model_name, command_categories
+        )
+
+    def write_page(self, page_number: int, page_commands: list) -> None:
+        for category, _, _, command_details in page_commands:
+            insert_command(
+                self.connection,
+                self.category_ids[category],
+                self.commands_written,
+                page_number + 1,
+                asdict(command_details),
+            )
+            self.commands_written += 1
+
+    def close(self) -> None:
+        self.connection.commit()
+        self.connection.close()
+        logger.info(
+            "Wrote %d commands to %s without errors!",
+            self.commands_written,
+            self.output_file_path,
+        )
+
+
+def write_model_catalog(
+    connection: sqlite3.Connection, model_name: str, model_catalog: dict
+) -> None:
+    # Stores a catalog in the nested layout the JSON output format writes
+    category_ids = replace_model(
+        connection, model_name, list(model_catalog["Detailed Commands"])
+    )
+    position = 0
+    for category, detailed_commands in model_catalog["Detailed Commands"].items():
+        for command_definition in detailed_commands:
+            insert_command(
+                connection, category_ids[category], position, None, command_definition
+            )
+            position += 1
+
+
+class CatalogDatabase:
+    # Read-only access to the catalog database, which only loads the rows each lookup needs
+    def __init__(self, database_file_path: str):
+        self.connection = connect_catalog_database(database_file_path, read_only=True)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get_models(self) -> list[str]:
+        return [
+            name
+            for (name,) in self.connection.execute(
+                "SELECT name FROM models ORDER BY id"
+            )
+        ]
+
+    def get_categories(self, model_name: str) -> list[str]:
+        return [
+            name
+            for (name,) in self.connection.execute(
+                "SELECT categories.name FROM categories JOIN models ON models.id = categories.model_id "
+                "WHERE models.name = ? ORDER BY categories.position",
+                (model_name,),
+            )
+        ]
+
+    def get_names(self, model_name: str, category: str, name_column: str) -> list[str]:
+        return [
+            name
+            for (name,) in self.connection.execute(
+                f"SELECT commands.{name_column} FROM commands "
+                "JOIN categories ON categories.id = commands.category_id "
+                "JOIN models ON models.id = categories.model_id "
+                f"WHERE models.name = ? AND categories.name = ? AND commands.{name_column} IS NOT NULL "
+                "ORDER BY commands.position",
+                (model_name, category),
+            )
+        ]
+
+    def get_command_names(self, model_name: str, category: str) -> list[str]:
+        return self.get_names(model_name, category, "command_name")
+
+    def get_query_names(self, model_name: str, category: str) -> list[str]:
+        return self.get_names(model_name, category, "query_name")
+
+    def read_variable_list(self, command_id: int) -> list[dict]:
+        variable_list = []
+        for variable_id, name, value_type in self.connection.execute(
+            "SELECT id, name, value_type FROM variables WHERE command_id = ? ORDER BY position",
+            (command_id,),
+        ):
+            if value_type in (ENUM_VALUE_TYPE, INLINE_ENUM_VALUE_TYPE):
+                variable_list.append(
+                    {
+                        name: [
+                            value
+                            for (value,) in self.connection.execute(
+                                "SELECT value FROM enum_values WHERE variable_id = ? ORDER BY position",
+                                (variable_id,),
+                            )
+                        ]
+                    }
+                )
+            else:
+                variable_list.append({name: value_type})
+        return variable_list
+
+    def read_command_definition(self, command_row: tuple) -> dict:
+        # command_row is the id followed by COMMAND_COLUMNS. The keys come out in CommandDetails field order.
+        columns = dict(zip(COMMAND_COLUMNS, command_row[1:]))
+        return {
+            "has_variables_in_command": bool(columns["has_variables_in_command"]),
+            "has_inline_variables_in_command": bool(
+                columns["has_inline_variables_in_command"]
+            ),
+            "has_variables_in_query": bool(columns["has_variables_in_query"]),
+            "has_inline_variables_in_query": bool(
+                columns["has_inline_variables_in_query"]
+            ),
+            "command_variable_names": json.loads(columns["command_variable_names"]),
+            "query_variable_names": json.loads(columns["query_variable_names"]),
+            "variable_list": self.read_variable_list(command_row[0]),
+            "command_name": columns["command_name"],
+            "query_name": columns["query_name"],
+            "return_description": columns["return_description"],
+            "is_implemented": bool(columns["is_implemented"]),
+        }
+
+    def find_command_details(self, model_name: str, name: str) -> dict | None:
+        # Looks a command or query up by its name, as it appears in the catalog
+        for name_column in ("command_name", "query_name"):
+            command_row = self.connection.execute(
+                f"SELECT commands.id, {', '.join(f'commands.{column}' for column in COMMAND_COLUMNS)} "
+                "FROM commands JOIN categories ON categories.id = commands.category_id "
+                "JOIN models ON models.id = categories.model_id "
+                f"WHERE models.name = ? AND commands.{name_column} = ? ORDER BY commands.position LIMIT 1",
+                (model_name, name),
+            ).fetchone()
+            if command_row is not None:
+                return self.read_command_definition(command_row)
+        return None
+
+    def get_all_names(self) -> list[tuple[str, str, str | None, str | None, str]]:
+        # The model, category, command name, query name and return description of every table row of every model,
+        # in catalog order
+        return self.connection.execute(
+            "SELECT models.name, categories.name, commands.command_name, commands.query_name, "
+            "commands.return_description FROM commands "
+            "JOIN categories ON categories.id = commands.category_id "
+            "JOIN models ON models.id = categories.model_id "
+            "ORDER BY models.id, commands.position"
+        ).fetchall()
+
+    def read_model_catalog(self, model_name: str) -> dict:
+        # Rebuilds the nested catalog that the JSON output format writes, for one model
+        categories = self.get_categories(model_name)
+        scope_queries = {category: [] for category in categories}
+        scope_commands = {category: [] for category in categories}
+        detailed_commands_by_category = {category: [] for category in categories}
+        for category, *command_row in self.connection.execute(
+            f"SELECT categories.name, commands.id, {', '.join(f'commands.{column}' for column in COMMAND_COLUMNS)} "
+            "FROM commands JOIN categories ON categories.id = commands.category_id "
+            "JOIN models ON models.id = categories.model_id "
+            "WHERE models.name = ? ORDER BY commands.position",
+            (model_name,),
+        ).fetchall():
+            command_definition = self.read_command_definition(command_row)
+            if command_definition["command_name"] is not None:
+                scope_commands[category].append(command_definition["command_name"])
+            if command_definition["query_name"] is not None:
+                scope_queries[category].append(command_definition["query_name"])
+            detailed_commands_by_category[category].append(command_definition)
+        return {
+            model_name: {
+                "Scope Queries": scope_queries,
+                "Scope Commands": scope_commands,
+                "Detailed Commands": detailed_commands_by_category,
+            }
+        }
+
+
+def read_catalog_file(catalog_file_path: str, model_name: str | None = None) -> dict:
+    # Reads one model (the first one if model_name isn't given) from any catalog the builders write: a catalog
+    # database, an NDJSON stream, or a single or merged multi-model JSON catalog. Returns {model_name: catalog}.
+    if catalog_file_path.endswith((".db", ".sqlite")):
+        catalog_database = CatalogDatabase(catalog_file_path)
+        try:
+            model_names = catalog_database.get_models()
+            if model_name is None and model_names:
+                model_name = model_names[0]
+            if model_name not in model_names:
+                raise KeyError(f"{catalog_file_path} has no model {model_name}")
+            return catalog_database.read_model_catalog(model_name)
+        finally:
+            catalog_database.close()
+    if catalog_file_path.endswith(".ndjson"):
+        catalog = read_ndjson_catalog(catalog_file_path)
+    else:
+        with open(catalog_file_path, "r", encoding="utf8") as f:
+            catalog = json.load(f)
+    model_names = list(catalog[MODELS_KEY] if MODELS_KEY in catalog else catalog)
+    if model_name is None and model_names:
+        model_name = model_names[0]
+    if model_name not in model_names:
+        raise KeyError(f"{catalog_file_path} has no model {model_name}")
+    if MODELS_KEY in catalog:
+        return expand_model_catalog(catalog, model_name)
+    return {model_name: catalog[model_name]}
+
+
+def read_all_catalog_models(catalog_file_path: str) -> dict:
+    # Every model of a catalog file, in any of the formats read_catalog_file reads. Returns {model_name: catalog}.
+    if catalog_file_path.endswith((".db", ".sqlite")):
+        catalog_database = CatalogDatabase(catalog_file_path)
+        try:
+            return {
+                model_name: catalog_database.read_model_catalog(model_name)[model_name]
+                for model_name in catalog_database.get_models()
+            }
+        finally:
+            catalog_database.close()
+    if catalog_file_path.endswith(".ndjson"):
+        return read_ndjson_catalog(catalog_file_path)
+    with open(catalog_file_path, "r", encoding="utf8") as f:
+        catalog = json.load(f)
+    if MODELS_KEY in catalog:
+        return {
+            model_name: expand_model_catalog(catalog, model_name)[model_name]
+            for model_name in catalog[MODELS_KEY]
+        }
+    return catalog
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Imports every model of a JSON command catalog (single or merged multi-model) into a catalog database."
+    )
+    parser.add_argument("input_file_path", type=str, help="The JSON file to read.")
+    parser.add_argument(
+        "output_file_path",
+        type=str,
+        help="The SQLite database to write the catalog to.",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(levelname)s %(name)s: %(message)s"
+    )
+    with open(args.input_file_path, "r", encoding="utf8") as f:
+        catalog = json.load(f)
+    if MODELS_KEY in catalog:
+        catalog = {
+            model_name: expand_model_catalog(catalog, model_name)[model_name]
+            for model_name in catalog[MODELS_KEY]
+        }
+    connection = connect_catalog_database(args.output_file_path)
+    for model_name, model_catalog in catalog.items():
+        write_model_catalog(connection, model_name, model_catalog)
+        logger.info("Imported %s into %s", model_name, args.output_file_path)
+    connection.commit()
+    connection.close()
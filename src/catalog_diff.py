@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+
+from dataclasses import asdict, dataclass
+from typing import Final, TextIO
+
+import pymupdf
+
+from catalog_database import read_catalog_file
+from command_details import CommandDetails
+
+logger = logging.getLogger(__name__)
+
+# Every build writes a fingerprint of each page it scanned next to its catalog, as NDJSON: a header line with the
+# parser hash, then one line per page with its categories, text hash, row hash and parsed commands. Building a new
+# revision of the manual against it reuses the parsed commands of every page whose text didn't change, without
+# running table detection, and of every table whose extracted rows didn't change, without parsing them again.
+FINGERPRINT_FILE_SUFFIX: Final = ".tables.ndjson"
+CHANGELOG_FILE_SUFFIX: Final = ".changelog.json"
+# Running headers and footers (page numbers, revision dates, ...) change on every page between revisions, so text
+# within this fraction of the page height from the top or bottom edge isn't part of the text hash
+PAGE_MARGIN_FRACTION: Final = 0.07
+# Parsed commands are only reused while the code that parsed them is unchanged
+PARSER_SOURCE_FILES: Final = [
+    "pdf_command_builder.py",
+    "scpi_syntax.py",
+    "command_details.py",
+]
+REUSED_BY_TEXT: Final = "text"
+REUSED_BY_ROWS: Final = "rows"
+
+
+@dataclass
+class TableFingerprint:
+    categories: list[str]
+    text_hash: str
+    row_hash: str | None = None
+
+
+def get_fingerprint_file_path(catalog_file_path: str) -> str:
+    return f"{catalog_file_path}{FINGERPRINT_FILE_SUFFIX}"
+
+
+def get_parser_hash() -> str:
+    digest = hashlib.sha256()
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    for file_name in PARSER_SOURCE_FILES:
+        with open(os.path.join(source_dir, file_name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def hash_page_text(page: pymupdf.Page) -> str:
+    top = page.rect.y0 + page.rect.height * PAGE_MARGIN_FRACTION
+    bottom = page.rect.y1 - page.rect.height * PAGE_MARGIN_FRACTION
+    digest = hashlib.sha256()
+    for _, y0, _, y1, text, *_ in page.get_text("blocks"):
+        if y0 >= top and y1 <= bottom:
+            digest.update(" ".join(text.split()).encode("utf8"))
+            digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def hash_table_rows(
+    header_names: list[str | None] | None, rows: list[list[str]]
+) -> str:
+    # The header takes part, as it decides the category on pages that could belong to several
+    return hashlib.sha256(
+        json.dumps([header_names, rows], ensure_ascii=False).encode("utf8")
+    ).hexdigest()
+
+
+class TableFingerprintIndex:
+    # The pages of an earlier build, looked up by the categories they could belong to and their text or row hash.
+    # The commands stay as the plain lists they were read as, so the index is cheap to hand to worker processes.
+    def __init__(self, pages: list[dict]):
+        self.pages_by_text: dict[tuple, dict] = {}
+        self.commands_by_rows: dict[tuple, list] = {}
+        for page in pages:
+            categories = tuple(page["categories"])
+            self.pages_by_text[(categories, page["text_hash"])] = page
+            if page["row_hash"] is not None:
+                self.commands_by_rows[(categories, page["row_hash"])] = page["commands"]
+
+    @classmethod
+    def load(cls, fingerprint_file_path: str) -> "TableFingerprintIndex | None":
+        # None if there's no usable fingerprint file, so every page gets scanned afresh
+        try:
+            with open(fingerprint_file_path, "r", encoding="utf8") as f:
+                header = json.loads(f.readline())
+                if header.get("parser_hash") != get_parser_hash():
+                    logger.warning(
+                        "%s was written by a different version of the parser, so none of its tables are reused",
+                        fingerprint_file_path,
+                    )
+                    return None
+                return cls([json.loads(line) for line in f])
+        except FileNotFoundError:
+            logger.warning(
+                "There's no table fingerprint file at %s, so none of the earlier tables are reused",
+                fingerprint_file_path,
+            )
+        except ValueError as e:
+            logger.warning("Couldn't read %s: %s", fingerprint_file_path, e)
+        return None
+
+    @staticmethod
+    def to_page_commands(commands: list) -> list:
+        return [
+            (category, command, query, CommandDetails(**command_details))
+            for category, command, query, command_details in commands
+        ]
+
+    def find_by_text(
+        self, fingerprint: TableFingerprint
+    ) -> tuple[str | None, list] | None:
+        # Returns the row hash and the commands of an earlier page with the same text
+        page = self.pages_by_text.get(
+            (tuple(fingerprint.categories), fingerprint.text_hash)
+        )
+        if page is None:
+            return None
+        return page["row_hash"], self.to_page_commands(page["commands"])
+
+    def find_by_rows(self, fingerprint: TableFingerprint) -> list | None:
+        commands = self.commands_by_rows.get(
+            (tuple(fingerprint.categories), fingerprint.row_hash)
+        )
+        return None if commands is None else self.to_page_commands(commands)
+
+
+class TableFingerprintWriter:
+    # Writes to a temporary file that only replaces the old fingerprints once the build finished, so rebuilding a
+    # catalog in place can still read them, and a failed build leaves them alone
+    def __init__(self, fingerprint_file_path: str):
+        self.fingerprint_file_path = fingerprint_file_path
+        self.temporary_path = f"{fingerprint_file_path}.{os.getpid()}.tmp"
+        self.file: TextIO = open(self.temporary_path, "w", encoding="utf8")
+        self.write_record({"parser_hash": get_parser_hash()})
+
+    def write_record(self, record: dict) -> None:
+        self.file.write(json.dumps(record))
+        self.file.write("\n")
+
+    def write_page(
+        self, page_number: int, fingerprint: TableFingerprint, page_commands: list
+    ) -> None:
+        self.write_record(
+            {
+                "page": page_number + 1,
+                **asdict(fingerprint),
+                "commands": [
+                    [category, command, query, asdict(command_details)]
+                    for category, command, query, command_details in page_commands
+                ],
+            }
+        )
+
+    def close(self) -> None:
+        self.file.close()
+        os.replace(self.temporary_path, self.fingerprint_file_path)
+
+
+def index_catalog_commands(model_catalog: dict) -> dict[tuple[str, str, int], dict]:
+    # A table row is named by its category and command, or its query for query-only rows. Rows repeated within a
+    # category are told apart by their occurrence.
+    commands = {}
+    for category, command_definitions in model_catalog["Detailed Commands"].items():
+        occurrences: dict[str, int] = {}
+        for command_definition in command_definitions:
+            name = (
+                command_definition["command_name"] or command_definition["query_name"]
+            )
+            occurrence = occurrences.get(name, 0)
+            occurrences[name] = occurrence + 1
+            commands[(category, name, occurrence)] = command_definition
+    return commands
+
+
+def diff_catalogs(old_model_catalog: dict, new_model_catalog: dict) -> dict:
+    old_commands = index_catalog_commands(old_model_catalog)
+    new_commands = index_catalog_commands(new_model_catalog)
+    added = [
+        {"category": category, "name": name}
+        for category, name, occurrence in new_commands
+        if (category, name, occurrence) not in old_commands
+    ]
+    removed = [
+        {"category": category, "name": name}
+        for category, name, occurrence in old_commands
+        if (category, name, occurrence) not in new_commands
+    ]
+    changed = []
+    for key, command_definition in new_commands.items():
+        old_command_definition = old_commands.get(key)
+        if old_command_definition is None:
+            continue
+        fields = {
+            field_name: {"old": old_command_definition.get(field_name), "new": value}
+            for field_name, value in command_definition.items()
+            if old_command_definition.get(field_name) != value
+        }
+        if fields:
+            category, name, _ = key
+            changed.append({"category": category, "name": name, "fields": fields})
+    return {
+        "summary": {
+            "old_commands": len(old_commands),
+            "new_commands": len(new_commands),
+            "added": len(added),
+            "removed": len(removed),
+            "changed": len(changed),
+        },
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+    }
+
+
+def write_changelog(changelog_file_path: str, changelog: dict) -> None:
+    with open(changelog_file_path, "w", encoding="utf8") as f:
+        json.dump(changelog, f, indent=4)
+    summary = changelog["summary"]
+    logger.info(
+        "%d commands added, %d removed and %d changed, the changelog is in %s",
+        summary["added"],
+        summary["removed"],
+        summary["changed"],
+        changelog_file_path,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Lists the commands added, removed or changed between two versions of a model's catalog."
+    )
+    parser.add_argument("old_catalog_file_path", type=str)
+    parser.add_argument("new_catalog_file_path", type=str)
+    parser.add_argument("--model-name", type=str, default=None)
+    parser.add_argument(
+        "--output-file-path",
+        type=str,
+        default=None,
+        help="Writes the changelog to this JSON file instead of printing it.",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    _, old_model_catalog = next(
+        iter(read_catalog_file(args.old_catalog_file_path, args.model_name).items())
+    )
+    _, new_model_catalog = next(
+        iter(read_catalog_file(args.new_catalog_file_path, args.model_name).items())
+    )
+    changelog = diff_catalogs(old_model_catalog, new_model_catalog)
+    if args.output_file_path is not None:
+        write_changelog(args.output_file_path, changelog)
+    else:
+        print(json.dumps(changelog, indent=4))
@@ -0,0 +1,409 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socketserver
+import sqlite3
+import sys
+import threading
+import time
+
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Final
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from dotenv import load_dotenv
+
+from catalog_database import read_all_catalog_models
+from command_details import ReturnElement
+from scpi_syntax import ScpiHeaderIndex, get_header
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST: Final = "127.0.0.1"
+DEFAULT_PORT: Final = 8765
+DEFAULT_POLL_INTERVAL: Final = 1.0
+# Entries kept per snapshot before the response cache starts over. A new snapshot always starts with an empty one.
+RESPONSE_CACHE_SIZE: Final = 4096
+JSON_CONTENT_TYPE: Final = "application/json"
+STATUS_PATH: Final = "/status"
+
+# GET endpoints, all answering with JSON:
+#   /status                                           the file being served, its version and how often it reloaded
+#   /models                                           the model names
+#   /models/<model>/categories                        the category names, in TOC order
+#   /models/<model>/categories/<category>             the category's command definitions
+#   /models/<model>/commands/<header>                 the definition of a command or query, in any spelling, e.g.
+#                                                     /models/DSO5012A/commands/:CHAN2:SCAL? (URL encoded)
+#   /models/<model>/variable-types/<type>             the commands with a variable of that type (NR1, NR3, ENUM, ...)
+#   /search?q=<text>[&model=<model>]                  commands and queries whose name holds the text
+
+
+def get_variable_type(value_type: object) -> str:
+    # Enum variables hold their list of values instead of a type name
+    return (
+        ReturnElement.ENUM_FORMAT.value if isinstance(value_type, list) else value_type
+    )
+
+
+def check_catalog_shape(catalog_file_path: str, models: object) -> None:
+    # JSON catalogs are only checked for being valid JSON when read, so one of the wrong shape would otherwise fail
+    # halfway through indexing, with whatever error the first wrong value happens to raise
+    if not isinstance(models, dict):
+        raise ValueError(f"{catalog_file_path} doesn't hold an object of models")
+    for model_name, model_catalog in models.items():
+        if not isinstance(model_catalog, dict) or not isinstance(
+            model_catalog.get("Detailed Commands"), dict
+        ):
+            raise ValueError(
+                f"{model_name} in {catalog_file_path} has no object of detailed commands"
+            )
+        for category, command_definitions in model_catalog["Detailed Commands"].items():
+            if not isinstance(command_definitions, list) or not all(
+                isinstance(command_definition, dict)
+                and isinstance(command_definition.get("variable_list"), list)
+                and all(
+                    isinstance(variable, dict)
+                    for variable in command_definition["variable_list"]
+                )
+                for command_definition in command_definitions
+            ):
+                raise ValueError(
+                    f"{category} of {model_name} in {catalog_file_path} isn't a list of command definitions"
+                )
+
+
+class CatalogSnapshot:
+    # One version of the catalog file, with its indexes built up front. Snapshots are never changed once built, so
+    # requests can keep using the one they started with while a newer one gets swapped in.
+    def __init__(self, catalog_file_path: str, file_stamp: tuple[int, int]):
+        self.catalog_file_path = catalog_file_path
+        self.file_stamp = file_stamp
+        self.version = f"{file_stamp[0]:x}-{file_stamp[1]:x}"
+        self.loaded_at = time.time()
+        self.models = read_all_catalog_models(catalog_file_path)
+        check_catalog_shape(catalog_file_path, self.models)
+        self.headers_by_model: dict[str, ScpiHeaderIndex] = {}
+        # model -> variable type -> [(category, command definition)]
+        self.commands_by_variable_type: dict[str, dict[str, list]] = {}
+        # (lower case command or query name, model, category, command definition), for substring search
+        self.search_entries: list[tuple[str, str, str, dict]] = []
+        for model_name, model_catalog in self.models.items():
+            header_index = ScpiHeaderIndex()
+            commands_by_variable_type: dict[str, list] = {}
+            for category, command_definitions in model_catalog[
+                "Detailed Commands"
+            ].items():
+                for command_definition in command_definitions:
+                    for name in (
+                        command_definition["command_name"],
+                        command_definition["query_name"],
+                    ):
+                        if name:
+                            header_index.add(name, (category, command_definition))
+                            self.search_entries.append(
+                                (name.lower(), model_name, category, command_definition)
+                            )
+                    variable_types = {
+                        get_variable_type(value_type)
+                        for variable in command_definition["variable_list"]
+                        for value_type in variable.values()
+                    }
+                    for variable_type in variable_types:
+                        commands_by_variable_type.setdefault(variable_type, []).append(
+                            (category, command_definition)
+                        )
+            self.headers_by_model[model_name] = header_index
+            self.commands_by_variable_type[model_name] = commands_by_variable_type
+        self.response_cache: dict[str, tuple[int, bytes]] = {}
+        self.response_cache_lock = threading.Lock()
+
+    def get_model(self, model_name: str) -> dict:
+        if model_name not in self.models:
+            raise LookupError(f"There's no model {model_name}")
+        return self.models[model_name]
+
+    def find_command(self, model_name: str, header: str) -> dict:
+        self.get_model(model_name)
+        match = self.headers_by_model[model_name].find(get_header(header))
+        if match is None:
+            raise LookupError(f"{model_name} has no command {header}")
+        (category, command_definition), suffixes = match
+        return {
+            "category": category,
+            "numeric_suffixes": [suffix for suffix in suffixes if suffix],
+            "command": command_definition,
+        }
+
+    def search(self, text: str, model_name: str | None) -> list[dict]:
+        text = text.lower()
+        results = []
+        seen = set()
+        for name, entry_model_name, category, command_definition in self.search_entries:
+            if model_name is not None and entry_model_name != model_name:
+                continue
+            # A command and its query both match most searches, but the row is only listed once
+            if text in name and id(command_definition) not in seen:
+                seen.add(id(command_definition))
+                results.append(
+                    {
+                        "model": entry_model_name,
+                        "category": category,
+                        "command_name": command_definition["command_name"],
+                        "query_name": command_definition["query_name"],
+                    }
+                )
+        return results
+
+    def answer(self, path: str, query: dict[str, list[str]]) -> object:
+        # Raises LookupError for anything that isn't there
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts == ["models"]:
+            return list(self.models)
+        if parts == ["search"]:
+            return self.search(query.get("q", [""])[0], query.get("model", [None])[0])
+        if len(parts) >= 3 and parts[0] == "models":
+            model_name = parts[1]
+            if parts[2:] == ["categories"]:
+                return list(self.get_model(model_name)["Detailed Commands"])
+            if len(parts) == 4 and parts[2] == "categories":
+                detailed_commands = self.get_model(model_name)["Detailed Commands"]
+                if parts[3] not in detailed_commands:
+                    raise LookupError(f"{model_name} has no category {parts[3]}")
+                return detailed_commands[parts[3]]
+            if len(parts) == 4 and parts[2] == "commands":
+                return self.find_command(model_name, parts[3])
+            if len(parts) == 4 and parts[2] == "variable-types":
+                self.get_model(model_name)
+                return [
+                    {"category": category, "command": command_definition}
+                    for category, command_definition in self.commands_by_variable_type[
+                        model_name
+                    ].get(parts[3].upper(), [])
+                ]
+        raise LookupError(f"There's no endpoint {path}")
+
+    def get_response(self, request_path: str) -> tuple[int, bytes]:
+        # The status and encoded body of a request, from the response cache if it was answered before
+        if (response := self.response_cache.get(request_path)) is not None:
+            return response
+        url = urlsplit(request_path)
+        try:
+            response = (
+                HTTPStatus.OK,
+                json.dumps(self.answer(url.path, parse_qs(url.query))).encode("utf8"),
+            )
+        except LookupError as e:
+            response = (
+                HTTPStatus.NOT_FOUND,
+                json.dumps({"error": str(e)}).encode("utf8"),
+            )
+        with self.response_cache_lock:
+            if len(self.response_cache) >= RESPONSE_CACHE_SIZE:
+                self.response_cache.clear()
+            self.response_cache[request_path] = response
+        return response
+
+
+def get_file_stamp(catalog_file_path: str) -> tuple[int, int]:
+    file_stat = os.stat(catalog_file_path)
+    return file_stat.st_mtime_ns, file_stat.st_size
+
+
+class CatalogService:
+    # Keeps the current snapshot, and swaps in a new one once the catalog file changes. Swapping is a single
+    # reference assignment, so requests already being answered finish on the snapshot they started with.
+    def __init__(self, catalog_file_path: str, poll_interval: float):
+        self.catalog_file_path = catalog_file_path
+        self.poll_interval = poll_interval
+        self.snapshot = CatalogSnapshot(
+            catalog_file_path, get_file_stamp(catalog_file_path)
+        )
+        self.reloads = 0
+        self.stop_event = threading.Event()
+        self.watcher = threading.Thread(target=self.watch_catalog_file, daemon=True)
+
+    def get_status(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "catalog_file_path": self.catalog_file_path,
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at,
+            "models": list(snapshot.models),
+            "reloads": self.reloads,
+        }
+
+    def start_watching(self) -> None:
+        self.watcher.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def watch_catalog_file(self) -> None:
+        # The JSON writer doesn't replace the file atomically, so a change is only loaded once the file stopped
+        # changing for a poll interval. A file that still fails to load keeps the old snapshot until it changes again.
+        pending_stamp = None
+        failed_stamp = None
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                file_stamp = get_file_stamp(self.catalog_file_path)
+            except OSError:
+                # Builders can remove the file before writing the new one
+                continue
+            if file_stamp in (self.snapshot.file_stamp, failed_stamp):
+                pending_stamp = None
+                continue
+            if file_stamp != pending_stamp:
+                pending_stamp = file_stamp
+                continue
+            self.reload(file_stamp)
+            failed_stamp = (
+                None if self.snapshot.file_stamp == file_stamp else file_stamp
+            )
+            pending_stamp = None
+
+    def reload(self, file_stamp: tuple[int, int]) -> None:
+        start = time.perf_counter()
+        try:
+            snapshot = CatalogSnapshot(self.catalog_file_path, file_stamp)
+        except (OSError, ValueError, KeyError, TypeError, sqlite3.Error) as e:
+            # Half written, locked or corrupt databases raise sqlite3 errors, and JSON of the wrong shape ValueErrors
+            # from check_catalog_shape. The watcher keeps polling, and loads the file once it changes again.
+            logger.warning(
+                "Couldn't load the changed %s, still serving version %s: %s",
+                self.catalog_file_path,
+                self.snapshot.version,
+                e,
+            )
+            return
+        self.snapshot = snapshot
+        self.reloads += 1
+        logger.info(
+            "Loaded version %s of %s in %.1f ms",
+            snapshot.version,
+            self.catalog_file_path,
+            (time.perf_counter() - start) * 1000,
+        )
+
+
+class CatalogRequestHandler(BaseHTTPRequestHandler):
+    service: CatalogService
+
+    def do_GET(self) -> None:
+        if urlsplit(self.path).path.rstrip("/") == STATUS_PATH:
+            self.send_body(
+                HTTPStatus.OK, json.dumps(self.service.get_status()).encode("utf8")
+            )
+            return
+        snapshot = self.service.snapshot
+        # Clients that already have this version of a response get told so without it being sent again
+        if self.headers.get("If-None-Match") == f'"{snapshot.version}"':
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.end_headers()
+            return
+        self.send_body(*snapshot.get_response(self.path), snapshot.version)
+
+    def send_body(self, status: int, body: bytes, version: str | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", JSON_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        if version is not None:
+            self.send_header("ETag", f'"{version}"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix socket"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class ThreadingUnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+def create_server(
+    service: CatalogService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    unix_socket_path: str | None = None,
+) -> socketserver.BaseServer:
+    handler = type(
+        "BoundCatalogRequestHandler", (CatalogRequestHandler,), {"service": service}
+    )
+    if unix_socket_path is not None:
+        if os.path.exists(unix_socket_path):
+            os.remove(unix_socket_path)
+        return ThreadingUnixHTTPServer(unix_socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    load_dotenv(".env")
+    parser = argparse.ArgumentParser(
+        description="Serves lookups into a command catalog over a local HTTP API, and reloads it whenever the catalog file changes."
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="The catalog to serve: a JSON, NDJSON or SQLite catalog, with one or several models.",
+        default=os.environ.get("OUTPUT_FILE_PATH") or "output.json",
+    )
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST)
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="0 picks a free port, which gets printed once the service is up.",
+    )
+    parser.add_argument(
+        "--unix-socket",
+        type=str,
+        default=None,
+        help="Serve on this Unix socket instead of a TCP port.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        help="How often, in seconds, the catalog file gets checked for changes.",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="DEBUG also logs every request.",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=args.log_level, format="%(levelname)s %(name)s: %(message)s"
+    )
+    service = CatalogService(args.catalog, args.poll_interval)
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    service.start_watching()
+    # Service managers stop daemons with SIGTERM, which should clean up like Ctrl+C does
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if args.unix_socket is not None:
+        logger.info("Serving %s on %s", args.catalog, args.unix_socket)
+    else:
+        host, port = server.server_address[:2]
+        logger.info("Serving %s on http://%s:%d", args.catalog, host, port)
+        print(f"{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        if args.unix_socket is not None and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
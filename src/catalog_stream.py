@@ -0,0 +1,122 @@
+import argparse
+import json
+import logging
+
+from dataclasses import asdict
+from typing import Final, TextIO
+
+logger = logging.getLogger(__name__)
+
+# Every line of an NDJSON catalog is a JSON object with a "record_type":
+#   "catalog" - always the first line, holds the model name and its command categories in TOC order
+#   "command" - one per table row, holds its category, source page (1-based) and the CommandDetails fields
+#   "end"     - only written once the whole manual was processed, so truncated runs can be spotted
+CATALOG_RECORD: Final = "catalog"
+COMMAND_RECORD: Final = "command"
+END_RECORD: Final = "end"
+
+
+class NdjsonCatalogWriter:
+    # Writes one record per command as soon as its page is processed, so memory stays flat and a crashed run
+    # still leaves every finished page on disk
+    def __init__(
+        self, output_file_path: str, model_name: str, command_categories: list[str]
+    ):
+        self.output_file_path = output_file_path
+        self.commands_written = 0
+        self.file: TextIO = open(output_file_path, "w", encoding="utf8")
+        self.write_record(
+            {
+                "record_type": CATALOG_RECORD,
+                "model": model_name,
+                "categories": command_categories,
+            }
+        )
+
+    def write_record(self, record: dict) -> None:
+        self.file.write(json.dumps(record))
+        self.file.write("\n")
+
+    def write_page(self, page_number: int, page_commands: list) -> None:
+        for category, _, _, command_details in page_commands:
+            self.write_record(
+                {
+                    "record_type": COMMAND_RECORD,
+                    "category": category,
+                    "page": page_number + 1,
+                    **asdict(command_details),
+                }
+            )
+            self.commands_written += 1
+        self.file.flush()
+
+    def close(self) -> None:
+        self.write_record(
+            {"record_type": END_RECORD, "commands": self.commands_written}
+        )
+        self.file.close()
+        logger.info(
+            "Wrote %d commands to %s without errors!",
+            self.commands_written,
+            self.output_file_path,
+        )
+
+
+def read_ndjson_catalog(input_file_path: str) -> dict:
+    # Rebuilds the nested catalog that the JSON output format writes, from an NDJSON stream
+    catalog = None
+    is_complete = False
+    with open(input_file_path, "r", encoding="utf8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record_type = record.pop("record_type")
+            if record_type == CATALOG_RECORD:
+                categories = record["categories"]
+                scope_queries = {category: [] for category in categories}
+                scope_commands = {category: [] for category in categories}
+                detailed_commands_by_category = {
+                    category: [] for category in categories
+                }
+                catalog = {
+                    record["model"]: {
+                        "Scope Queries": scope_queries,
+                        "Scope Commands": scope_commands,
+                        "Detailed Commands": detailed_commands_by_category,
+                    }
+                }
+            elif record_type == COMMAND_RECORD:
+                category = record.pop("category")
+                record.pop("page")
+                if record["command_name"] is not None:
+                    scope_commands[category].append(record["command_name"])
+                if record["query_name"] is not None:
+                    scope_queries[category].append(record["query_name"])
+                detailed_commands_by_category[category].append(record)
+            elif record_type == END_RECORD:
+                is_complete = True
+    if catalog is None:
+        raise ValueError(f"{input_file_path} has no catalog record")
+    if not is_complete:
+        logger.warning(
+            "%s has no end record, the run that wrote it didn't finish",
+            input_file_path,
+        )
+    return catalog
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuilds the nested JSON command catalog from an NDJSON stream."
+    )
+    parser.add_argument("input_file_path", type=str, help="The NDJSON file to read.")
+    parser.add_argument(
+        "output_file_path", type=str, help="The JSON file to write the catalog to."
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(levelname)s %(name)s: %(message)s"
+    )
+    with open(args.output_file_path, "w", encoding="utf8") as f:
+        json.dump(read_ndjson_catalog(args.input_file_path), f, indent=4)
@@ -0,0 +1,70 @@
+import enum
+
+from dataclasses import dataclass, field
+
+from scpi_syntax import VariableDefinition, find_first_enum, render_syntax
+
+
+class ReturnElement(enum.Enum):
+    NR1_FORMAT = "NR1"
+    NR3_FORMAT = "NR3"
+    UNQUOTED_STRING = "UNQUOTED"
+    QUOTED_STRING = "QUOTED"
+    ENUM_FORMAT = "ENUM"
+    INLINE_ENUM_FORMAT = "INLINE_ENUM"
+    UNKNOWN = "UNKNOWN"
+
+
+@dataclass(slots=True)
+class CommandDetails:
+    has_variables_in_command: bool = False
+    has_inline_variables_in_command: bool = False
+    has_variables_in_query: bool = False
+    has_inline_variables_in_query: bool = False
+    command_variable_names: list[str] = field(default_factory=list)
+    query_variable_names: list[str] = field(default_factory=list)
+    variable_list: list[dict] = field(default_factory=list)
+    command_name: str | None = None
+    query_name: str | None = None
+    return_description: str | None = None
+    is_implemented: bool = False
+
+
+def determine_value_type(variable_definition: VariableDefinition) -> ReturnElement:
+    line_to_target = render_syntax(variable_definition.body).lower()
+    if "nr1" in line_to_target:
+        return ReturnElement.NR1_FORMAT
+    elif "nr3" in line_to_target:
+        return ReturnElement.NR3_FORMAT
+    elif "unquoted" in line_to_target:
+        return ReturnElement.UNQUOTED_STRING
+    elif "quoted" in line_to_target or "quotation" in line_to_target:
+        return ReturnElement.QUOTED_STRING
+    elif find_first_enum(variable_definition.body) is not None:
+        return ReturnElement.ENUM_FORMAT
+    # Some definitions describe the value in words instead of naming the format
+    elif "integer" in line_to_target:
+        return ReturnElement.NR1_FORMAT
+    elif "real number" in line_to_target or "floating" in line_to_target:
+        return ReturnElement.NR3_FORMAT
+    elif "string" in line_to_target:
+        return ReturnElement.UNQUOTED_STRING
+    else:
+        return ReturnElement.UNKNOWN
+
+
+def get_response_variable(command_definition: dict) -> tuple[str, object] | None:
+    # The variable a query answers with: the first command variable that isn't also part of the query header (like
+    # the <n> of CHANnel<n>). The builder doesn't keep <return_value> definitions in variable_list.
+    variable_types = {}
+    for variable in command_definition["variable_list"]:
+        variable_types.update(variable)
+    for name in command_definition["command_variable_names"]:
+        if name not in command_definition["query_variable_names"] and (
+            name in variable_types
+        ):
+            return name, variable_types[name]
+    for name, value_type in variable_types.items():
+        if name not in command_definition["query_variable_names"]:
+            return name, value_type
+    return None
@@ -0,0 +1,111 @@
+import re
+
+from bisect import bisect_left
+from typing import Final, NamedTuple
+
+# Mnemonics are matched on both their long form (TIMebase -> timebase) and their short form, which is the leading
+# upper case letters plus any digits (TIMebase -> tim). Variables and the brackets around optional mnemonics are
+# ignored, so ":TRIGger[:EDGE]:SLOPe <slope>" is indexed under TRIGger, EDGE and SLOPe.
+VARIABLE_PATTERN: Final = re.compile(r"<[^<>]*>")
+MNEMONIC_PATTERN: Final = re.compile(r"[A-Za-z]+[0-9]*")
+SHORT_FORM_PATTERN: Final = re.compile(r"^[A-Z]+")
+SEARCH_TOKEN_PATTERN: Final = re.compile(r"[a-z0-9]+")
+# Per-token lookups are kept between keystrokes, and dropped once there are this many
+TOKEN_CACHE_SIZE: Final = 1024
+
+
+# A named tuple rather than a frozen dataclass, as the GUI's catalog snapshot unpickles thousands of them on every
+# start, and tuples unpickle without a Python-level __setstate__ call each
+class SearchEntry(NamedTuple):
+    model_name: str
+    category: str
+    kind: str  # "Command" or "Query"
+    name: str
+    return_description: str
+
+
+class TrieNode:
+    __slots__ = ("children", "entry_ids")
+
+    def __init__(self):
+        self.children: dict[str, "TrieNode"] = {}
+        # Every entry with a mnemonic starting with the prefix this node represents
+        self.entry_ids: set[int] = set()
+
+
+def get_mnemonic_keys(name: str) -> set[str]:
+    header = VARIABLE_PATTERN.sub("", name.split(" ")[0])
+    keys = set()
+    for mnemonic in MNEMONIC_PATTERN.findall(header):
+        keys.add(mnemonic.lower())
+        if short_form := SHORT_FORM_PATTERN.match(mnemonic):
+            digits = mnemonic[len(mnemonic.rstrip("0123456789")) :]
+            keys.add((short_form.group(0) + digits).lower())
+    return keys
+
+
+class CommandSearchIndex:
+    # Built once from every command and query of the catalog. A query is split into tokens, and an entry matches
+    # when each token is the prefix of one of its mnemonics, or of a word in its return description. Each token
+    # costs a walk down the mnemonic trie and a binary search over the description words, so the full catalog
+    # never gets rescanned.
+    def __init__(self, entries: list[SearchEntry]):
+        self.entries = entries
+        self.mnemonic_trie = TrieNode()
+        entry_ids_by_word: dict[str, set[int]] = {}
+        for entry_id, entry in enumerate(entries):
+            for key in get_mnemonic_keys(entry.name):
+                node = self.mnemonic_trie
+                for character in key:
+                    node = node.children.setdefault(character, TrieNode())
+                    node.entry_ids.add(entry_id)
+            for word in SEARCH_TOKEN_PATTERN.findall(entry.return_description.lower()):
+                entry_ids_by_word.setdefault(word, set()).add(entry_id)
+        self.description_words = sorted(entry_ids_by_word)
+        self.description_entry_ids = [
+            entry_ids_by_word[word] for word in self.description_words
+        ]
+        self._token_cache: dict[str, frozenset[int]] = {}
+
+    def find_mnemonic_prefix(self, token: str) -> set[int]:
+        node = self.mnemonic_trie
+        for character in token:
+            node = node.children.get(character)
+            if node is None:
+                return set()
+        return node.entry_ids
+
+    def find_description_prefix(self, token: str) -> set[int]:
+        entry_ids = set()
+        index = bisect_left(self.description_words, token)
+        while index < len(self.description_words) and self.description_words[
+            index
+        ].startswith(token):
+            entry_ids |= self.description_entry_ids[index]
+            index += 1
+        return entry_ids
+
+    def find_token(self, token: str) -> frozenset[int]:
+        if (entry_ids := self._token_cache.get(token)) is not None:
+            return entry_ids
+        if len(self._token_cache) >= TOKEN_CACHE_SIZE:
+            self._token_cache.clear()
+        entry_ids = frozenset(
+            self.find_mnemonic_prefix(token) | self.find_description_prefix(token)
+        )
+        self._token_cache[token] = entry_ids
+        return entry_ids
+
+    def search(self, query: str) -> list[SearchEntry]:
+        tokens = SEARCH_TOKEN_PATTERN.findall(query.lower())
+        if not tokens:
+            return []
+        # Intersecting from the smallest set keeps the work proportional to the rarest token
+        matches = sorted((self.find_token(token) for token in tokens), key=len)
+        entry_ids = set(matches[0])
+        for token_entry_ids in matches[1:]:
+            entry_ids &= token_entry_ids
+            if not entry_ids:
+                return []
+        # Entry ids follow the catalog order
+        return [self.entries[entry_id] for entry_id in sorted(entry_ids)]
@@ -0,0 +1,473 @@
+import argparse
+import math
+import os
+import re
+
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Final
+
+from dotenv import load_dotenv
+
+from catalog_database import read_catalog_file
+from command_details import ReturnElement
+from scpi_syntax import (
+    DIGITS,
+    HEADER_SEPARATOR,
+    PARAMETER_SEPARATOR,
+    QUERY_MARK,
+    Literal,
+    OptionalGroup,
+    ScpiHeaderIndex,
+    SyntaxNode,
+    Variable,
+    expand_header_variants,
+    find_first_enum,
+    get_enum_values,
+    get_header,
+    get_short_form,
+    parse_syntax,
+    render_syntax,
+    split_outside_quotes,
+    split_variable_definitions,
+)
+
+# Each catalog command or query gets compiled once, the first time it's used, into the checks its parameters need:
+# enum variables become frozensets of every accepted spelling (upper case long and short forms), and NR1 / NR3
+# variables a type check, or a regex match for text. Building or validating a command after that is a dict lookup
+# plus a check per parameter.
+NR1_PATTERN: Final = re.compile(r"[+-]?\d+")
+# NR3 variables also accept NR1 and NR2 numbers, as instruments do
+NR3_PATTERN: Final = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+# For variables followed by [suffix], like <scale>[suffix], e.g. 500mV
+NR3_WITH_SUFFIX_PATTERN: Final = re.compile(
+    r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*[A-Za-z]*"
+)
+# Numeric suffixes, like the 1 of CHAN1, are plain digits. Their range comes from the variable's definition in the
+# return description, e.g. "<n> ::= 1 or 2 in NR1 format" allows 1 to 2.
+NUMERIC_SUFFIX_PATTERN: Final = re.compile(r"\d+")
+SUFFIX_RANGE_NUMBER_PATTERN: Final = re.compile(r"(?<![\w.])\d+(?!\w|\.\d)")
+UNQUOTED_PATTERN: Final = re.compile(r"[^\s,;\"']+")
+QUOTES: Final = "\"'"
+# Inline enum parameters (e.g. :TIMebase:REFerence {LEFT | CENTer | RIGHt}) don't have a name of their own. They're
+# only used by commands without named parameters, so the name can't clash.
+INLINE_PARAMETER_NAME: Final = "value"
+SUFFIX_OPTION: Final = "suffix"
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledVariable:
+    name: str
+    value_type: str  # A ReturnElement value
+    is_optional: bool = False
+    spellings: frozenset[str] = frozenset()
+    # Enum values that take a numeric suffix, like CHANnel<n>, without it -> the range of that suffix, if known
+    suffixed_spellings: dict[str, tuple[int, int] | None] = field(default_factory=dict)
+    allows_unit_suffix: bool = False
+    # Header variables, like the <n> of CHANnel<n>, are numeric suffixes
+    is_numeric_suffix: bool = False
+    suffix_range: tuple[int, int] | None = None
+
+    def check_text(self, text: str) -> None:
+        value_type = self.value_type
+        if self.is_numeric_suffix:
+            if is_valid_suffix(text, self.suffix_range):
+                return
+            value_type = "numeric suffix" + describe_suffix_range(self.suffix_range)
+        elif value_type == ReturnElement.ENUM_FORMAT.value:
+            upper_text = text.upper()
+            if upper_text in self.spellings:
+                return
+            stripped_text = upper_text.rstrip(DIGITS)
+            if stripped_text in self.suffixed_spellings and is_valid_suffix(
+                upper_text[len(stripped_text) :],
+                self.suffixed_spellings[stripped_text],
+            ):
+                return
+        elif value_type == ReturnElement.NR1_FORMAT.value:
+            if NR1_PATTERN.fullmatch(text):
+                return
+        elif value_type == ReturnElement.NR3_FORMAT.value:
+            pattern = (
+                NR3_WITH_SUFFIX_PATTERN if self.allows_unit_suffix else NR3_PATTERN
+            )
+            if pattern.fullmatch(text):
+                return
+        elif value_type == ReturnElement.QUOTED_STRING.value:
+            if len(text) >= 2 and text[0] in QUOTES and text[-1] == text[0]:
+                return
+        elif value_type == ReturnElement.UNQUOTED_STRING.value:
+            if UNQUOTED_PATTERN.fullmatch(text):
+                return
+        # Variables the catalog couldn't type only have to keep to their own message unit
+        elif text and ";" not in text and "\n" not in text:
+            return
+        raise ValueError(f"{text!r} isn't a valid {value_type} value for <{self.name}>")
+
+    def format_value(self, value: object) -> str:
+        # Python numbers skip the text checks, strings are passed through once they're checked. Numeric suffixes
+        # are always checked, for their range.
+        value_type = self.value_type
+        if value_type == ReturnElement.NR1_FORMAT.value and not self.is_numeric_suffix:
+            if type(value) is int:
+                return str(value)
+        elif value_type == ReturnElement.NR3_FORMAT.value:
+            if type(value) is int or type(value) is float:
+                if not math.isfinite(value):
+                    raise ValueError(
+                        f"{value} isn't a valid NR3 value for <{self.name}>"
+                    )
+                return str(value)
+        elif value_type == ReturnElement.QUOTED_STRING.value:
+            if type(value) is str and not (value and value[0] in QUOTES):
+                return '"' + value.replace('"', '""') + '"'
+        text = str(value)
+        self.check_text(text)
+        return text
+
+
+def is_valid_suffix(suffix: str, suffix_range: tuple[int, int] | None) -> bool:
+    if not NUMERIC_SUFFIX_PATTERN.fullmatch(suffix):
+        return False
+    return suffix_range is None or suffix_range[0] <= int(suffix) <= suffix_range[1]
+
+
+def describe_suffix_range(suffix_range: tuple[int, int] | None) -> str:
+    if suffix_range is None:
+        return ""
+    return f" from {suffix_range[0]} to {suffix_range[1]}"
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledCommand:
+    name: str
+    # The header to send, with None in place of each header variable
+    header_parts: tuple[str | None, ...]
+    # (index in header_parts, variable) for each variable of the header, like the <n> of CHANnel<n>
+    header_variables: tuple[tuple[int, CompiledVariable], ...]
+    # The short form of each header mnemonic that takes a numeric suffix -> its variable, e.g. CHAN -> <n>
+    suffix_variables: dict[str, CompiledVariable]
+    parameters: tuple[CompiledVariable, ...]
+    required_parameter_count: int
+
+    def format(self, **values: object) -> str:
+        # Builds the program message unit, e.g. format(n=1, scale=0.5) gives ":CHANnel1:SCALe 0.5"
+        header_parts = list(self.header_parts)
+        used_value_count = 0
+        for index, variable in self.header_variables:
+            if (value := values.get(variable.name)) is None:
+                raise ValueError(f"{self.name} needs a value for <{variable.name}>")
+            header_parts[index] = variable.format_value(value)
+            used_value_count += 1
+        parameters = []
+        for variable in self.parameters:
+            if (value := values.get(variable.name)) is None:
+                if variable.is_optional:
+                    continue
+                raise ValueError(f"{self.name} needs a value for <{variable.name}>")
+            parameters.append(variable.format_value(value))
+            used_value_count += 1
+        if used_value_count != len(values):
+            unknown_names = set(values) - {
+                variable.name for _, variable in self.header_variables
+            }
+            unknown_names -= {variable.name for variable in self.parameters}
+            raise ValueError(f"{self.name} has no variables {sorted(unknown_names)}")
+        if not parameters:
+            return "".join(header_parts)
+        return "".join(header_parts) + " " + PARAMETER_SEPARATOR.join(parameters)
+
+    def check_parameters(self, parameter_text: str) -> None:
+        parameters = (
+            split_outside_quotes(parameter_text, PARAMETER_SEPARATOR)
+            if parameter_text
+            else []
+        )
+        if not (
+            self.required_parameter_count <= len(parameters) <= len(self.parameters)
+        ):
+            raise ValueError(
+                f"{self.name} takes {self.required_parameter_count} to {len(self.parameters)} parameters, "
+                f"not {len(parameters)}"
+            )
+        for variable, parameter in zip(self.parameters, parameters):
+            variable.check_text(parameter)
+
+
+def get_suffix_ranges(return_description: str | None) -> dict[str, tuple[int, int]]:
+    # The lowest and highest whole number in each variable definition. Only used for numeric suffixes, whose
+    # definitions read like "1 or 2" or "1 to 4".
+    suffix_ranges = {}
+    for variable_definition in split_variable_definitions(
+        parse_syntax(return_description or "")
+    ):
+        numbers = [
+            int(number)
+            for number in SUFFIX_RANGE_NUMBER_PATTERN.findall(
+                render_syntax(variable_definition.body)
+            )
+        ]
+        if numbers:
+            suffix_ranges[variable_definition.name] = (min(numbers), max(numbers))
+    return suffix_ranges
+
+
+def compile_variable(
+    name: str,
+    value_type: object,
+    is_optional: bool,
+    allows_unit_suffix: bool,
+    suffix_ranges: dict[str, tuple[int, int]],
+) -> CompiledVariable:
+    if not isinstance(value_type, list):
+        return CompiledVariable(
+            name,
+            value_type or ReturnElement.UNKNOWN.value,
+            is_optional,
+            allows_unit_suffix=allows_unit_suffix,
+        )
+    spellings = set()
+    suffixed_spellings = {}
+    for enum_value in value_type:
+        # Values like CHANnel<n> take a numeric suffix in place of their variable
+        enum_nodes = parse_syntax(enum_value)
+        if (
+            len(enum_nodes) == 2
+            and type(enum_nodes[0]) is Literal
+            and type(enum_nodes[1]) is Variable
+        ):
+            enum_value = enum_nodes[0].text
+            suffix_range = suffix_ranges.get(enum_nodes[1].name)
+            suffixed_spellings[enum_value.upper()] = suffix_range
+            suffixed_spellings[get_short_form(enum_value)] = suffix_range
+        else:
+            spellings.add(enum_value.upper())
+            spellings.add(get_short_form(enum_value))
+    return CompiledVariable(
+        name,
+        ReturnElement.ENUM_FORMAT.value,
+        is_optional,
+        frozenset(spellings),
+        suffixed_spellings,
+    )
+
+
+def get_parameter_variables(nodes: list[SyntaxNode]) -> list[tuple[str, bool, bool]]:
+    # (name, is optional, is followed by [suffix]) of each variable after the header, in order
+    parameter_variables = []
+    for index, node in enumerate(nodes):
+        if type(node) is Variable:
+            next_node = nodes[index + 1] if index + 1 < len(nodes) else None
+            allows_unit_suffix = (
+                type(next_node) is OptionalGroup
+                and len(next_node.children) == 1
+                and type(next_node.children[0]) is Literal
+                and next_node.children[0].text.strip() == SUFFIX_OPTION
+            )
+            parameter_variables.append((node.name, False, allows_unit_suffix))
+        elif type(node) is OptionalGroup:
+            parameter_variables.extend(
+                (name, True, allows_unit_suffix)
+                for name, _, allows_unit_suffix in get_parameter_variables(
+                    node.children
+                )
+            )
+    return parameter_variables
+
+
+def compile_command(name: str, command_definition: dict) -> CompiledCommand:
+    variable_types = {}
+    for variable in command_definition["variable_list"]:
+        variable_types.update(variable)
+    suffix_ranges = get_suffix_ranges(command_definition["return_description"])
+    header = get_header(name)
+    # The shortest spelling of the header gets sent, leaving out optional mnemonics
+    header_nodes = min(
+        expand_header_variants(parse_syntax(header)), key=lambda variant: len(variant)
+    )
+    header_parts = []
+    header_variables = []
+    suffix_variables = {}
+    for node in header_nodes:
+        if type(node) is Variable:
+            # Header variables are numeric suffixes, whatever their return description says
+            variable = CompiledVariable(
+                node.name,
+                ReturnElement.NR1_FORMAT.value,
+                is_numeric_suffix=True,
+                suffix_range=suffix_ranges.get(node.name),
+            )
+            header_variables.append((len(header_parts), variable))
+            if header_parts:
+                mnemonic = header_parts[-1].rsplit(HEADER_SEPARATOR, 1)[-1]
+                suffix_variables[get_short_form(mnemonic)] = variable
+            header_parts.append(None)
+        else:
+            header_parts.append(node.text)
+    parameter_nodes = parse_syntax(name.strip()[len(header) :])
+    parameters = [
+        compile_variable(
+            variable_name,
+            variable_types.get(variable_name),
+            is_optional,
+            allows_unit_suffix,
+            suffix_ranges,
+        )
+        for variable_name, is_optional, allows_unit_suffix in get_parameter_variables(
+            parameter_nodes
+        )
+    ]
+    # Inline enums come from the syntax, since the catalog only lists them for commands without named variables
+    if not parameters and (inline_enum := find_first_enum(parameter_nodes)):
+        parameters.append(
+            compile_variable(
+                INLINE_PARAMETER_NAME,
+                get_enum_values(inline_enum),
+                False,
+                False,
+                suffix_ranges,
+            )
+        )
+    return CompiledCommand(
+        name,
+        tuple(header_parts),
+        tuple(header_variables),
+        suffix_variables,
+        tuple(parameters),
+        sum(1 for variable in parameters if not variable.is_optional),
+    )
+
+
+class CommandValidator:
+    # Builds and checks program message units for one model's catalog. Commands are looked up by their catalog name
+    # (e.g. ":CHANnel<n>:SCALe <scale>[suffix]") to build them, and by any header spelling to validate them.
+    def __init__(self, model_catalog: dict):
+        self.command_definitions: dict[str, dict] = {}
+        self.header_index = ScpiHeaderIndex()
+        for command_definitions in model_catalog["Detailed Commands"].values():
+            for command_definition in command_definitions:
+                for name in (
+                    command_definition["command_name"],
+                    command_definition["query_name"],
+                ):
+                    if name and name not in self.command_definitions:
+                        self.command_definitions[name] = command_definition
+                        self.header_index.add(name, name)
+        self.compiled_commands: dict[str, CompiledCommand] = {}
+
+    def compile(self, name: str) -> CompiledCommand:
+        if (compiled_command := self.compiled_commands.get(name)) is not None:
+            return compiled_command
+        command_definition = self.command_definitions.get(name)
+        if command_definition is None:
+            raise KeyError(f"{name} isn't in the catalog")
+        compiled_command = compile_command(name, command_definition)
+        self.compiled_commands[name] = compiled_command
+        return compiled_command
+
+    def format(self, name: str, **values: object) -> str:
+        return self.compile(name).format(**values)
+
+    def validate(self, unit: str) -> CompiledCommand:
+        # Checks a program message unit someone else built, e.g. ":chan1:scal 0.5", returning its catalog entry
+        unit = unit.strip()
+        header = get_header(unit)
+        match = self.header_index.find(header)
+        if match is None:
+            raise ValueError(f"{header} isn't in the catalog")
+        compiled_command = self.compile(match[0])
+        mnemonics = [
+            mnemonic
+            for mnemonic in header.rstrip(QUERY_MARK).upper().split(HEADER_SEPARATOR)
+            if mnemonic
+        ]
+        for mnemonic, suffix in zip(mnemonics, match[1]):
+            short_form = self.header_index.short_forms[
+                mnemonic[: len(mnemonic) - len(suffix)]
+            ]
+            variable = compiled_command.suffix_variables.get(short_form)
+            if variable is None:
+                if suffix:
+                    raise ValueError(f"{mnemonic} doesn't take a numeric suffix")
+            elif not is_valid_suffix(suffix, variable.suffix_range):
+                raise ValueError(
+                    f"{mnemonic} needs a numeric suffix{describe_suffix_range(variable.suffix_range)}"
+                )
+        compiled_command.check_parameters(unit[len(header) :].strip())
+        return compiled_command
+
+
+def get_sample_value(variable: CompiledVariable) -> object:
+    # A valid value for any variable, for building every command of a catalog
+    if variable.value_type == ReturnElement.ENUM_FORMAT.value:
+        if variable.spellings:
+            return min(variable.spellings)
+        spelling = min(variable.suffixed_spellings)
+        suffix_range = variable.suffixed_spellings[spelling]
+        return spelling + str(suffix_range[0] if suffix_range else 1)
+    if variable.suffix_range is not None:
+        return variable.suffix_range[0]
+    if variable.value_type == ReturnElement.NR3_FORMAT.value:
+        return 1.0
+    if variable.value_type == ReturnElement.QUOTED_STRING.value:
+        return "sample"
+    if variable.value_type == ReturnElement.UNQUOTED_STRING.value:
+        return "SAMPLE"
+    return 1
+
+
+def get_sample_values(compiled_command: CompiledCommand) -> dict[str, object]:
+    variables = [variable for _, variable in compiled_command.header_variables]
+    variables += compiled_command.parameters
+    return {variable.name: get_sample_value(variable) for variable in variables}
+
+
+if __name__ == "__main__":
+    load_dotenv(".env")
+    parser = argparse.ArgumentParser(
+        description="Builds and validates every command and query of a catalog with sample values, and times it."
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="A catalog database, NDJSON stream, or single or merged JSON catalog.",
+        default=os.environ.get("OUTPUT_FILE_PATH") or "output.json",
+    )
+    parser.add_argument("--model-name", type=str, default=None)
+    parser.add_argument(
+        "--repeat", type=int, default=100, help="Times every command gets built."
+    )
+    args = parser.parse_args()
+    catalog = read_catalog_file(args.catalog, args.model_name)
+    model_name, model_catalog = next(iter(catalog.items()))
+    command_validator = CommandValidator(model_catalog)
+    start = perf_counter()
+    for name in command_validator.command_definitions:
+        command_validator.compile(name)
+    compile_time = perf_counter() - start
+    samples = []
+    for name, compiled_command in command_validator.compiled_commands.items():
+        sample_values = get_sample_values(compiled_command)
+        try:
+            samples.append(
+                (name, sample_values, compiled_command.format(**sample_values))
+            )
+        except ValueError as e:
+            print(f"Can't build {name}: {e}")
+    start = perf_counter()
+    for _ in range(args.repeat):
+        for name, sample_values, _ in samples:
+            command_validator.format(name, **sample_values)
+    format_time = perf_counter() - start
+    start = perf_counter()
+    for _ in range(args.repeat):
+        for _, _, unit in samples:
+            command_validator.validate(unit)
+    validate_time = perf_counter() - start
+    operation_count = max(1, len(samples) * args.repeat)
+    print(
+        f"{model_name}: compiled {len(command_validator.compiled_commands)} commands and queries in "
+        f"{compile_time * 1000:.1f} ms"
+    )
+    print(f"format:   {format_time / operation_count * 1e6:.2f} us per command")
+    print(f"validate: {validate_time / operation_count * 1e6:.2f} us per command")
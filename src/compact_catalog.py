@@ -0,0 +1,346 @@
+from array import array
+from dataclasses import dataclass
+from typing import Final
+
+# The nested catalog the builders write holds every string again in every record: category names, value types like
+# "NR1", enum lists like ["ON", "OFF"], and the same commands in every model of a family. The compact catalog keeps
+# each command as a slotted record, interns every string, and shares each tuple of strings (variable names, enum
+# values) and each whole record between every command and model holding the same values. The columnar catalog goes
+# further, storing each field as an array indexed by command ID. Both give back the usual nested catalog with
+# to_catalog.
+DETAILED_COMMANDS_KEY: Final = "Detailed Commands"
+SCOPE_COMMANDS_KEY: Final = "Scope Commands"
+SCOPE_QUERIES_KEY: Final = "Scope Queries"
+# The boolean CommandDetails fields, in the order of their bits in the columnar flags column
+FLAG_FIELDS: Final = (
+    "has_variables_in_command",
+    "has_inline_variables_in_command",
+    "has_variables_in_query",
+    "has_inline_variables_in_query",
+    "is_implemented",
+)
+
+# (variable name, value type, or a tuple of enum values)
+CompactVariable = tuple[str, str | tuple[str, ...]]
+
+
+@dataclass(slots=True, frozen=True)
+class CompactCommand:
+    has_variables_in_command: bool
+    has_inline_variables_in_command: bool
+    has_variables_in_query: bool
+    has_inline_variables_in_query: bool
+    command_variable_names: tuple[str, ...]
+    query_variable_names: tuple[str, ...]
+    # The variable_list entries, in order
+    variables: tuple[CompactVariable, ...]
+    command_name: str | None
+    query_name: str | None
+    return_description: str | None
+    is_implemented: bool
+
+    def to_dict(self) -> dict:
+        # The command definition as the builders write it, in the same key order
+        return {
+            "has_variables_in_command": self.has_variables_in_command,
+            "has_inline_variables_in_command": self.has_inline_variables_in_command,
+            "has_variables_in_query": self.has_variables_in_query,
+            "has_inline_variables_in_query": self.has_inline_variables_in_query,
+            "command_variable_names": list(self.command_variable_names),
+            "query_variable_names": list(self.query_variable_names),
+            "variable_list": variables_to_list(self.variables),
+            "command_name": self.command_name,
+            "query_name": self.query_name,
+            "return_description": self.return_description,
+            "is_implemented": self.is_implemented,
+        }
+
+
+def variables_to_list(variables: tuple[CompactVariable, ...]) -> list[dict]:
+    return [
+        {name: list(value_type) if isinstance(value_type, tuple) else value_type}
+        for name, value_type in variables
+    ]
+
+
+class CatalogInterner:
+    # Hands back one shared instance for every equal string, tuple or record. Share one between catalogs to
+    # deduplicate across them.
+    def __init__(self):
+        self.shared: dict[object, object] = {}
+
+    def string(self, value: str | None) -> str | None:
+        # Strings go through the same table as everything else rather than sys.intern, so their cost stays with the
+        # catalogs holding them
+        return None if value is None else self.share(value)
+
+    def share(self, value: object) -> object:
+        return self.shared.setdefault(value, value)
+
+    def strings(self, values: list[str]) -> tuple[str, ...]:
+        return self.share(tuple(self.share(value) for value in values))
+
+    def variables(self, variable_list: list[dict]) -> tuple[CompactVariable, ...]:
+        return self.share(
+            tuple(
+                (
+                    self.share(name),
+                    (
+                        self.strings(value_type)
+                        if isinstance(value_type, list)
+                        else self.share(value_type)
+                    ),
+                )
+                for variable in variable_list
+                for name, value_type in variable.items()
+            )
+        )
+
+    def command(self, command_definition: dict) -> CompactCommand:
+        return self.share(
+            CompactCommand(
+                has_variables_in_command=command_definition["has_variables_in_command"],
+                has_inline_variables_in_command=command_definition[
+                    "has_inline_variables_in_command"
+                ],
+                has_variables_in_query=command_definition["has_variables_in_query"],
+                has_inline_variables_in_query=command_definition[
+                    "has_inline_variables_in_query"
+                ],
+                command_variable_names=self.strings(
+                    command_definition["command_variable_names"]
+                ),
+                query_variable_names=self.strings(
+                    command_definition["query_variable_names"]
+                ),
+                variables=self.variables(command_definition["variable_list"]),
+                command_name=self.string(command_definition["command_name"]),
+                query_name=self.string(command_definition["query_name"]),
+                return_description=self.string(
+                    command_definition["return_description"]
+                ),
+                is_implemented=command_definition["is_implemented"],
+            )
+        )
+
+
+def build_model_catalog(
+    categories: tuple[str, ...], command_definitions_by_category: list[list[dict]]
+) -> dict:
+    # The nested catalog of one model. The builders list a category's commands and queries in the same order as
+    # its detailed commands, so both lists are rebuilt from them.
+    return {
+        SCOPE_QUERIES_KEY: {
+            category: [
+                command_definition["query_name"]
+                for command_definition in command_definitions
+                if command_definition["query_name"] is not None
+            ]
+            for category, command_definitions in zip(
+                categories, command_definitions_by_category
+            )
+        },
+        SCOPE_COMMANDS_KEY: {
+            category: [
+                command_definition["command_name"]
+                for command_definition in command_definitions
+                if command_definition["command_name"] is not None
+            ]
+            for category, command_definitions in zip(
+                categories, command_definitions_by_category
+            )
+        },
+        DETAILED_COMMANDS_KEY: dict(zip(categories, command_definitions_by_category)),
+    }
+
+
+@dataclass(slots=True)
+class CompactModelCatalog:
+    categories: tuple[str, ...]
+    # The commands of each category, in the same order as categories
+    commands_by_category: tuple[tuple[CompactCommand, ...], ...]
+
+    def get_commands(self, category: str) -> tuple[CompactCommand, ...]:
+        return self.commands_by_category[self.categories.index(category)]
+
+    def to_model_catalog(self) -> dict:
+        return build_model_catalog(
+            self.categories,
+            [
+                [command.to_dict() for command in commands]
+                for commands in self.commands_by_category
+            ],
+        )
+
+
+class CompactCatalog:
+    def __init__(self, interner: CatalogInterner | None = None):
+        self.interner = interner if interner is not None else CatalogInterner()
+        self.models: dict[str, CompactModelCatalog] = {}
+
+    @classmethod
+    def from_catalog(
+        cls, catalog: dict, interner: CatalogInterner | None = None
+    ) -> "CompactCatalog":
+        # catalog is {model_name: nested model catalog}, as read_all_catalog_models returns it
+        compact_catalog = cls(interner)
+        for model_name, model_catalog in catalog.items():
+            compact_catalog.add_model(model_name, model_catalog)
+        return compact_catalog
+
+    def add_model(self, model_name: str, model_catalog: dict) -> None:
+        detailed_commands = model_catalog[DETAILED_COMMANDS_KEY]
+        self.models[model_name] = CompactModelCatalog(
+            categories=self.interner.strings(list(detailed_commands)),
+            commands_by_category=tuple(
+                tuple(
+                    self.interner.command(command_definition)
+                    for command_definition in command_definitions
+                )
+                for command_definitions in detailed_commands.values()
+            ),
+        )
+
+    def to_model_catalog(self, model_name: str) -> dict:
+        return self.models[model_name].to_model_catalog()
+
+    def to_catalog(self) -> dict:
+        return {
+            model_name: model.to_model_catalog()
+            for model_name, model in self.models.items()
+        }
+
+
+@dataclass(slots=True)
+class ColumnarModelCatalog:
+    categories: tuple[str, ...]
+    # Commands are numbered in catalog order, so each category's command IDs are the range between its start and
+    # the next category's
+    category_starts: array
+    flags: array
+    # Value table IDs, see ColumnarCatalog
+    command_names: array
+    query_names: array
+    return_descriptions: array
+    command_variable_names: array
+    query_variable_names: array
+    variables: array
+
+    def get_command_ids(self, category: str) -> range:
+        index = self.categories.index(category)
+        return range(self.category_starts[index], self.category_starts[index + 1])
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+
+class ColumnarCatalog:
+    # Every string and tuple is stored once, in a value table shared by all models, and each command field is an
+    # array of value IDs (4 bytes a command) instead of a reference (8 bytes) in a record of its own. ID 0 is None.
+    def __init__(self):
+        # Only needed while a model's columns are filled in, the value table is what deduplicates across models
+        self.interner = CatalogInterner()
+        self.values: list[object] = [None]
+        self.value_ids: dict[object, int] = {}
+        self.models: dict[str, ColumnarModelCatalog] = {}
+
+    @classmethod
+    def from_catalog(cls, catalog: dict) -> "ColumnarCatalog":
+        columnar_catalog = cls()
+        for model_name, model_catalog in catalog.items():
+            columnar_catalog.add_model(model_name, model_catalog)
+        return columnar_catalog
+
+    def get_value_id(self, value: object) -> int:
+        if value is None:
+            return 0
+        if (value_id := self.value_ids.get(value)) is None:
+            value_id = len(self.values)
+            self.values.append(value)
+            self.value_ids[value] = value_id
+        return value_id
+
+    def add_model(self, model_name: str, model_catalog: dict) -> None:
+        detailed_commands = model_catalog[DETAILED_COMMANDS_KEY]
+        model = ColumnarModelCatalog(
+            categories=self.interner.strings(list(detailed_commands)),
+            category_starts=array("I", [0]),
+            flags=array("B"),
+            command_names=array("I"),
+            query_names=array("I"),
+            return_descriptions=array("I"),
+            command_variable_names=array("I"),
+            query_variable_names=array("I"),
+            variables=array("I"),
+        )
+        for command_definitions in detailed_commands.values():
+            for command_definition in command_definitions:
+                command = self.interner.command(command_definition)
+                flags = 0
+                for bit, field_name in enumerate(FLAG_FIELDS):
+                    if getattr(command, field_name):
+                        flags |= 1 << bit
+                model.flags.append(flags)
+                model.command_names.append(self.get_value_id(command.command_name))
+                model.query_names.append(self.get_value_id(command.query_name))
+                model.return_descriptions.append(
+                    self.get_value_id(command.return_description)
+                )
+                model.command_variable_names.append(
+                    self.get_value_id(command.command_variable_names)
+                )
+                model.query_variable_names.append(
+                    self.get_value_id(command.query_variable_names)
+                )
+                model.variables.append(self.get_value_id(command.variables))
+            model.category_starts.append(len(model.flags))
+        self.models[model_name] = model
+        self.interner.shared.clear()
+
+    def get_command(self, model_name: str, command_id: int) -> dict:
+        model = self.models[model_name]
+        values = self.values
+        flags = model.flags[command_id]
+        flag_values = {
+            field_name: bool(flags & (1 << bit))
+            for bit, field_name in enumerate(FLAG_FIELDS)
+        }
+        return {
+            "has_variables_in_command": flag_values["has_variables_in_command"],
+            "has_inline_variables_in_command": flag_values[
+                "has_inline_variables_in_command"
+            ],
+            "has_variables_in_query": flag_values["has_variables_in_query"],
+            "has_inline_variables_in_query": flag_values[
+                "has_inline_variables_in_query"
+            ],
+            "command_variable_names": list(
+                values[model.command_variable_names[command_id]]
+            ),
+            "query_variable_names": list(
+                values[model.query_variable_names[command_id]]
+            ),
+            "variable_list": variables_to_list(values[model.variables[command_id]]),
+            "command_name": values[model.command_names[command_id]],
+            "query_name": values[model.query_names[command_id]],
+            "return_description": values[model.return_descriptions[command_id]],
+            "is_implemented": flag_values["is_implemented"],
+        }
+
+    def to_model_catalog(self, model_name: str) -> dict:
+        model = self.models[model_name]
+        return build_model_catalog(
+            model.categories,
+            [
+                [
+                    self.get_command(model_name, command_id)
+                    for command_id in model.get_command_ids(category)
+                ]
+                for category in model.categories
+            ],
+        )
+
+    def to_catalog(self) -> dict:
+        return {
+            model_name: self.to_model_catalog(model_name) for model_name in self.models
+        }
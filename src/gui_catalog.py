@@ -0,0 +1,270 @@
+import logging
+import os
+import pickle
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Final
+
+from command_search import CommandSearchIndex, SearchEntry
+
+logger = logging.getLogger(__name__)
+
+# Everything the GUI shows is saved next to the catalog as a pickle: the categories and names of every column, and the
+# search index, already built. Starting the GUI reads that one file instead of querying the catalog and indexing every
+# command again. The snapshot holds the catalog file's size, mtime and SHA-256: while the size and mtime match it's
+# used as is, and when they don't, it's only rebuilt if the file's contents changed too.
+SNAPSHOT_FILE_SUFFIX: Final = ".gui-snapshot.pickle"
+# Bump whenever GuiCatalogSnapshot, or a class it holds, changes
+SNAPSHOT_VERSION: Final = 1
+HASH_CHUNK_SIZE: Final = 1024 * 1024
+
+
+@dataclass
+class GuiCatalogSnapshot:
+    version: int
+    catalog_size: int
+    catalog_mtime_ns: int
+    catalog_hash: str
+    model_names: list[str]
+    # The columns show the first model
+    model_name: str
+    categories: list[str]
+    # (send mode, category) -> command or query names
+    names_by_category: dict[tuple[str, str], list[str]]
+    search_index: CommandSearchIndex
+
+
+def hash_catalog_file(catalog_file_path: str) -> str:
+    # Only hashed when the size and mtime don't match, and hashlib loads OpenSSL, so it's imported here
+    import hashlib
+
+    sha256 = hashlib.sha256()
+    with open(catalog_file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def read_catalog_names(
+    catalog_file_path: str,
+) -> tuple[list[str], list[str], list[tuple[str, str, str | None, str | None, str]]]:
+    # The model names, the first model's categories, and the model, category, command name, query name and return
+    # description of every command of every model, in catalog order. The catalog readers are only needed when the
+    # snapshot is out of date, so they're only imported then.
+    from catalog_database import CatalogDatabase, read_all_catalog_models
+
+    if catalog_file_path.endswith((".db", ".sqlite")):
+        # Only the name columns are queried, the variables of every command aren't needed
+        catalog_database = CatalogDatabase(catalog_file_path)
+        try:
+            model_names = catalog_database.get_models()
+            return (
+                model_names,
+                catalog_database.get_categories(model_names[0]),
+                catalog_database.get_all_names(),
+            )
+        finally:
+            catalog_database.close()
+    catalog = read_all_catalog_models(catalog_file_path)
+    model_names = list(catalog)
+    return (
+        model_names,
+        list(catalog[model_names[0]]["Detailed Commands"]),
+        [
+            (
+                model_name,
+                category,
+                command_definition["command_name"],
+                command_definition["query_name"],
+                command_definition["return_description"],
+            )
+            for model_name, model_catalog in catalog.items()
+            for category, command_definitions in model_catalog[
+                "Detailed Commands"
+            ].items()
+            for command_definition in command_definitions
+        ],
+    )
+
+
+def build_gui_snapshot(catalog_file_path: str) -> GuiCatalogSnapshot:
+    stat = os.stat(catalog_file_path)
+    catalog_hash = hash_catalog_file(catalog_file_path)
+    model_names, categories, catalog_names = read_catalog_names(catalog_file_path)
+    model_name = model_names[0]
+    names_by_category = {}
+    for category in categories:
+        names_by_category["Command", category] = []
+        names_by_category["Query", category] = []
+    entries = []
+    # Every row reads its model and category names as new strings. Sharing them keeps one copy of each in memory,
+    # and pickle only writes out a string once per object.
+    shared_names: dict[str, str] = {}
+    for (
+        entry_model_name,
+        category,
+        command_name,
+        query_name,
+        return_description,
+    ) in catalog_names:
+        entry_model_name = shared_names.setdefault(entry_model_name, entry_model_name)
+        category = shared_names.setdefault(category, category)
+        for send_mode, name in (("Command", command_name), ("Query", query_name)):
+            if name is None:
+                continue
+            if entry_model_name == model_name:
+                names_by_category[send_mode, category].append(name)
+            entries.append(
+                SearchEntry(
+                    entry_model_name,
+                    category,
+                    send_mode,
+                    name,
+                    return_description or "",
+                )
+            )
+    return GuiCatalogSnapshot(
+        version=SNAPSHOT_VERSION,
+        catalog_size=stat.st_size,
+        catalog_mtime_ns=stat.st_mtime_ns,
+        catalog_hash=catalog_hash,
+        model_names=model_names,
+        model_name=model_name,
+        categories=categories,
+        names_by_category=names_by_category,
+        search_index=CommandSearchIndex(entries),
+    )
+
+
+def read_gui_snapshot(snapshot_file_path: str) -> GuiCatalogSnapshot | None:
+    # The snapshot is only ever written by write_gui_snapshot, next to the catalog, so it's trusted like the catalog
+    try:
+        with open(snapshot_file_path, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as error:
+        logger.warning("Ignoring unreadable snapshot %s: %s", snapshot_file_path, error)
+        return None
+    if (
+        not isinstance(snapshot, GuiCatalogSnapshot)
+        or snapshot.version != SNAPSHOT_VERSION
+    ):
+        return None
+    return snapshot
+
+
+def write_gui_snapshot(snapshot_file_path: str, snapshot: GuiCatalogSnapshot) -> None:
+    # Another GUI could be reading the old snapshot, so the new one is written aside and swapped in
+    temporary_path = f"{snapshot_file_path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, snapshot_file_path)
+    except OSError as error:
+        # A read-only catalog directory only costs the next start a rebuild
+        logger.warning("Could not write the snapshot %s: %s", snapshot_file_path, error)
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def load_gui_snapshot(
+    catalog_file_path: str, snapshot_file_path: str | None = None
+) -> GuiCatalogSnapshot:
+    snapshot_file_path = snapshot_file_path or catalog_file_path + SNAPSHOT_FILE_SUFFIX
+    stat = os.stat(catalog_file_path)
+    snapshot = read_gui_snapshot(snapshot_file_path)
+    if snapshot is not None:
+        if (snapshot.catalog_size, snapshot.catalog_mtime_ns) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return snapshot
+        # Copying or touching the catalog changes its mtime, but not what the snapshot holds
+        if (
+            snapshot.catalog_size == stat.st_size
+            and snapshot.catalog_hash == hash_catalog_file(catalog_file_path)
+        ):
+            snapshot.catalog_mtime_ns = stat.st_mtime_ns
+            write_gui_snapshot(snapshot_file_path, snapshot)
+            return snapshot
+    logger.info("Building the snapshot of %s", catalog_file_path)
+    snapshot = build_gui_snapshot(catalog_file_path)
+    write_gui_snapshot(snapshot_file_path, snapshot)
+    return snapshot
+
+
+class CatalogLoader:
+    # Loads the catalog snapshot on a background thread, so the first column shows straight away. Callbacks always
+    # run on the Kivy main thread. Once the snapshot is in, every column and search is answered from memory. If it
+    # can't be loaded, the error is logged once and handed to on_error, and the callbacks waiting on it are dropped.
+    def __init__(
+        self,
+        catalog_file_path: str,
+        snapshot_file_path: str | None = None,
+        on_error: Callable[[BaseException], None] | None = None,
+    ):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._is_closed = False
+        self.catalog_file_path = catalog_file_path
+        self.on_error = on_error
+        self.model_name: str | None = None
+        self.model_names: list[str] = []
+        self.snapshot: GuiCatalogSnapshot | None = None
+        self.error: BaseException | None = None
+        self._pending_callbacks: list[Callable[[GuiCatalogSnapshot], None]] = []
+        self._snapshot_future = self._executor.submit(
+            load_gui_snapshot, catalog_file_path, snapshot_file_path
+        )
+        self._snapshot_future.add_done_callback(self._schedule_delivery)
+
+    def _schedule_delivery(self, done_future: Future) -> None:
+        # Only the GUI creates a loader, so Kivy is loaded by then, and the rest of this module works without it
+        from kivy.clock import Clock
+
+        Clock.schedule_once(lambda dt: self._deliver(done_future))
+
+    def _deliver(self, done_future: Future) -> None:
+        pending_callbacks, self._pending_callbacks = self._pending_callbacks, []
+        if (error := done_future.exception()) is not None:
+            self.error = error
+            logger.error(
+                "Could not load the catalog %s", self.catalog_file_path, exc_info=error
+            )
+            if self.on_error is not None:
+                self.on_error(error)
+            return
+        self.snapshot = done_future.result()
+        self.model_name = self.snapshot.model_name
+        self.model_names = self.snapshot.model_names
+        for callback in pending_callbacks:
+            callback(self.snapshot)
+
+    def _on_snapshot(self, callback: Callable[[GuiCatalogSnapshot], None]) -> None:
+        if self.snapshot is not None:
+            callback(self.snapshot)
+        elif self.error is None:
+            self._pending_callbacks.append(callback)
+
+    def request_categories(self, callback: Callable[[list[str]], None]) -> None:
+        self._on_snapshot(lambda snapshot: callback(snapshot.categories))
+
+    def request_search_index(
+        self, callback: Callable[[CommandSearchIndex], None]
+    ) -> None:
+        self._on_snapshot(lambda snapshot: callback(snapshot.search_index))
+
+    def request_names(
+        self, send_mode: str, category: str, callback: Callable[[list[str]], None]
+    ) -> None:
+        self._on_snapshot(
+            lambda snapshot: callback(snapshot.names_by_category[send_mode, category])
+        )
+
+    def close(self) -> None:
+        # Kivy can dispatch on_stop more than once
+        if self._is_closed:
+            return
+        self._is_closed = True
+        self._executor.shutdown(wait=False)
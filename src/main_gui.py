@@ -1,7 +1,6 @@
 import os
-import json
-import pprint
-from pdf_command_builder import CommandDetails
+from gui_catalog import CatalogLoader
+from command_search import CommandSearchIndex, SearchEntry
 
 from kivy.app import App
 from kivy.properties import ListProperty, NumericProperty, ObjectProperty
@@ -11,47 +10,54 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.recycleview import RecycleView
 from kivy.uix.label import Label
-from kivy.lang import Builder
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.textinput import TextInput
+from kivy.metrics import dp
 
 from dataclasses import dataclass
 
 
 @dataclass(frozen=True)
 class ColumnDetails:
-    categories: list[str]
-    commands: list[dict]
-    queries: list[dict]
+    catalog_loader: CatalogLoader
     command_type_picker: list[str]
 
 
-Builder.load_file(os.path.join(os.path.dirname(__file__), "main_gui.kv"))
+# The GUI opens the catalog database the command builder writes by default, though any catalog file works
+DEFAULT_CATALOG_FILE_PATH = os.path.join(os.path.dirname(__file__), "..", "output.db")
 
 Config.set("graphics", "minimum_width", "800")
 Config.set("graphics", "minimum_height", "400")
 Config.set("graphics", "resizable", True)
 
 
+def build_rows_layout(default_size: tuple) -> RecycleBoxLayout:
+    # The layouts are built here rather than in a kv file, so starting the GUI doesn't parse one
+    rows_layout = RecycleBoxLayout(
+        default_size=default_size,
+        default_size_hint=(1, None),
+        size_hint_y=None,
+        orientation="vertical",
+    )
+    rows_layout.bind(minimum_height=rows_layout.setter("height"))
+    return rows_layout
+
+
 class MyApp(App):
+    def __init__(self, catalog_file_path: str = DEFAULT_CATALOG_FILE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.catalog_file_path = catalog_file_path
+
     def build(self):
-        # Read the contents of the file
-        json_contents = None
-        with open(
-            os.path.join(os.path.dirname(__file__), "..", "output.json"),
-            "r",
-            encoding="utf8",
-        ) as f:
-            json_contents = json.load(f)
-        # TODO: Maybe just add this data inside the json file itself?
-        scope_categories = json_contents["DSO5012A"]["Scope Queries"].keys()  # column 1
-        command_data = json_contents["DSO5012A"]["Scope Commands"]
-        query_data = json_contents["DSO5012A"]["Scope Queries"]
+        # The catalog loads in the background, so the first column shows straight away
+        self.catalog_loader = CatalogLoader(
+            self.catalog_file_path, on_error=self.show_catalog_error
+        )
         # 2nd Column is Query Or Command
         second_column_data = ["Query", "Command"]
         top_box_layout = BoxLayout(orientation="vertical")
         column_details = ColumnDetails(
-            categories=scope_categories,
-            commands=command_data,
-            queries=query_data,
+            catalog_loader=self.catalog_loader,
             command_type_picker=second_column_data,
         )
         self.root = ColumnedBoxLayout(
@@ -61,49 +67,107 @@ class MyApp(App):
         self.root.add_widget(rv)
         self.root.enable_columns[0] = rv
         top_box = BoxLayout(orientation="vertical")
-        # top_box.add_widget(label)
-        top_box.add_widget(self.root)
+        # Searching shows the matches in an extra column on the right, while the query isn't empty
+        self.search_query = ""
+        self.search_results = SearchResultsRV()
+        search_input = TextInput(
+            hint_text="Search commands and queries, e.g. :TIM:MODE or nr3",
+            multiline=False,
+            size_hint_y=None,
+            height=dp(40),
+        )
+        search_input.bind(text=self.on_search_text)
+        self.columns_box = BoxLayout(orientation="horizontal")
+        self.columns_box.add_widget(self.root)
+        top_box.add_widget(search_input)
+        top_box.add_widget(self.columns_box)
         return top_box
 
+    def on_search_text(self, instance, text):
+        self.search_query = text
+        # Before the index is ready, the latest query runs as soon as it is
+        self.catalog_loader.request_search_index(self.show_search_results)
+
+    def show_search_results(self, search_index: CommandSearchIndex):
+        if not self.search_query.strip():
+            if self.search_results.parent is not None:
+                self.columns_box.remove_widget(self.search_results)
+            return
+        self.search_results.show_entries(
+            search_index.search(self.search_query),
+            show_model_names=len(self.catalog_loader.model_names) > 1,
+        )
+        if self.search_results.parent is None:
+            self.columns_box.add_widget(self.search_results)
+
+    def show_catalog_error(self, error: BaseException):
+        # Nothing can fill the columns without the catalog, so the error takes their place
+        self.columns_box.clear_widgets()
+        self.columns_box.add_widget(
+            Label(
+                text=f"Could not load the catalog {self.catalog_file_path}:\n{error}",
+                halign="center",
+            )
+        )
+
+    def on_stop(self):
+        self.catalog_loader.close()
+
 
 class RV(RecycleView):
     def __init__(self, column_index, column_data, **kwargs):
         super(RV, self).__init__(**kwargs)
+        # The layout goes in first, the RecycleView hands the viewclass on to it
+        self.add_widget(build_rows_layout(default_size=(dp(25), dp(56))))
+        self.viewclass = LabelledButton
+        self.column_index = column_index
+        self.set_column_data(column_data)
+
+    def set_column_data(self, column_data):
+        # Reused columns get their new rows unselected, and scrolled back to the top. The views pick up the column
+        # and their row index in refresh_view_attrs, so the rows only hold what changes between them.
         self.selected_button_index: int | None = None
-        self.data = [
-            {
-                "text": str(item),
-                "viewclass": "LabelledButton",
-                "column_index": column_index,
-                "button_index": index,
-                "is_selected": False,
-                "parent_recycleview": self,
-            }
-            for index, item in enumerate(column_data)
-        ]
+        self.data = [{"text": str(item), "is_selected": False} for item in column_data]
+        self.scroll_y = 1
+
+    def set_button_selected(self, button_index, is_selected):
+        # The row is changed in place, which doesn't make the RecycleView refresh every view. Only the row's own view
+        # gets updated, if it's on screen; otherwise it picks the state up when it scrolls into view.
+        self.data[button_index]["is_selected"] = is_selected
+        if (view := self.view_adapter.get_visible_view(button_index)) is not None:
+            view.show_selection(is_selected)
 
     def swap_selected_button_states(self, new_button_index):
-        # Try doing this with copying the indexes, re-assigning them and then deleting instead to attempt to force the refresh
-        new_selected_button = self.data[new_button_index].copy()
-        old_selected_button = (
-            self.data[self.selected_button_index].copy()
-            if self.selected_button_index is not None
-            else None
-        )
         if self.selected_button_index == new_button_index:
             # enter toggle functionality
-            new_selected_button["is_selected"] = not new_selected_button["is_selected"]
-            self.data[new_button_index] = new_selected_button
+            self.set_button_selected(
+                new_button_index, not self.data[new_button_index]["is_selected"]
+            )
             return
-        if old_selected_button is not None:
-            old_selected_button["is_selected"] = False
-            old_selected_button["background_color"] = (1, 1, 1, 1)
-            self.data[self.selected_button_index] = old_selected_button
-        new_selected_button["is_selected"] = True
-        new_selected_button["background_color"] = (1, 0, 0, 1)
-        # assign the indexes here.
+        if self.selected_button_index is not None:
+            self.set_button_selected(self.selected_button_index, False)
+        self.set_button_selected(new_button_index, True)
         self.selected_button_index = new_button_index
-        self.data[new_button_index] = new_selected_button
+
+
+class SearchResultsRV(RecycleView):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.add_widget(build_rows_layout(default_size=(None, dp(32))))
+        self.viewclass = Label
+
+    def show_entries(self, entries: list[SearchEntry], show_model_names: bool):
+        # Only the rows in view get widgets, so long result lists stay cheap to swap in on every keystroke
+        self.data = [
+            {
+                "text": (
+                    f"{entry.name}   [{entry.model_name} {entry.category}]"
+                    if show_model_names
+                    else f"{entry.name}   [{entry.category}]"
+                )
+            }
+            for entry in entries
+        ]
 
 
 class ColumnedBoxLayout(BoxLayout):
@@ -114,6 +178,10 @@ class ColumnedBoxLayout(BoxLayout):
     def __init__(self, **kwargs):
         # Ensure column_text_data is provided and not None
         self._send_mode = ""
+        # Only the most recently requested column gets added, if the user clicks on while it's still loading
+        self._column_request = 0
+        # Closed columns are kept here, and refilled the next time they open instead of being rebuilt
+        self._column_views: dict[int, RV] = {}
         if "column_text_data" not in kwargs or kwargs["column_text_data"] is None:
             raise ValueError("column_text_data cannot be None")
         super().__init__(**kwargs)
@@ -122,42 +190,47 @@ class ColumnedBoxLayout(BoxLayout):
         next_index = invoked_column + 1
         if next_index >= len(self.enable_columns):
             return
+        self._column_request += 1
+        column_request = self._column_request
+
+        def show_column(data_to_pass_in):
+            if column_request != self._column_request:
+                return
+            next_recycleview = self._column_views.get(next_index)
+            if next_recycleview is None:
+                next_recycleview = RV(
+                    column_index=next_index, column_data=data_to_pass_in
+                )
+                self._column_views[next_index] = next_recycleview
+            else:
+                next_recycleview.set_column_data(data_to_pass_in)
+            if next_recycleview.parent is None:
+                self.add_widget(next_recycleview)
+            self.enable_columns[next_index] = next_recycleview
+            self.focused_index = next_index
+
         # Here, we need to decide what data to pass into the columns
-        data_to_pass_in = None
+        catalog_loader = self.column_text_data.catalog_loader
         if self.focused_index == 0:
-            data_to_pass_in = self.column_text_data.categories
             self._send_mode = button_text
-        if self.focused_index == 1:
-            if self._send_mode == "Query":
-                data_to_pass_in = self.column_text_data.queries[button_text]
-            elif self._send_mode == "Command":
-                data_to_pass_in = self.column_text_data.commands[button_text]
-        next_recycleview = RV(column_index=next_index, column_data=data_to_pass_in)
-        self.enable_columns[next_index] = next_recycleview
-        self.add_widget(next_recycleview)
-        self.focused_index = next_index
+            catalog_loader.request_categories(show_column)
+        elif self.focused_index == 1:
+            catalog_loader.request_names(self._send_mode, button_text, show_column)
 
     def remove_existing_columns(self, invoked_column):
         for column_index in range(self.focused_index, invoked_column, -1):
-            # go backwards and remove the columns
+            # go backwards and remove the columns, keeping them around to be reused
             targeted_recycleview = self.enable_columns[column_index]
             self.enable_columns[column_index] = None
             self.remove_widget(targeted_recycleview)
-            del targeted_recycleview
         # mark the current focused_index as the current column index
         self.focused_index = invoked_column
 
 
 class LabelledButton(Button, RecycleDataViewBehavior):
     def on_release(self):
-        # Adding some custom state here for desired behavior
-        print(
-            f"RELEASED button of {self.text}, button index {self.button_index} at column index {self.column_index}"
-        )
         # We'll always swap the button states. A new column will only be added if there are enough indexes.
-        self.parent_recycleview.swap_selected_button_states(
-            self.button_index
-        )  # NOTE: This may need to be added to the refresh state instead!
+        self.parent_recycleview.swap_selected_button_states(self.button_index)
         # Check if it's the top-level column, or a bottom level column that's being changed.
         column_box_parent = self.get_columned_box_layout()
         if column_box_parent.focused_index == self.column_index:
@@ -177,20 +250,14 @@ class LabelledButton(Button, RecycleDataViewBehavior):
             current_widget = current_widget.parent
         return None
 
+    def show_selection(self, is_selected):
+        self.background_color = (1, 0, 0, 1) if is_selected else (1, 1, 1, 1)
+
     def refresh_view_attrs(self, rv, index, data):
-        # For easier debugging, only print column index 0
-        if data["column_index"] == 0:
-            print(
-                f"TRIGGERED REFRESH VIEW ATTRS FOR ITEM INDEX {index}, DATA IS {data}"
-            )
-            print("RecycleView that caused this data to update was:", rv)
-            pprint.pprint(data)
-        if data["is_selected"] is True:
-            # data['background_color'] = (1, 0, 0, 1)
-            self.background_color = (1, 0, 0, 1)
-        elif data["is_selected"] is False:
-            self.background_color = (1, 1, 1, 1)
-            # data['background_color'] = (1, 1, 1, 1)
+        self.parent_recycleview = rv
+        self.column_index = rv.column_index
+        self.button_index = index
+        self.show_selection(data["is_selected"])
         super(LabelledButton, self).refresh_view_attrs(rv, index, data)
 
 
@@ -0,0 +1,33 @@
+import os
+import sys
+
+from typing import Final
+
+# /proc/self/statm holds the process size and resident set size, counted in pages
+STATM_FILE_PATH: Final = "/proc/self/statm"
+
+
+def get_peak_rss_mb() -> tuple[float | None, float | None]:
+    # Peak resident set size of this process and of its (finished) worker processes. The resource module is
+    # missing on Windows, where neither gets reported.
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor,
+    )
+
+
+def get_current_rss_mb() -> float | None:
+    # The resident set size right now, unlike ru_maxrss which only ever grows. Only Linux exposes it without a
+    # third party package, elsewhere it's None.
+    try:
+        with open(STATM_FILE_PATH, "r", encoding="ascii") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
@@ -0,0 +1,63 @@
+import hashlib
+import json
+
+from typing import Final
+
+# A merged catalog stores every distinct command definition once, keyed by a hash of its contents, and each model
+# lists the definition ids of its commands by category:
+#   {
+#       "Models": {model: {"Scope Queries": ..., "Scope Commands": ..., "Detailed Commands": {category: [ids]}}},
+#       "Command Definitions": {id: CommandDetails fields},
+#   }
+MODELS_KEY: Final = "Models"
+COMMAND_DEFINITIONS_KEY: Final = "Command Definitions"
+DEFINITION_ID_LENGTH: Final = 16
+
+
+def get_definition_id(command_definition: dict) -> str:
+    canonical_definition = json.dumps(
+        command_definition, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical_definition.encode("utf8")).hexdigest()[
+        :DEFINITION_ID_LENGTH
+    ]
+
+
+def merge_model_catalogs(model_catalogs: dict[str, dict]) -> dict:
+    # model_catalogs maps each model name to the catalog the single-manual builder writes for it
+    models = {}
+    command_definitions = {}
+    for model_name, model_catalog in model_catalogs.items():
+        definition_ids_by_category = {}
+        for category, detailed_commands in model_catalog["Detailed Commands"].items():
+            definition_ids = []
+            for command_definition in detailed_commands:
+                definition_id = get_definition_id(command_definition)
+                command_definitions.setdefault(definition_id, command_definition)
+                definition_ids.append(definition_id)
+            definition_ids_by_category[category] = definition_ids
+        models[model_name] = {
+            "Scope Queries": model_catalog["Scope Queries"],
+            "Scope Commands": model_catalog["Scope Commands"],
+            "Detailed Commands": definition_ids_by_category,
+        }
+    return {MODELS_KEY: models, COMMAND_DEFINITIONS_KEY: command_definitions}
+
+
+def expand_model_catalog(merged_catalog: dict, model_name: str) -> dict:
+    # Gives back the same nested catalog the single-manual builder writes, for one model of a merged catalog
+    model = merged_catalog[MODELS_KEY][model_name]
+    command_definitions = merged_catalog[COMMAND_DEFINITIONS_KEY]
+    return {
+        model_name: {
+            "Scope Queries": model["Scope Queries"],
+            "Scope Commands": model["Scope Commands"],
+            "Detailed Commands": {
+                category: [
+                    command_definitions[definition_id]
+                    for definition_id in definition_ids
+                ]
+                for category, definition_ids in model["Detailed Commands"].items()
+            },
+        }
+    }
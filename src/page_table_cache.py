@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import pymupdf
+
+logger = logging.getLogger(__name__)
+
+# Files are read in chunks when hashing, as programmer manuals can be hundreds of megabytes
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_pdf_file(pdf_file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(pdf_file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_directory_size(directory: str) -> int:
+    total_size = 0
+    for root, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            try:
+                total_size += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                # Another process may have evicted it in the meantime
+                pass
+    return total_size
+
+
+# Stores the raw table detection output of each page on disk, so reruns can skip PyMuPDF's table detection and
+# only redo the parsing. Entries are grouped in one directory per document, keyed by the hash of the PDF bytes and
+# the PyMuPDF version, with one file per page. Whole document directories are evicted, least recently used first,
+# once the cache grows past max_size_bytes.
+class PageTableCache:
+    def __init__(self, cache_dir: str, pdf_file_path: str, max_size_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.document_key = (
+            f"{hash_pdf_file(pdf_file_path)}-pymupdf-{pymupdf.VersionBind}"
+        )
+        self.document_dir = os.path.join(cache_dir, self.document_key)
+        os.makedirs(self.document_dir, exist_ok=True)
+        # Mark the document as recently used for eviction
+        os.utime(self.document_dir)
+
+    def get_page_path(self, page_number: int) -> str:
+        return os.path.join(self.document_dir, f"page-{page_number}.json")
+
+    def get(self, page_number: int) -> dict | None:
+        try:
+            with open(self.get_page_path(page_number), "r", encoding="utf8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Missing or partially written entries count as a miss
+            return None
+
+    def put(self, page_number: int, entry: dict) -> None:
+        page_path = self.get_page_path(page_number)
+        # Write to a temporary file first, so other workers never read a half-written entry
+        temporary_path = f"{page_path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf8") as f:
+                json.dump(entry, f)
+            os.replace(temporary_path, page_path)
+        except OSError as e:
+            logger.warning("Could not write page %d to the cache: %s", page_number, e)
+
+    def evict(self) -> None:
+        # The document that was just processed is never evicted
+        evict_documents(self.cache_dir, self.max_size_bytes, {self.document_key})
+
+
+def evict_documents(
+    cache_dir: str, max_size_bytes: int, kept_document_keys: set[str]
+) -> None:
+    # Trims the cache back to max_size_bytes, oldest documents first, skipping the kept ones. Works from the
+    # document keys alone, so a batch can protect every manual it processed without hashing their PDFs again.
+    document_dirs = []
+    for document_key in os.listdir(cache_dir):
+        document_dir = os.path.join(cache_dir, document_key)
+        if os.path.isdir(document_dir):
+            document_dirs.append(
+                (
+                    os.path.getmtime(document_dir),
+                    get_directory_size(document_dir),
+                    document_key,
+                    document_dir,
+                )
+            )
+    total_size = sum(size for _, size, _, _ in document_dirs)
+    for _, size, document_key, document_dir in sorted(document_dirs):
+        if total_size <= max_size_bytes:
+            break
+        if document_key in kept_document_keys:
+            continue
+        logger.info(
+            "Evicting %s from the cache, last used %s",
+            document_dir,
+            time.ctime(os.path.getmtime(document_dir)),
+        )
+        shutil.rmtree(document_dir, ignore_errors=True)
+        total_size -= size
@@ -1,46 +1,58 @@
 import pprint
 import pymupdf
 import json
-import re
-import enum
 import argparse
+import gc
+import logging
+import math
 import os
+import re
 
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass, field, asdict
-from typing import Final
+from typing import Final, Iterator
 from dotenv import load_dotenv
+from builder_profiler import NULL_CONTEXT, BuilderProfiler, StageTimer
+from catalog_database import SqliteCatalogWriter, read_catalog_file
+from catalog_diff import (
+    CHANGELOG_FILE_SUFFIX,
+    FINGERPRINT_FILE_SUFFIX,
+    REUSED_BY_ROWS,
+    REUSED_BY_TEXT,
+    TableFingerprint,
+    TableFingerprintIndex,
+    TableFingerprintWriter,
+    diff_catalogs,
+    get_fingerprint_file_path,
+    hash_page_text,
+    hash_table_rows,
+    write_changelog,
+)
+from catalog_stream import NdjsonCatalogWriter
+from command_details import CommandDetails, ReturnElement, determine_value_type
+from memory_usage import get_current_rss_mb, get_peak_rss_mb
+from page_table_cache import PageTableCache
+from scpi_syntax import (
+    find_first_enum,
+    get_enum_values,
+    get_variable_names,
+    parse_syntax,
+    render_syntax,
+    split_variable_definitions,
+)
 
-# See page 106 of manual for a more in-depth explanation
-OPTIONAL_SYNTAX: Final = ["[", "]"]
-ENUM_BRACES: Final = ["{", "}"]
-ANGLE_BRACKETS: Final = ["<", ">"]  # These can represent a string, or a command input
-
-BRACKETED_SYNTAX: Final = OPTIONAL_SYNTAX + ENUM_BRACES + ANGLE_BRACKETS
-
-
-class ReturnElement(enum.Enum):
-    NR1_FORMAT = "NR1"
-    NR3_FORMAT = "NR3"
-    UNQUOTED_STRING = "UNQUOTED"
-    QUOTED_STRING = "QUOTED"
-    ENUM_FORMAT = "ENUM"
-    INLINE_ENUM_FORMAT = "INLINE_ENUM"
-    UNKNOWN = "UNKNOWN"
+MODEL_NAME: Final = "DSO5012A"
+OUTPUT_FORMATS: Final = ["json", "ndjson", "sqlite"]
+LOG_LEVELS: Final = ["DEBUG", "INFO", "WARNING", "ERROR"]
+LOG_FORMAT: Final = "%(levelname)s %(name)s: %(message)s"
+# The chunk size streaming mode starts from when only a memory budget is given
+DEFAULT_CHUNK_PAGES: Final = 50
+# Instrument model numbers are a few letters followed by digits and an optional letter suffix, e.g. DSO5012A,
+# MSO-X3054A or N9020B
+MODEL_NAME_PATTERN: Final = re.compile(r"\b[A-Z]{1,5}(?:-[A-Z])?\d{3,5}[A-Z]{0,3}\b")
 
-
-@dataclass
-class CommandDetails:
-    has_variables_in_command: bool = False
-    has_inline_variables_in_command: bool = False
-    has_variables_in_query: bool = False
-    has_inline_variables_in_query: bool = False
-    command_variable_names: list[str] = field(default_factory=list)
-    query_variable_names: list[str] = field(default_factory=list)
-    variable_list: list[dict] = field(default_factory=list)
-    command_name: str | None = None
-    query_name: str | None = None
-    return_description: str | None = None
-    is_implemented: bool = False
+logger = logging.getLogger(__name__)
 
 
 def parse_command_line_args(env_filepath: str = ".env"):
@@ -60,244 +72,779 @@ def parse_command_line_args(env_filepath: str = ".env"):
         help="The JSON file to output the command information to.",
         default=os.environ["OUTPUT_FILE_PATH"],
     )
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=OUTPUT_FORMATS,
+        help="json writes the nested catalog once the run is done, ndjson streams one record per command as each page finishes, sqlite stores the model in an indexed catalog database.",
+        default="json",
+    )
+    parser.add_argument(
+        "--model-name",
+        type=str,
+        help="The model name to store the commands under. Use 'auto' to derive it from the PDF metadata or title.",
+        default=MODEL_NAME,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of processes to split the page scan across.",
+        default=1,
+    )
+    parser.add_argument(
+        "--no-prefilter",
+        action="store_true",
+        help="Run table detection on every page, instead of only pages whose text holds the command table headings.",
+    )
+    parser.add_argument(
+        "--verify-prefilter",
+        action="store_true",
+        help="Also run table detection on pages the prefilter skipped, and report any command tables it missed.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="The directory to cache the raw table detection output of each page in.",
+        default=os.environ.get("CACHE_DIR") or ".page_table_cache",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither read from nor write to the page table cache.",
+    )
+    parser.add_argument(
+        "--cache-max-size-mb",
+        type=int,
+        help="The size the cache gets trimmed back to, evicting the least recently used manuals first.",
+        default=512,
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        choices=LOG_LEVELS,
+        help="DEBUG also logs every table, command and variable as it gets parsed.",
+        default="INFO",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        metavar="REPORT_FILE_PATH",
+        help="Time each stage of the run, and write the timings as a JSON report to this file.",
+        default=None,
+    )
+    parser.add_argument(
+        "--profile-slowest-pages",
+        type=int,
+        help="The number of slowest pages to list in the profile report.",
+        default=10,
+    )
+    parser.add_argument(
+        "--chunk-pages",
+        type=int,
+        help="Stream the scan in chunks of this many pages, reopening the PDF after each chunk so pymupdf's caches for the pages already scanned get released. 0 keeps one handle open for the whole document.",
+        default=0,
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=int,
+        help="Stream the scan in chunks, halving the chunk size whenever resident memory is over this many MB after a chunk, and stop with an error if a single page chunk still is. With --workers, each worker process gets the same budget, and reports its resident memory after every chunk so the chunks still to be handed out get smaller.",
+        default=None,
+    )
+    parser.add_argument(
+        "--diff-against",
+        type=str,
+        metavar="OLD_CATALOG_FILE_PATH",
+        help="The catalog built from the previous revision of the manual. Pages and tables that didn't change reuse its parsed commands, and a changelog of the commands added, removed or changed gets written.",
+        default=None,
+    )
+    parser.add_argument(
+        "--changelog-file-path",
+        type=str,
+        help=f"Where --diff-against writes the changelog, the output file path with {CHANGELOG_FILE_SUFFIX} appended by default.",
+        default=None,
+    )
+    parser.add_argument(
+        "--write-fingerprints",
+        action="store_true",
+        help=f"Write the table fingerprints a later --diff-against build reuses tables from, to the output file path with {FINGERPRINT_FILE_SUFFIX} appended. Builds with --diff-against always write them.",
+    )
     return parser.parse_args()
 
 
 def obtain_commands_to_process(
-    doc: pymupdf.Document, command_categories: list[str], command_list: list[str]
+    doc: pymupdf.Document,
+    command_categories: list[str],
+    command_list: list[str],
+    category_page_ranges: dict[str, range] | None = None,
 ):
     table_of_contents = doc.get_toc()
     is_obtaining_command_details = False
-    print("Processing Table of Contents...")
-    for level, title, _ in table_of_contents:
+    # TOC pages are 1-based, the category starts get stored as 0-based page numbers
+    category_start_pages: dict[str, int] = {}
+    chapter_end_page = doc.page_count
+    logger.info("Processing Table of Contents...")
+    for level, title, page_number in table_of_contents:
         if (
             not is_obtaining_command_details
             and "commands by subsystem" in title.lower()
         ):
-            print("Command details found: Starting to process...")
+            logger.info("Command details found: Starting to process...")
             is_obtaining_command_details = True
             continue
         elif is_obtaining_command_details:
             if level == 1:
                 is_obtaining_command_details = False
+                chapter_end_page = page_number - 1
             elif level == 2:
                 command_category = title.replace(" Commands", "")
-                print(f"Adding {command_category} to command_categories...")
+                logger.debug("Adding %s to command_categories...", command_category)
                 command_categories.append(title.replace(" Commands", ""))
+                category_start_pages[command_category] = page_number - 1
             elif level == 3:
-                print(f"Adding {title} to command_list...")
+                logger.debug("Adding %s to command_list...", title)
                 command_list.append(title)
+    if category_page_ranges is not None:
+        category_page_ranges.update(
+            build_category_page_ranges(
+                command_categories, category_start_pages, chapter_end_page
+            )
+        )
+
+
+def build_category_page_ranges(
+    command_categories: list[str],
+    category_start_pages: dict[str, int],
+    chapter_end_page: int,
+) -> dict[str, range]:
+    # A category runs until the next one starts, and always includes its own start page, as two categories can
+    # start on the same page. If any page number is missing or out of order, the TOC can't be trusted and an
+    # empty index is returned.
+    start_pages = [
+        category_start_pages.get(category, -1) for category in command_categories
+    ]
+    end_pages = start_pages[1:] + [chapter_end_page]
+    if any(start < 0 for start in start_pages) or any(
+        start > end for start, end in zip(start_pages, end_pages)
+    ):
+        logger.warning(
+            "Table of Contents page numbers are unusable, all pages will be scanned."
+        )
+        return {}
+    return {
+        category: range(start, max(end, start + 1))
+        for category, start, end in zip(command_categories, start_pages, end_pages)
+    }
+
+
+def plan_page_scan(
+    page_count: int,
+    command_categories: list[str],
+    category_page_ranges: dict[str, range] | None = None,
+) -> list[tuple[int, list[str]]]:
+    # Returns the pages that need scanning, along with the categories their tables can belong to
+    if not category_page_ranges:
+        return [(page_number, command_categories) for page_number in range(page_count)]
+    categories_by_page: dict[int, list[str]] = {}
+    for category in command_categories:
+        for page_number in category_page_ranges[category]:
+            if page_number < page_count:
+                categories_by_page.setdefault(page_number, []).append(category)
+    return sorted(categories_by_page.items())
+
+
+COMMAND_TABLE_ROW: Final = ["Command", "Query", "Options and Query Returns"]
+
+# (category, formatted command or None, formatted query or None, command details) for each table row on a page
+PageCommands = list[tuple[str, str | None, str | None, CommandDetails]]
 
 
-def command_has_inline_range(formatted_command: str) -> bool:
-    # Sometimes, the command will state the options it can accept, so use this function to check for that
-    enum_braces = {bracket_character: 0 for bracket_character in ENUM_BRACES}
-    for character in ENUM_BRACES:
-        enum_braces[character] = formatted_command.count(character)
-    for _, value in enum_braces.items():
-        if value < 1:
-            return False
-    return True
+@dataclass(frozen=True)
+class ScanOptions:
+    workers: int = 1
+    use_prefilter: bool = True
+    # Runs the table finder on pages the prefilter skipped, to check it never drops a real command table
+    verify_prefilter: bool = False
+    # Times each stage of every page, and hands the timings back with the page result
+    profile: bool = False
+    # Streaming mode: pages are scanned this many at a time, each chunk through a freshly opened document. 0 turns it
+    # off, unless there's a memory budget.
+    chunk_pages: int = 0
+    memory_budget_mb: int | None = None
+    # Hashes the text and table rows of every page, so a later build of a new revision can reuse its tables
+    fingerprint_tables: bool = False
 
+    @property
+    def is_streaming(self) -> bool:
+        return self.chunk_pages > 0 or self.memory_budget_mb is not None
 
-def get_bracket_count(formatted_string: str) -> dict:
-    return {bracket: formatted_string.count(bracket) for bracket in BRACKETED_SYNTAX}
+
+# The raw output of table detection on a page, before any of the command parsing happens
+@dataclass
+class PageTable:
+    header_names: list[str | None] | None = None
+    rows: list[list[str]] | None = None
+    skipped_by_prefilter: bool = False
+    missed_by_prefilter: bool = False
+    # Only filled in when the tables get fingerprinted, see catalog_diff
+    text_hash: str | None = None
+
+
+@dataclass
+class PageResult:
+    page_number: int
+    commands: PageCommands = field(default_factory=list)
+    skipped_by_prefilter: bool = False
+    missed_by_prefilter: bool = False
+    from_cache: bool = False
+    stage_timer: StageTimer | None = None
+    fingerprint: TableFingerprint | None = None
+    # REUSED_BY_TEXT or REUSED_BY_ROWS if the commands came from the build being diffed against
+    reused_from: str | None = None
 
 
-# Note: There exists some text with misaligned brackets inside the PDF, so at some stage we will be required to
-# account for that.
-def has_no_named_variables(bracket_count: dict) -> bool:
-    return bracket_count["<"] == 0 and bracket_count[">"] == 0
+@dataclass
+class ScanSummary:
+    pages_in_document: int
+    pages_scanned: int = 0
+    pages_skipped_by_prefilter: int = 0
+    pages_from_cache: int = 0
+    pages_reused_by_text: int = 0
+    tables_reused_by_rows: int = 0
+    commands_found: int = 0
+    prefilter_misses: list[int] = field(default_factory=list)
 
+    def add_page_result(self, page_result: PageResult) -> None:
+        self.pages_scanned += 1
+        self.commands_found += len(page_result.commands)
+        if page_result.skipped_by_prefilter:
+            self.pages_skipped_by_prefilter += 1
+        if page_result.from_cache:
+            self.pages_from_cache += 1
+        if page_result.reused_from == REUSED_BY_TEXT:
+            self.pages_reused_by_text += 1
+        elif page_result.reused_from == REUSED_BY_ROWS:
+            self.tables_reused_by_rows += 1
+        if page_result.missed_by_prefilter:
+            self.prefilter_misses.append(page_result.page_number)
 
-def has_single_named_variable(bracket_count: dict) -> bool:
-    return bracket_count["<"] == 1 and bracket_count[">"] == 1
+    def report(self) -> None:
+        logger.info(
+            "Scanned %d of %d pages, the prefilter skipped table detection on %d of them, "
+            "%d were read from the cache.",
+            self.pages_scanned,
+            self.pages_in_document,
+            self.pages_skipped_by_prefilter,
+            self.pages_from_cache,
+        )
+        if self.pages_reused_by_text or self.tables_reused_by_rows:
+            logger.info(
+                "Reused the earlier build's commands for %d pages with unchanged text, and %d tables with unchanged rows.",
+                self.pages_reused_by_text,
+                self.tables_reused_by_rows,
+            )
+        if self.prefilter_misses:
+            logger.warning(
+                "The prefilter skipped command tables on pages %s",
+                self.prefilter_misses,
+            )
 
 
-def has_enum_range_defined(bracket_count):
-    return bracket_count["{"] >= 1 and bracket_count["}"] >= 1
+# Each worker process opens its own handle to the PDF, as pymupdf documents can't be shared between processes
+_worker_doc: pymupdf.Document | None = None
+_worker_scan_options: ScanOptions | None = None
+_worker_cache: PageTableCache | None = None
+_worker_previous_tables: TableFingerprintIndex | None = None
 
 
-def get_enum_values(formatted_command: str) -> list[str]:
-    new_command = formatted_command
-    # Flatten the nested enums - they are set values, and this allows for easier processing
-    if formatted_command.count("}") > 1:
-        new_command = (
-            formatted_command.replace(" ", "")
-            .replace("{0|OFF}", "OFF")
-            .replace("{1|ON}", "ON")
+def parse_command_row(
+    command: str, query: str, return_description: str
+) -> tuple[str | None, str | None, CommandDetails]:
+    command_details = CommandDetails()
+    scope_command = None
+    scope_query = None
+    # The text inside the PDF has awkward formatting, so it needs some cleaning up
+    if (formatted_command := command.split("(")[0].replace("\n", "").rstrip()) != "n/a":
+        scope_command = formatted_command
+        logger.debug("Formatted command is: %s", formatted_command)
+        # This deals with named commands
+        command_details.command_name = formatted_command
+        command_syntax = parse_syntax(formatted_command)
+        command_details.command_variable_names = get_variable_names(command_syntax)
+        command_details.has_variables_in_command = (
+            len(command_details.command_variable_names) > 0
         )
-        # handle the one command that has the {{1|2}|{3|4}} format :)
-        new_command = new_command.replace("{1|2}|{3|4}", "1|2|3|4")
-    # "new_command" should deal with the nested brackets, so now the option can be placed in as a single
-    string_to_get = re.findall(r"{(.*?)}", new_command)
-    return string_to_get[0].split("|")
-
-
-def determine_value_type(return_line_description: str) -> ReturnElement:
-    line_to_target = return_line_description.lower()
-    if "nr1" in line_to_target:
-        return ReturnElement.NR1_FORMAT
-    elif "nr3" in line_to_target:
-        return ReturnElement.NR3_FORMAT
-    elif "unquoted" in line_to_target:
-        return ReturnElement.UNQUOTED_STRING
-    elif "quoted" in line_to_target:
-        return ReturnElement.QUOTED_STRING
-    elif has_enum_range_defined(get_bracket_count(line_to_target)):
-        return ReturnElement.ENUM_FORMAT
+        # inline command params dealt with here
+        if not command_details.has_variables_in_command and (
+            inline_enum := find_first_enum(command_syntax)
+        ):
+            command_details.has_inline_variables_in_command = True
+            command_details.variable_list.append(
+                {"INLINE_COMMAND_PARAMS": get_enum_values(inline_enum)}
+            )
+    if (formatted_query := query.split("(")[0].replace("\n", "").rstrip()) != "n/a":
+        scope_query = formatted_query
+        logger.debug("Formatted query is: %s", formatted_query)
+        # deals with named queries
+        command_details.query_name = formatted_query
+        query_syntax = parse_syntax(formatted_query)
+        command_details.query_variable_names = get_variable_names(query_syntax)
+        command_details.has_variables_in_query = (
+            len(command_details.query_variable_names) > 0
+        )
+        # inline query params dealt with here
+        if not command_details.has_variables_in_query and (
+            inline_enum := find_first_enum(query_syntax)
+        ):
+            command_details.has_inline_variables_in_query = True
+            command_details.variable_list.append(
+                {"INLINE_QUERY_PARAMS": get_enum_values(inline_enum)}
+            )
+    formatted_return_description = return_description.replace("\n", "").rstrip()
+    command_details.return_description = formatted_return_description
+    if (
+        command_details.has_variables_in_command
+        or command_details.has_inline_variables_in_command
+    ):
+        # divide out the variables from the return description, and process them with the command ones
+        contains_unprocessed_parameter = False
+        for variable_definition in split_variable_definitions(
+            parse_syntax(formatted_return_description)
+        ):
+            if variable_definition.name == "return_value":
+                continue
+            logger.debug("Variable name capture is: %s", variable_definition.name)
+            value_type = determine_value_type(variable_definition)
+            if value_type == ReturnElement.ENUM_FORMAT:
+                formatted_variable_name_list = get_enum_values(
+                    find_first_enum(variable_definition.body)
+                )
+                logger.debug("Variable name set is: %s", formatted_variable_name_list)
+                command_details.variable_list.append(
+                    {variable_definition.name: formatted_variable_name_list}
+                )
+                continue
+            elif value_type == ReturnElement.UNKNOWN:
+                logger.debug(
+                    "Unknown return type: <%s> %s",
+                    variable_definition.name,
+                    render_syntax(variable_definition.body),
+                )
+                contains_unprocessed_parameter = True
+                continue
+            command_details.variable_list.append(
+                {variable_definition.name: value_type.value}
+            )
+        command_details.is_implemented = not contains_unprocessed_parameter
     else:
-        return ReturnElement.UNKNOWN
+        command_details.is_implemented = True
+    return scope_command, scope_query, command_details
 
 
-def prcoess_command_details(
+def page_may_hold_command_table(page: pymupdf.Page) -> bool:
+    # Plain text extraction is far cheaper than table detection, and a command table always has its headings
+    # somewhere in the page text. Whitespace gets collapsed, as the headings can wrap inside their cells.
+    page_text = " ".join(page.get_text("text").split())
+    return all(heading in page_text for heading in COMMAND_TABLE_ROW)
+
+
+def find_command_table(page: pymupdf.Page) -> list[list[str]] | None:
+    table_checker = page.find_tables()
+    if len(table_checker.tables) == 0:
+        return None
+    focused_table = table_checker.tables[0].extract()
+    return focused_table if focused_table[0] == COMMAND_TABLE_ROW else None
+
+
+def read_page_table(
+    page: pymupdf.Page, scan_options: ScanOptions, stage_timer: StageTimer
+) -> PageTable:
+    if scan_options.use_prefilter:
+        with stage_timer.time("prefilter"):
+            may_hold_command_table = page_may_hold_command_table(page)
+        if not may_hold_command_table:
+            return PageTable(
+                skipped_by_prefilter=True,
+                missed_by_prefilter=scan_options.verify_prefilter
+                and find_command_table(page) is not None,
+            )
+    with stage_timer.time("find_tables"):
+        table_checker = page.find_tables()
+    if len(table_checker.tables) == 0:
+        return PageTable()
+    with stage_timer.time("extract"):
+        rows = table_checker.tables[0].extract()
+    return PageTable(header_names=table_checker.tables[0].header.names, rows=rows)
+
+
+def parse_page_table(
+    page_table: PageTable, command_categories: list[str], stage_timer: StageTimer
+) -> PageCommands:
+    page_commands: PageCommands = []
+    if page_table.rows is None or page_table.rows[0] != COMMAND_TABLE_ROW:
+        return page_commands
+    matched_categories = command_categories
+    if len(command_categories) > 1:
+        # Only fall back to the table header when the page could belong to several categories
+        try:
+            joined_focused_header = " ".join(page_table.header_names)
+        except TypeError:
+            # there's probably a NoneType here, replace it with an empty string for now
+            joined_focused_header = " ".join(
+                [item if item is not None else "" for item in page_table.header_names]
+            )
+        matched_categories = [
+            category
+            for category in command_categories
+            if category in joined_focused_header
+        ]
+    for category in matched_categories:
+        logger.debug("Found a %s command table: %s", category, page_table.rows)
+        for command, query, return_description in page_table.rows[1:]:
+            with stage_timer.time("row_parsing"):
+                page_commands.append(
+                    (category, *parse_command_row(command, query, return_description))
+                )
+    return page_commands
+
+
+def is_usable_cache_entry(page_table: PageTable, scan_options: ScanOptions) -> bool:
+    # Pages the prefilter skipped have no table data stored, so they need rescanning if the prefilter is off,
+    # or if the skip has to be verified
+    return not page_table.skipped_by_prefilter or (
+        scan_options.use_prefilter and not scan_options.verify_prefilter
+    )
+
+
+def extract_page_commands(
+    page: pymupdf.Page,
+    command_categories: list[str],
+    scan_options: ScanOptions = ScanOptions(),
+    cache: PageTableCache | None = None,
+    previous_tables: TableFingerprintIndex | None = None,
+) -> PageResult:
+    stage_timer = StageTimer(enabled=scan_options.profile)
+    with stage_timer.time("page"):
+        page_table = None
+        if cache is not None:
+            with stage_timer.time("cache_read"):
+                cache_entry = cache.get(page.number)
+            if cache_entry is not None:
+                page_table = PageTable(**cache_entry)
+                if not is_usable_cache_entry(page_table, scan_options):
+                    page_table = None
+        from_cache = page_table is not None
+        fingerprint = None
+        if scan_options.fingerprint_tables:
+            # The text hash is kept in the page's cache entry, so warm runs don't extract the text again
+            text_hash = page_table.text_hash if page_table is not None else None
+            if text_hash is None:
+                with stage_timer.time("fingerprint"):
+                    text_hash = hash_page_text(page)
+                if page_table is not None:
+                    page_table.text_hash = text_hash
+                    with stage_timer.time("cache_write"):
+                        cache.put(page.number, asdict(page_table))
+            fingerprint = TableFingerprint(command_categories, text_hash)
+            if previous_tables is not None and (
+                previous_page := previous_tables.find_by_text(fingerprint)
+            ):
+                fingerprint.row_hash, page_commands = previous_page
+                return PageResult(
+                    page_number=page.number,
+                    commands=page_commands,
+                    from_cache=from_cache,
+                    stage_timer=stage_timer if scan_options.profile else None,
+                    fingerprint=fingerprint,
+                    reused_from=REUSED_BY_TEXT,
+                )
+        if page_table is None:
+            page_table = read_page_table(page, scan_options, stage_timer)
+            if fingerprint is not None:
+                page_table.text_hash = fingerprint.text_hash
+            if cache is not None:
+                with stage_timer.time("cache_write"):
+                    cache.put(page.number, asdict(page_table))
+        page_commands = None
+        if fingerprint is not None and page_table.rows is not None:
+            fingerprint.row_hash = hash_table_rows(
+                page_table.header_names, page_table.rows
+            )
+            if previous_tables is not None:
+                page_commands = previous_tables.find_by_rows(fingerprint)
+        reused_from = None if page_commands is None else REUSED_BY_ROWS
+        if page_commands is None:
+            page_commands = parse_page_table(
+                page_table, command_categories, stage_timer
+            )
+    return PageResult(
+        page_number=page.number,
+        commands=page_commands,
+        skipped_by_prefilter=page_table.skipped_by_prefilter,
+        missed_by_prefilter=page_table.missed_by_prefilter,
+        from_cache=from_cache,
+        stage_timer=stage_timer if scan_options.profile else None,
+        fingerprint=fingerprint,
+        reused_from=reused_from,
+    )
+
+
+def merge_page_commands(
+    page_commands: PageCommands,
     detailed_commands_by_category: dict[str, dict],
     scope_queries: dict,
     scope_commands: dict,
-    doc: pymupdf.Document,
-    command_categories: list[str],
 ) -> None:
-    COMMAND_TABLE_ROW: Final = ["Command", "Query", "Options and Query Returns"]
-    for page in doc:
-        table_checker = page.find_tables()
-        if len(table_checker.tables) != 0:
-            focused_header = table_checker.tables[0].header
-            for category in command_categories:
-                try:
-                    joined_focused_header = " ".join(focused_header.names)
-                except TypeError:
-                    # there's probably a NoneType here, replace it with an empty string for now
-                    joined_focused_header = " ".join(
-                        [
-                            item if item is not None else ""
-                            for item in focused_header.names
-                        ]
+    for category, scope_command, scope_query, command_details in page_commands:
+        if scope_command is not None:
+            scope_commands[category].append(scope_command)
+        if scope_query is not None:
+            scope_queries[category].append(scope_query)
+        detailed_commands_by_category[category].append(asdict(command_details))
+
+
+class JsonCatalogWriter:
+    # Collects the whole catalog in memory, and writes it as a single nested JSON document once the run is done
+    def __init__(
+        self, output_file_path: str, model_name: str, command_categories: list[str]
+    ):
+        self.output_file_path = output_file_path
+        self.model_name = model_name
+        self.scope_queries = {category: [] for category in command_categories}
+        self.scope_commands = {category: [] for category in command_categories}
+        self.detailed_commands_by_category: dict[str, list[dict]] = {
+            category: [] for category in command_categories
+        }
+
+    def write_page(self, page_number: int, page_commands: PageCommands) -> None:
+        merge_page_commands(
+            page_commands,
+            self.detailed_commands_by_category,
+            self.scope_queries,
+            self.scope_commands,
+        )
+
+    def close(self) -> None:
+        write_command_data_to_file(
+            self.output_file_path,
+            self.scope_queries,
+            self.scope_commands,
+            self.detailed_commands_by_category,
+            self.model_name,
+        )
+
+
+def get_batch_pages(page_count: int, workers: int, max_chunk_size: int = 0) -> int:
+    # Hand out several smaller batches per worker, as command tables aren't evenly spread through the manual
+    chunk_size = max(1, math.ceil(page_count / (workers * 4)))
+    if max_chunk_size > 0:
+        chunk_size = min(chunk_size, max_chunk_size)
+    return chunk_size
+
+
+def _open_worker_document(
+    pdf_file_path: str,
+    scan_options: ScanOptions,
+    cache: PageTableCache | None,
+    log_level: int,
+    previous_tables: TableFingerprintIndex | None = None,
+) -> None:
+    global _worker_doc, _worker_scan_options, _worker_cache, _worker_previous_tables
+    # Spawned workers don't inherit the logging setup of the main process
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    _worker_doc = pymupdf.open(pdf_file_path)
+    _worker_scan_options = scan_options
+    _worker_cache = cache
+    _worker_previous_tables = previous_tables
+
+
+def _extract_pages(
+    page_scan: list[tuple[int, list[str]]],
+) -> tuple[list[PageResult], float | None]:
+    # Returns the batch's page results, and with a memory budget, the worker's resident memory once it released
+    # the batch's pages, for the main process to size the later batches by
+    global _worker_doc
+    page_results = [
+        extract_page_commands(
+            _worker_doc[page_number],
+            categories,
+            _worker_scan_options,
+            _worker_cache,
+            _worker_previous_tables,
+        )
+        for page_number, categories in page_scan
+    ]
+    rss_mb = None
+    if _worker_scan_options.is_streaming:
+        # Batches are at most a chunk long in streaming mode, so every worker reopens its document once per chunk
+        pdf_file_path = _worker_doc.name
+        release_document(_worker_doc)
+        if _worker_scan_options.memory_budget_mb is not None:
+            rss_mb = get_current_rss_mb()
+        _worker_doc = pymupdf.open(pdf_file_path)
+    return page_results, rss_mb
+
+
+def release_document(doc: pymupdf.Document) -> None:
+    doc.close()
+    # Closing the document leaves the fonts, images and display lists of its pages in pymupdf's global store
+    pymupdf.TOOLS.store_shrink(100)
+    gc.collect()
+
+
+def check_memory_budget(
+    memory_budget_mb: int | None, chunk_pages: int, rss_mb: float | None
+) -> int:
+    # Returns the chunk size to carry on with, half the current one if resident memory after a chunk of that size
+    # is over the budget
+    if memory_budget_mb is None or rss_mb is None or rss_mb <= memory_budget_mb:
+        return chunk_pages
+    if chunk_pages <= 1:
+        raise MemoryError(
+            f"Resident memory is {rss_mb:.1f} MB after a single page chunk, over the {memory_budget_mb} MB budget"
+        )
+    logger.warning(
+        "Resident memory is %.1f MB, over the %d MB budget, scanning %d pages at a time from now on",
+        rss_mb,
+        memory_budget_mb,
+        chunk_pages // 2,
+    )
+    return chunk_pages // 2
+
+
+def iterate_page_chunks(
+    pdf_file_path: str,
+    page_scan: list[tuple[int, list[str]]],
+    scan_options: ScanOptions,
+    cache: PageTableCache | None = None,
+    previous_tables: TableFingerprintIndex | None = None,
+) -> Iterator[PageResult]:
+    # Every page result is handed on as soon as it's ready, and nothing of a chunk's pages outlives the chunk
+    chunk_pages = scan_options.chunk_pages or DEFAULT_CHUNK_PAGES
+    start = 0
+    while start < len(page_scan):
+        chunk = page_scan[start : start + chunk_pages]
+        doc = pymupdf.open(pdf_file_path)
+        try:
+            for page_number, categories in chunk:
+                yield extract_page_commands(
+                    doc[page_number], categories, scan_options, cache, previous_tables
+                )
+        finally:
+            release_document(doc)
+        start += len(chunk)
+        if scan_options.memory_budget_mb is not None:
+            chunk_pages = check_memory_budget(
+                scan_options.memory_budget_mb, chunk_pages, get_current_rss_mb()
+            )
+
+
+def iterate_page_results(
+    doc: pymupdf.Document,
+    page_scan: list[tuple[int, list[str]]],
+    scan_options: ScanOptions,
+    cache: PageTableCache | None = None,
+    previous_tables: TableFingerprintIndex | None = None,
+) -> Iterator[PageResult]:
+    if scan_options.workers <= 1 and scan_options.is_streaming:
+        if scan_options.memory_budget_mb is not None and get_current_rss_mb() is None:
+            logger.warning(
+                "Resident memory can't be read on this platform, so the memory budget isn't enforced"
+            )
+        yield from iterate_page_chunks(
+            doc.name, page_scan, scan_options, cache, previous_tables
+        )
+        return
+    if scan_options.workers <= 1:
+        for page_number, categories in page_scan:
+            yield extract_page_commands(
+                doc[page_number], categories, scan_options, cache, previous_tables
+            )
+        return
+    logger.info("Processing pages across %d workers...", scan_options.workers)
+    with ProcessPoolExecutor(
+        max_workers=scan_options.workers,
+        initializer=_open_worker_document,
+        initargs=(
+            doc.name,
+            scan_options,
+            cache,
+            logging.getLogger().level,
+            previous_tables,
+        ),
+    ) as executor:
+        batch_pages = get_batch_pages(
+            len(page_scan),
+            scan_options.workers,
+            (
+                (scan_options.chunk_pages or DEFAULT_CHUNK_PAGES)
+                if scan_options.is_streaming
+                else 0
+            ),
+        )
+        # Batches are submitted a few per worker at a time rather than all up front, so the ones still to come are
+        # cut to the size the workers' memory allows. Results are handed back in submission order, so merging keeps
+        # the serial page order.
+        pending_batches: deque[tuple[Future, int]] = deque()
+        start = 0
+        try:
+            while start < len(page_scan) or pending_batches:
+                while (
+                    start < len(page_scan)
+                    and len(pending_batches) < scan_options.workers * 2
+                ):
+                    batch = page_scan[start : start + batch_pages]
+                    pending_batches.append(
+                        (executor.submit(_extract_pages, batch), len(batch))
+                    )
+                    start += len(batch)
+                future, batch_size = pending_batches.popleft()
+                page_results, rss_mb = future.result()
+                # Batches handed out before the last cut were bigger, and are already accounted for
+                if batch_size <= batch_pages:
+                    batch_pages = check_memory_budget(
+                        scan_options.memory_budget_mb, batch_pages, rss_mb
                     )
-                if category in joined_focused_header:
-                    # print(f'Table header is: {focused_header}')
-                    # print(f'Table headings are: {table_checker.tables[0].header.names}')
-                    # print(f'Table is: {table_checker.tables[0].extract()}')
-                    focused_table = table_checker.tables[0].extract()
-                    if focused_table[0] == COMMAND_TABLE_ROW:
-                        print(f"IS COMMAND_TABLE")
-                        print(f"Table is: {focused_table}")
-                        for command, query, return_description in focused_table[1:]:
-                            command_details = CommandDetails()
-                            # The text inside the PDF has awkward formatting, so it needs some cleaning up
-                            if (
-                                formatted_command := command.split("(")[0]
-                                .replace("\n", "")
-                                .rstrip()
-                            ) != "n/a":
-                                scope_commands[category].append(formatted_command)
-                                print(f"Formatted command is: {formatted_command}")
-                                # This deals with named commands
-                                command_details.command_name = formatted_command
-                                command_details.command_variable_names = re.findall(
-                                    r"<(.*?)>", formatted_command
-                                )
-                                command_details.has_variables_in_command = (
-                                    len(command_details.command_variable_names) > 0
-                                )
-                                bracket_count = get_bracket_count(formatted_command)
-                                # inline command params dealt with here
-                                if has_no_named_variables(
-                                    bracket_count
-                                ) and has_enum_range_defined(bracket_count):
-                                    inline_command_range = get_enum_values(
-                                        formatted_command
-                                    )
-                                    command_details.has_inline_variables_in_command = (
-                                        True
-                                    )
-                                    command_details.variable_list.append(
-                                        {"INLINE_COMMAND_PARAMS": inline_command_range}
-                                    )
-                            if (
-                                formatted_query := query.split("(")[0]
-                                .replace("\n", "")
-                                .rstrip()
-                            ) != "n/a":
-                                scope_queries[category].append(formatted_query)
-                                print(f"Formatted query is: {formatted_query}")
-                                # deals with named queries
-                                command_details.query_name = formatted_query
-                                command_details.query_variable_names = re.findall(
-                                    r"<(.*?)>", formatted_query
-                                )
-                                command_details.has_variables_in_query = (
-                                    len(command_details.query_variable_names) > 0
-                                )
-                                bracket_count = get_bracket_count(formatted_query)
-                                # inline query params dealt with here
-                                if has_no_named_variables(
-                                    bracket_count
-                                ) and has_enum_range_defined(bracket_count):
-                                    inline_query_range = get_enum_values(
-                                        formatted_query
-                                    )
-                                    command_details.has_inline_variables_in_query = True
-                                    command_details.variable_list.append(
-                                        ({"INLINE_QUERY_PARAMS": inline_query_range})
-                                    )
-                            formatted_return_description = return_description.replace(
-                                "\n", ""
-                            ).rstrip()
-                            command_details.return_description = (
-                                formatted_return_description
-                            )
-                            if (
-                                command_details.has_variables_in_command
-                                or command_details.has_inline_variables_in_command
-                            ):
-                                # divide out the variables from the return description, and process them with the command ones
-                                divided_out_variables = re.findall(
-                                    r"<.*?>.*?(?=<|$)", formatted_return_description
-                                )
-                                contains_unprocessed_parameter = False
-                                for section in divided_out_variables:
-                                    print(f"Section is: {section}")
-                                    [return_description_variable] = re.findall(
-                                        r"<(.*?)>", section
-                                    )
-                                    if return_description_variable == "return_value":
-                                        continue
-                                    print(
-                                        f"Variable name capture is: {return_description_variable}"
-                                    )
-                                    value_type = determine_value_type(section)
-                                    if value_type == ReturnElement.ENUM_FORMAT:
-                                        enum_variables = re.findall(
-                                            r"{(.*?)}", formatted_return_description
-                                        )
-                                        formatted_variable_name_list = [
-                                            item.strip(" ")
-                                            for item in enum_variables[0].split("|")
-                                        ]
-                                        print(
-                                            f"Variable name set is: {formatted_variable_name_list}"
-                                        )
-                                        command_details.variable_list.append(
-                                            {
-                                                return_description_variable: formatted_variable_name_list
-                                            }
-                                        )
-                                        continue
-                                    elif value_type == ReturnElement.UNKNOWN:
-                                        print(f"Unknown return type: {section}")
-                                        contains_unprocessed_parameter = True
-                                        continue
-                                    command_details.variable_list.append(
-                                        {return_description_variable: value_type.value}
-                                    )
-                                command_details.is_implemented = (
-                                    not contains_unprocessed_parameter
-                                )
-                            else:
-                                command_details.is_implemented = True
-                            detailed_commands_by_category[category].append(
-                                asdict(command_details)
-                            )
+                yield from page_results
+        finally:
+            # Batches still queued aren't needed once the scan stops early, e.g. over the memory budget
+            for future, _ in pending_batches:
+                future.cancel()
+
+
+def prcoess_command_details(
+    catalog_writer: JsonCatalogWriter | NdjsonCatalogWriter,
+    doc: pymupdf.Document,
+    command_categories: list[str],
+    category_page_ranges: dict[str, range] | None = None,
+    scan_options: ScanOptions = ScanOptions(),
+    cache: PageTableCache | None = None,
+    profiler: BuilderProfiler | None = None,
+    previous_tables: TableFingerprintIndex | None = None,
+    fingerprint_writer: TableFingerprintWriter | None = None,
+) -> ScanSummary:
+    page_scan = plan_page_scan(doc.page_count, command_categories, category_page_ranges)
+    scan_summary = ScanSummary(pages_in_document=doc.page_count)
+    logger.info(
+        "Scanning %d of %d pages for command tables...",
+        len(page_scan),
+        doc.page_count,
+    )
+    for page_result in iterate_page_results(
+        doc, page_scan, scan_options, cache, previous_tables
+    ):
+        scan_summary.add_page_result(page_result)
+        if profiler is not None and page_result.stage_timer is not None:
+            profiler.add_page(page_result.page_number, page_result.stage_timer)
+        with profiler.time("output_write") if profiler is not None else NULL_CONTEXT:
+            catalog_writer.write_page(page_result.page_number, page_result.commands)
+            if fingerprint_writer is not None and page_result.fingerprint is not None:
+                fingerprint_writer.write_page(
+                    page_result.page_number,
+                    page_result.fingerprint,
+                    page_result.commands,
+                )
+    scan_summary.report()
+    return scan_summary
 
 
 def write_command_data_to_file(
@@ -305,55 +852,196 @@ def write_command_data_to_file(
     scope_queries: dict,
     scope_commands: dict,
     detailed_commands_by_category: dict[str, dict],
+    model_name: str = MODEL_NAME,
 ):
-    print(f"Writing command data to {output_file_path}...")
+    logger.info("Writing command data to %s...", output_file_path)
     data_to_write = {
-        "DSO5012A": {
+        model_name: {
             "Scope Queries": scope_queries,
             "Scope Commands": scope_commands,
             "Detailed Commands": detailed_commands_by_category,
         }
     }
-    print(f"Writing command data to {output_file_path}...")
     with open(os.path.join(output_file_path), "w", encoding="utf8") as f:
         try:
             json.dump(data_to_write, f, indent=4)
-            print("Successfully wrote to file without errors!")
+            logger.info("Successfully wrote to file without errors!")
         except Exception as e:
-            print(f"Error writing to file: {e}")
+            logger.error("Error writing to file: %s", e)
+
+
+def derive_model_name(doc: pymupdf.Document) -> str:
+    # Programmer manuals name their model in the metadata title or subject, or failing that on the title page.
+    # Manuals without a recognisable model number fall back to their metadata title, then their file name.
+    metadata = doc.metadata or {}
+    candidates = [
+        metadata.get("title"),
+        metadata.get("subject"),
+        metadata.get("keywords"),
+    ]
+    if doc.page_count:
+        candidates.append(doc[0].get_text())
+    for candidate in candidates:
+        if candidate and (model_match := MODEL_NAME_PATTERN.search(candidate)):
+            return model_match.group(0)
+    if metadata.get("title", "").strip():
+        return metadata["title"].strip()
+    return os.path.splitext(os.path.basename(doc.name))[0]
+
+
+def build_command_catalog(
+    doc: pymupdf.Document,
+    output_file_path: str,
+    output_format: str = "json",
+    scan_options: ScanOptions = ScanOptions(),
+    cache: PageTableCache | None = None,
+    profiler: BuilderProfiler | None = None,
+    model_name: str = MODEL_NAME,
+    previous_tables: TableFingerprintIndex | None = None,
+    fingerprint_file_path: str | None = None,
+) -> ScanSummary:
+    if profiler is None:
+        profiler = BuilderProfiler(doc.name, scan_options.workers, enabled=False)
+    command_categories: list[str] = []
+    command_list: list[str] = []
+    category_page_ranges: dict[str, range] = {}
+    with profiler.time("toc_scan"):
+        obtain_commands_to_process(
+            doc, command_categories, command_list, category_page_ranges
+        )
+    if output_format == "ndjson":
+        catalog_writer = NdjsonCatalogWriter(
+            output_file_path, model_name, command_categories
+        )
+    elif output_format == "sqlite":
+        catalog_writer = SqliteCatalogWriter(
+            output_file_path, model_name, command_categories
+        )
+    else:
+        if scan_options.is_streaming:
+            logger.info(
+                "json output keeps the catalog in memory until the scan is done, ndjson and sqlite write each page as it's scanned."
+            )
+        catalog_writer = JsonCatalogWriter(
+            output_file_path, model_name, command_categories
+        )
+    fingerprint_writer = None
+    if fingerprint_file_path is not None and scan_options.fingerprint_tables:
+        fingerprint_writer = TableFingerprintWriter(fingerprint_file_path)
+    scan_summary = prcoess_command_details(
+        catalog_writer,
+        doc,
+        command_categories,
+        category_page_ranges,
+        scan_options,
+        cache,
+        profiler,
+        previous_tables,
+        fingerprint_writer,
+    )
+    with profiler.time("output_write"):
+        catalog_writer.close()
+        if fingerprint_writer is not None:
+            fingerprint_writer.close()
+    if isinstance(catalog_writer, JsonCatalogWriter) and logger.isEnabledFor(
+        logging.DEBUG
+    ):
+        logger.debug("Scope Queries:\n%s", pprint.pformat(catalog_writer.scope_queries))
+        logger.debug(
+            "Scope Commands:\n%s", pprint.pformat(catalog_writer.scope_commands)
+        )
+    return scan_summary
 
 
 if __name__ == "__main__":
     args = parse_command_line_args()
+    logging.basicConfig(level=args.log_level, format=LOG_FORMAT)
     try:
         doc = pymupdf.open(args.pdf_file_path)
     except FileNotFoundError:
-        print(
-            f"The PDF file {args.pdf_file_path} could not be found. Check the path and try again."
+        logger.error(
+            "The PDF file %s could not be found. Check the path and try again.",
+            args.pdf_file_path,
         )
         exit(1)
-    command_categories: list[str] = []
-    command_list: list[str] = []
-    obtain_commands_to_process(doc, command_categories, command_list)
-    scope_queries = {category: [] for category in command_categories}
-    scope_commands = {category: [] for category in command_categories}
-    detailed_commands_by_category: dict[str, CommandDetails] = {
-        category: [] for category in command_categories
-    }
-    prcoess_command_details(
-        detailed_commands_by_category,
-        scope_queries,
-        scope_commands,
-        doc,
-        command_categories,
+    profiler = BuilderProfiler(
+        args.pdf_file_path, args.workers, enabled=args.profile is not None
     )
-    write_command_data_to_file(
-        args.output_file_path,
-        scope_queries,
-        scope_commands,
-        detailed_commands_by_category,
+    cache = None
+    if not args.no_cache:
+        cache = PageTableCache(
+            args.cache_dir, args.pdf_file_path, args.cache_max_size_mb * 1024 * 1024
+        )
+    model_name = (
+        derive_model_name(doc) if args.model_name == "auto" else args.model_name
     )
-    print("Scope Queries")
-    pprint.pprint(scope_queries)
-    print("Scope Commands")
-    pprint.pprint(scope_commands)
+    previous_catalog = None
+    previous_tables = None
+    if args.diff_against is not None:
+        try:
+            previous_catalog = read_catalog_file(args.diff_against, model_name)[
+                model_name
+            ]
+        except (OSError, KeyError, ValueError) as e:
+            logger.error("Couldn't read %s to diff against: %s", args.diff_against, e)
+            exit(1)
+        # Read before the build, which may overwrite them
+        previous_tables = TableFingerprintIndex.load(
+            get_fingerprint_file_path(args.diff_against)
+        )
+    # Fingerprinting costs a second text extraction of every page, so plain builds skip it. A diffing build writes
+    # them, so the next revision can be diffed against it in turn.
+    write_fingerprints = args.write_fingerprints or args.diff_against is not None
+    try:
+        scan_summary = build_command_catalog(
+            doc,
+            args.output_file_path,
+            args.format,
+            ScanOptions(
+                workers=args.workers,
+                use_prefilter=not args.no_prefilter,
+                verify_prefilter=args.verify_prefilter,
+                profile=args.profile is not None,
+                chunk_pages=args.chunk_pages,
+                memory_budget_mb=args.memory_budget_mb,
+                fingerprint_tables=write_fingerprints,
+            ),
+            cache,
+            profiler,
+            model_name,
+            previous_tables,
+            (
+                get_fingerprint_file_path(args.output_file_path)
+                if write_fingerprints
+                else None
+            ),
+        )
+    except MemoryError as e:
+        logger.error("%s", e)
+        exit(1)
+    if previous_catalog is not None:
+        changelog = diff_catalogs(
+            previous_catalog,
+            read_catalog_file(args.output_file_path, model_name)[model_name],
+        )
+        changelog["summary"]["pages_reused_by_text"] = scan_summary.pages_reused_by_text
+        changelog["summary"][
+            "tables_reused_by_rows"
+        ] = scan_summary.tables_reused_by_rows
+        write_changelog(
+            args.changelog_file_path
+            or f"{args.output_file_path}{CHANGELOG_FILE_SUFFIX}",
+            changelog,
+        )
+    if cache is not None:
+        cache.evict()
+    if args.profile is not None:
+        profiler.write_report(args.profile, args.profile_slowest_pages)
+    peak_rss_mb, children_peak_rss_mb = get_peak_rss_mb()
+    if peak_rss_mb is not None:
+        logger.info("Peak resident memory was %.1f MB.", peak_rss_mb)
+    if children_peak_rss_mb:
+        logger.info(
+            "Peak resident memory of a worker process was %.1f MB.",
+            children_peak_rss_mb,
+        )
@@ -0,0 +1,284 @@
+import warnings
+
+from typing import Callable, Final
+
+import numpy as np
+
+from command_details import ReturnElement, get_response_variable
+from scpi_syntax import ScpiHeaderIndex, get_header, get_short_form
+
+# Long responses (ASCII waveforms, measurement lists) are comma separated numbers. Instruments write them at a fixed
+# width, e.g. "+1.23456E-01,-4.00000E-03", so every number's digits sit in the same columns, and the list can be
+# decoded a column at a time with NumPy instead of a number at a time. Lists that aren't fixed width fall back to
+# NumPy's own text parser.
+LIST_SEPARATOR: Final = b","
+BLOCK_START: Final = b"#"
+# Powers of ten up to 1e22 are exact doubles, and so are integers of up to 15 digits, so multiplying or dividing such
+# a mantissa by one of them rounds once, the same as float() does. Lists that would need a larger power, or a longer
+# mantissa, go through the generic parser.
+MAX_EXACT_POWER: Final = 22
+POWERS_OF_TEN: Final = 10.0 ** np.arange(0, MAX_EXACT_POWER + 1)
+MAX_EXACT_MANTISSA_DIGITS: Final = 15
+ASCII_ZERO: Final = ord("0")
+ASCII_PLUS: Final = ord("+")
+ASCII_MINUS: Final = ord("-")
+ASCII_SPACE: Final = ord(" ")
+ASCII_DECIMAL_POINT: Final = ord(".")
+# Integer mantissas with more digits than this could overflow int64, and ones up to INT32_DIGITS long are accumulated
+# in int32, which halves the memory traffic
+MAX_MANTISSA_DIGITS: Final = 18
+INT32_DIGITS: Final = 9
+
+
+def get_record_columns(data: bytes, width: int, count: int) -> np.ndarray:
+    # The records as a (width, count) array, so each column is contiguous. The last record has no separator after
+    # it, so one is filled in.
+    buffer = np.frombuffer(data, np.uint8)
+    columns = np.empty((width, count), np.uint8)
+    columns[:, : count - 1] = buffer[: (count - 1) * width].reshape(count - 1, width).T
+    columns[: width - 1, count - 1] = buffer[(count - 1) * width :]
+    columns[width - 1, count - 1] = LIST_SEPARATOR[0]
+    return columns
+
+
+def accumulate_digits(
+    columns: np.ndarray, digit_columns: list[int]
+) -> np.ndarray | None:
+    # The integer each row's digit columns spell out, or None if any of them isn't a digit. The columns already had
+    # ASCII_ZERO subtracted, so anything above 9 wasn't a digit.
+    if not digit_columns or (columns[digit_columns] > 9).any():
+        return None
+    total = columns[digit_columns[0]].astype(
+        np.int32 if len(digit_columns) <= INT32_DIGITS else np.int64
+    )
+    for column in digit_columns[1:]:
+        total *= 10
+        total += columns[column]
+    return total
+
+
+def is_sign_column(column: np.ndarray, allow_space: bool) -> bool:
+    is_sign = (column == ASCII_PLUS) | (column == ASCII_MINUS)
+    if allow_space:
+        is_sign |= column == ASCII_SPACE
+    return bool(is_sign.all())
+
+
+def parse_fixed_width_numbers(data: bytes) -> np.ndarray | None:
+    # Returns None unless every number has the same layout as the first: the same width, optional sign, digits,
+    # decimal point and exponent positions
+    width = data.find(LIST_SEPARATOR) + 1
+    if width <= 1 or (len(data) + 1) % width:
+        return None
+    count = (len(data) + 1) // width
+    first = data[: width - 1]
+    columns = get_record_columns(data, width, count)
+    if not (columns[width - 1] == LIST_SEPARATOR[0]).all():
+        return None
+    mantissa_start = 1 if first[:1] in (b"+", b"-", b" ") else 0
+    exponent_index = first.upper().find(b"E")
+    mantissa_end = exponent_index if exponent_index >= 0 else width - 1
+    decimal_point_index = first.find(b".", mantissa_start, mantissa_end)
+    fraction_digits = (
+        mantissa_end - decimal_point_index - 1 if decimal_point_index >= 0 else 0
+    )
+    mantissa_columns = [
+        column
+        for column in range(mantissa_start, mantissa_end)
+        if column != decimal_point_index
+    ]
+    if len(mantissa_columns) > MAX_MANTISSA_DIGITS or (
+        (decimal_point_index >= 0 or exponent_index >= 0)
+        and len(mantissa_columns) > MAX_EXACT_MANTISSA_DIGITS
+    ):
+        return None
+    # Signs and separators are checked before the digits get shifted down to 0-9
+    if (
+        decimal_point_index >= 0
+        and not (columns[decimal_point_index] == ASCII_DECIMAL_POINT).all()
+    ):
+        return None
+    # Every record needs its sign in the same column, "+1.5,12.5" isn't fixed width even though its lengths line up
+    if mantissa_start and not is_sign_column(columns[0], allow_space=True):
+        return None
+    is_negative = columns[0] == ASCII_MINUS if mantissa_start else None
+    exponent_start = exponent_index + 1
+    is_negative_exponent = None
+    if exponent_index >= 0:
+        if not (columns[exponent_index] == first[exponent_index]).all():
+            return None
+        if first[exponent_start : exponent_start + 1] in (b"+", b"-"):
+            if not is_sign_column(columns[exponent_start], allow_space=False):
+                return None
+            is_negative_exponent = columns[exponent_start] == ASCII_MINUS
+            exponent_start += 1
+    columns -= np.uint8(ASCII_ZERO)
+    mantissa = accumulate_digits(columns, mantissa_columns)
+    if mantissa is None:
+        return None
+    if exponent_index < 0:
+        if fraction_digits == 0:
+            values = mantissa
+        else:
+            values = mantissa / POWERS_OF_TEN[fraction_digits]
+    else:
+        exponent = accumulate_digits(columns, list(range(exponent_start, width - 1)))
+        if exponent is None:
+            return None
+        if is_negative_exponent is not None:
+            exponent[is_negative_exponent] *= -1
+        # Dividing by 10^(fraction digits - exponent) when that's positive, which it is for most instrument data
+        divisor_powers = fraction_digits - exponent
+        if (np.abs(divisor_powers) > MAX_EXACT_POWER).any():
+            return None
+        if (divisor_powers >= 0).all():
+            values = mantissa / POWERS_OF_TEN[divisor_powers]
+        else:
+            values = np.where(
+                divisor_powers >= 0,
+                mantissa / POWERS_OF_TEN[np.maximum(divisor_powers, 0)],
+                mantissa * POWERS_OF_TEN[np.maximum(-divisor_powers, 0)],
+            )
+    if is_negative is not None:
+        values[is_negative] *= -1
+    return values
+
+
+def decode_number_list(data: bytes, dtype: type = np.float64) -> np.ndarray:
+    # Decodes a comma separated list of NR1, NR2 or NR3 numbers, e.g. an ASCII waveform
+    data = data.strip()
+    values = parse_fixed_width_numbers(data)
+    if values is None:
+        # NumPy warns about text it can't parse, and stops there, which the count check catches
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            values = np.fromstring(data, dtype=np.float64, sep=",")
+        if len(values) != data.count(LIST_SEPARATOR) + 1:
+            raise ValueError(f"Couldn't decode a number list: {data[:80]!r}")
+    return values.astype(dtype, copy=False)
+
+
+def parse_definite_length_block(data: bytes | memoryview) -> tuple[int, int]:
+    # Returns where the data of a "#<digit count><byte count><bytes>" block starts, and how long it is
+    if data[:1] != BLOCK_START or not data[1:2].isdigit():
+        raise ValueError(f"Not a definite length block: {bytes(data[:12])!r}")
+    digit_count = int(data[1:2])
+    if digit_count == 0:
+        raise ValueError("Indefinite length blocks have no byte count")
+    byte_count = int(data[2 : 2 + digit_count])
+    offset = 2 + digit_count
+    if len(data) < offset + byte_count:
+        raise ValueError(
+            f"The block holds {len(data) - offset} bytes instead of {byte_count}"
+        )
+    return offset, byte_count
+
+
+def decode_block(data: bytes | memoryview, dtype: str | type = np.uint8) -> np.ndarray:
+    # A view of a whole block's data, header included (e.g. read off a socket), without copying it. Waveforms in
+    # WORD format are usually big endian 16 bit integers, dtype ">i2" or ">u2".
+    offset, byte_count = parse_definite_length_block(data)
+    dtype = np.dtype(dtype)
+    return np.frombuffer(data, dtype, count=byte_count // dtype.itemsize, offset=offset)
+
+
+def decode_block_data(
+    data: bytes | memoryview, dtype: str | type = np.uint8
+) -> np.ndarray:
+    # A view of a block's data, as ScpiConnection.query_raw returns it without the header
+    dtype = np.dtype(dtype)
+    return np.frombuffer(data, dtype, count=len(data) // dtype.itemsize)
+
+
+def decode_nr1(data: bytes) -> int | np.ndarray:
+    if LIST_SEPARATOR in data:
+        return decode_number_list(data, np.int64)
+    return int(data)
+
+
+def decode_nr3(data: bytes) -> float | np.ndarray:
+    if LIST_SEPARATOR in data:
+        return decode_number_list(data)
+    return float(data)
+
+
+def decode_quoted_string(data: bytes) -> str:
+    text = data.decode("ascii").strip()
+    if len(text) >= 2 and text[0] in "\"'" and text[-1] == text[0]:
+        return text[1:-1].replace(text[0] * 2, text[0])
+    return text
+
+
+def decode_unquoted_string(data: bytes) -> str:
+    return data.decode("ascii").strip()
+
+
+def compile_enum_decoder(enum_values: list[str]) -> Callable[[bytes], str]:
+    # Instruments answer with the short form of a value, e.g. WIND for WINDow. Known responses come back as the same
+    # str objects every time, so they can be compared by identity.
+    responses = {}
+    for enum_value in enum_values:
+        short_form = get_short_form(enum_value)
+        responses.setdefault(short_form.encode("ascii"), short_form)
+        responses.setdefault(enum_value.upper().encode("ascii"), short_form)
+
+    def decode_enum(data: bytes) -> str:
+        if (response := responses.get(data)) is not None:
+            return response
+        return data.decode("ascii").strip().upper()
+
+    return decode_enum
+
+
+SCALAR_DECODERS: Final[dict[str, Callable[[bytes], object]]] = {
+    ReturnElement.NR1_FORMAT.value: decode_nr1,
+    ReturnElement.NR3_FORMAT.value: decode_nr3,
+    ReturnElement.QUOTED_STRING.value: decode_quoted_string,
+    ReturnElement.UNQUOTED_STRING.value: decode_unquoted_string,
+}
+
+
+def compile_response_decoder(command_definition: dict) -> Callable[[bytes], object]:
+    variable = get_response_variable(command_definition)
+    if variable is None:
+        return decode_unquoted_string
+    _, value_type = variable
+    if isinstance(value_type, list):
+        return compile_enum_decoder(value_type)
+    return SCALAR_DECODERS.get(value_type, decode_unquoted_string)
+
+
+class ResponseDecoder:
+    # Decodes query responses into Python values by the type the catalog gives them: NR1 to int, NR3 to float, and
+    # comma separated lists of either to NumPy arrays. Decoders are compiled once per query, and also kept per header
+    # spelling, so a repeated query costs a dict lookup before its decoder runs. Blocks don't have a catalog type, so
+    # waveform data goes through decode_block_data with the dtype its :WAVeform:FORMat gives instead.
+    def __init__(self, model_catalog: dict):
+        self.header_index = ScpiHeaderIndex()
+        for command_definitions in model_catalog["Detailed Commands"].values():
+            for command_definition in command_definitions:
+                if command_definition["query_name"]:
+                    self.header_index.add(
+                        command_definition["query_name"], command_definition
+                    )
+        self.decoders_by_query: dict[str, Callable[[bytes], object]] = {}
+        self.decoders_by_header: dict[str, Callable[[bytes], object]] = {}
+
+    def get_decoder(self, query: str) -> Callable[[bytes], object]:
+        header = get_header(query)
+        if (decoder := self.decoders_by_header.get(header)) is not None:
+            return decoder
+        match = self.header_index.find(header)
+        if match is None:
+            decoder = decode_unquoted_string
+        else:
+            command_definition = match[0]
+            query_name = command_definition["query_name"]
+            if (decoder := self.decoders_by_query.get(query_name)) is None:
+                decoder = compile_response_decoder(command_definition)
+                self.decoders_by_query[query_name] = decoder
+        self.decoders_by_header[header] = decoder
+        return decoder
+
+    def decode(self, query: str, response: bytes) -> object:
+        return self.get_decoder(query)(response)
@@ -0,0 +1,389 @@
+import re
+
+from dataclasses import dataclass, field
+from typing import Final, Union
+
+# See page 106 of manual for a more in-depth explanation
+OPTIONAL_SYNTAX: Final = ["[", "]"]
+ENUM_BRACES: Final = ["{", "}"]
+ANGLE_BRACKETS: Final = ["<", ">"]  # These can represent a string, or a command input
+ENUM_SEPARATOR: Final = "|"
+DEFINITION_OPERATOR: Final = "::="
+
+# A single pass over the string splits it into plain text, <named> variables, definition operators and bracket
+# characters. Colons are part of the text (they separate SCPI mnemonics) unless they start a "::=". Stray angle
+# brackets and colons are picked up with the brackets, so misaligned text still gets tokenized.
+SYNTAX_TOKEN_PATTERN: Final = re.compile(
+    r"((?:[^\[\]{}|<>:]+|:(?!:=))+)|(<[^<>]*>)|(::=)|([\[\]{}|<>:])"
+)
+# Most commands and queries are only mnemonics and <named> variables, which can be split without the full parser
+VARIABLE_SPLIT_PATTERN: Final = re.compile(r"<([^<>]*)>")
+STRUCTURE_PATTERN: Final = re.compile(r"[\[\]{}|]|::=")
+
+
+@dataclass(slots=True)
+class Literal:
+    text: str
+
+
+@dataclass(slots=True)
+class Variable:
+    name: str
+
+
+@dataclass(slots=True)
+class Definition:
+    pass
+
+
+@dataclass(slots=True)
+class OptionalGroup:
+    children: list["SyntaxNode"] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class EnumGroup:
+    options: list[list["SyntaxNode"]] = field(default_factory=lambda: [[]])
+
+
+SyntaxNode = Union[Literal, Variable, Definition, OptionalGroup, EnumGroup]
+
+
+# A "<name> ::= ..." section of a return description
+@dataclass(slots=True)
+class VariableDefinition:
+    name: str
+    body: list[SyntaxNode]
+
+
+def parse_syntax(formatted_string: str) -> list[SyntaxNode]:
+    if not STRUCTURE_PATTERN.search(formatted_string):
+        return parse_flat_syntax(formatted_string)
+    root: list[SyntaxNode] = []
+    # Each open group is stored alongside the list its children are currently being added to
+    open_groups: list[tuple[OptionalGroup | EnumGroup, list[SyntaxNode]]] = []
+    current_nodes = root
+    for text, variable, definition, bracket in SYNTAX_TOKEN_PATTERN.findall(
+        formatted_string
+    ):
+        if text:
+            if current_nodes and type(current_nodes[-1]) is Literal:
+                current_nodes[-1].text += text
+            else:
+                current_nodes.append(Literal(text))
+        elif variable:
+            current_nodes.append(Variable(variable[1:-1]))
+        elif definition:
+            current_nodes.append(Definition())
+        elif bracket == "[":
+            group = OptionalGroup()
+            current_nodes.append(group)
+            current_nodes = group.children
+            open_groups.append((group, current_nodes))
+        elif bracket == "{":
+            group = EnumGroup()
+            current_nodes.append(group)
+            current_nodes = group.options[0]
+            open_groups.append((group, current_nodes))
+        elif bracket == "|" and open_groups and type(open_groups[-1][0]) is EnumGroup:
+            enum_group = open_groups[-1][0]
+            current_nodes = []
+            enum_group.options.append(current_nodes)
+            open_groups[-1] = (enum_group, current_nodes)
+        else:
+            group_type = (
+                OptionalGroup
+                if bracket == "]"
+                else EnumGroup if bracket == "}" else None
+            )
+            # Misaligned brackets exist inside the PDF, so close back to the matching group if there is one,
+            # and otherwise keep the bracket as text
+            depth = len(open_groups) - 1
+            while depth >= 0 and type(open_groups[depth][0]) is not group_type:
+                depth -= 1
+            if depth >= 0:
+                del open_groups[depth:]
+                current_nodes = open_groups[-1][1] if open_groups else root
+            elif current_nodes and type(current_nodes[-1]) is Literal:
+                current_nodes[-1].text += bracket
+            else:
+                current_nodes.append(Literal(bracket))
+    # Any groups left open are treated as closed at the end of the string
+    return root
+
+
+def parse_flat_syntax(formatted_string: str) -> list[SyntaxNode]:
+    # split() alternates between the text and the variable names, starting and ending with (possibly empty) text
+    nodes: list[SyntaxNode] = []
+    for index, piece in enumerate(VARIABLE_SPLIT_PATTERN.split(formatted_string)):
+        if index % 2:
+            nodes.append(Variable(piece))
+        elif piece:
+            nodes.append(Literal(piece))
+    return nodes
+
+
+def render_syntax(nodes: list[SyntaxNode]) -> str:
+    rendered = []
+    for node in nodes:
+        if isinstance(node, Literal):
+            rendered.append(node.text)
+        elif isinstance(node, Variable):
+            rendered.append(f"<{node.name}>")
+        elif isinstance(node, Definition):
+            rendered.append(DEFINITION_OPERATOR)
+        elif isinstance(node, OptionalGroup):
+            rendered.append(f"[{render_syntax(node.children)}]")
+        else:
+            rendered.append(
+                "{"
+                + ENUM_SEPARATOR.join(render_syntax(option) for option in node.options)
+                + "}"
+            )
+    return "".join(rendered)
+
+
+def collect_nodes(
+    nodes: list[SyntaxNode], node_type: type, collected: list | None = None
+) -> list:
+    # Depth first, in the order the nodes appear in the original string
+    if collected is None:
+        collected = []
+    for node in nodes:
+        if type(node) is node_type:
+            collected.append(node)
+        if type(node) is OptionalGroup:
+            collect_nodes(node.children, node_type, collected)
+        elif type(node) is EnumGroup:
+            for option in node.options:
+                collect_nodes(option, node_type, collected)
+    return collected
+
+
+def get_variable_names(nodes: list[SyntaxNode]) -> list[str]:
+    return [node.name for node in collect_nodes(nodes, Variable)]
+
+
+def find_first_enum(nodes: list[SyntaxNode]) -> EnumGroup | None:
+    for node in nodes:
+        if type(node) is EnumGroup:
+            return node
+        if type(node) is OptionalGroup and (
+            enum_group := find_first_enum(node.children)
+        ):
+            return enum_group
+    return None
+
+
+def get_enum_values(enum_group: EnumGroup) -> list[str]:
+    # Nested enums are set values, so they get flattened: {{0 | OFF} | {1 | ON}} gives ["0", "OFF", "1", "ON"]
+    enum_values = []
+    for option in enum_group.options:
+        significant_nodes = [
+            node
+            for node in option
+            if not (isinstance(node, Literal) and node.text.isspace())
+        ]
+        if len(significant_nodes) == 1 and isinstance(significant_nodes[0], EnumGroup):
+            option_values = get_enum_values(significant_nodes[0])
+        else:
+            option_values = [render_syntax(option).strip()]
+        for value in option_values:
+            if value and value not in enum_values:
+                enum_values.append(value)
+    return enum_values
+
+
+def split_variable_definitions(nodes: list[SyntaxNode]) -> list[VariableDefinition]:
+    # Return descriptions are made up of "<name> ::= ..." sections. Only a top-level variable followed by "::="
+    # starts a new section, so variables used inside a definition (e.g. {CHANnel<n> | EXTernal}) stay part of it.
+    # Descriptions that never use "::=" get a section per top-level variable instead.
+    has_definitions = any(isinstance(node, Definition) for node in nodes)
+    variable_definitions: list[VariableDefinition] = []
+    index = 0
+    while index < len(nodes):
+        node = nodes[index]
+        index += 1
+        if not isinstance(node, Variable):
+            if variable_definitions:
+                variable_definitions[-1].body.append(node)
+            continue
+        next_index = index
+        while (
+            next_index < len(nodes)
+            and isinstance(nodes[next_index], Literal)
+            and nodes[next_index].text.isspace()
+        ):
+            next_index += 1
+        if has_definitions:
+            if next_index < len(nodes) and isinstance(nodes[next_index], Definition):
+                variable_definitions.append(VariableDefinition(node.name, []))
+                index = next_index + 1
+            elif variable_definitions:
+                variable_definitions[-1].body.append(node)
+        else:
+            variable_definitions.append(VariableDefinition(node.name, []))
+    return variable_definitions
+
+
+# Instruments accept a mnemonic in its short form (the upper case part of the catalog spelling, plus any trailing
+# digits) or its long form, in any case. A <variable> right after a mnemonic is its numeric suffix (CHANnel<n>
+# accepts CHAN1 or channel2), and mnemonics inside [] can be left out.
+SHORT_FORM_PATTERN: Final = re.compile(r"[*A-Z][*A-Z0-9]*")
+QUERY_MARK: Final = "?"
+HEADER_SEPARATOR: Final = ":"
+UNIT_SEPARATOR: Final = ";"
+PARAMETER_SEPARATOR: Final = ","
+DIGITS: Final = "0123456789"
+
+
+def get_short_form(mnemonic: str) -> str:
+    stripped_mnemonic = mnemonic.rstrip(DIGITS)
+    short_form = SHORT_FORM_PATTERN.match(stripped_mnemonic)
+    if short_form is None:
+        return mnemonic.upper()
+    return short_form.group(0) + mnemonic[len(stripped_mnemonic) :]
+
+
+def get_header(name: str) -> str:
+    # The header of a catalog command or query name is everything before its parameters
+    return name.strip().split(" ", 1)[0]
+
+
+def expand_header_variants(nodes: list[SyntaxNode]) -> list[list[SyntaxNode]]:
+    # Every spelling of a header: each optional group left in or out, and each enum option on its own
+    variants: list[list[SyntaxNode]] = [[]]
+    for node in nodes:
+        if type(node) is OptionalGroup:
+            options = [[]] + expand_header_variants(node.children)
+        elif type(node) is EnumGroup:
+            options = [
+                variant
+                for option in node.options
+                for variant in expand_header_variants(option)
+            ]
+        elif type(node) is Definition:
+            continue
+        else:
+            options = [[node]]
+        variants = [variant + option for variant in variants for option in options]
+    return variants
+
+
+def get_header_mnemonics(variant: list[SyntaxNode]) -> list[tuple[str, bool]]:
+    # (mnemonic, takes a numeric suffix) for each mnemonic of an expanded header variant
+    text = "".join(
+        node.text if type(node) is Literal else "\0" for node in variant
+    ).rstrip(QUERY_MARK)
+    return [
+        (part.replace("\0", ""), part.endswith("\0"))
+        for part in text.split(HEADER_SEPARATOR)
+        if part.replace("\0", "")
+    ]
+
+
+def get_concrete_header(name: str, numeric_suffix: str = "1") -> str:
+    # The shortest header a catalog name allows, with its variables filled in, e.g. ":CHANnel<n>:SCALe <scale>"
+    # gives ":CHANnel1:SCALe"
+    header = get_header(name)
+    variant = min(
+        expand_header_variants(parse_syntax(header)),
+        key=lambda variant: len(variant),
+    )
+    return "".join(
+        node.text if type(node) is Literal else numeric_suffix for node in variant
+    )
+
+
+class ScpiHeaderIndex:
+    # Finds the catalog entry a header sent to (or by) an instrument refers to, whatever spelling it uses, with a
+    # dict lookup on the short forms of its mnemonics. Commands and queries of the same setting share a key apart
+    # from the trailing "?".
+    def __init__(self):
+        self.values_by_key: dict[tuple[str, ...], object] = {}
+        # Every accepted spelling (short or long form, upper case) -> its short form
+        self.short_forms: dict[str, str] = {}
+
+    def add(self, name: str, value: object) -> None:
+        header = get_header(name)
+        is_query = header.endswith(QUERY_MARK)
+        for variant in expand_header_variants(parse_syntax(header)):
+            key = []
+            for mnemonic, _ in get_header_mnemonics(variant):
+                short_form = get_short_form(mnemonic)
+                self.short_forms.setdefault(short_form, short_form)
+                self.short_forms.setdefault(mnemonic.upper(), short_form)
+                key.append(short_form)
+            if is_query:
+                key.append(QUERY_MARK)
+            self.values_by_key.setdefault(tuple(key), value)
+
+    def find(self, header: str) -> tuple[object, tuple[str, ...]] | None:
+        # Returns the value added for the header, and the numeric suffix of each of its mnemonics ("" if none)
+        is_query = header.endswith(QUERY_MARK)
+        key = []
+        suffixes = []
+        for mnemonic in header.rstrip(QUERY_MARK).upper().split(HEADER_SEPARATOR):
+            if not mnemonic:
+                continue
+            # Mnemonics can end in digits of their own (e.g. X1Position), so the full spelling is tried first
+            if (short_form := self.short_forms.get(mnemonic)) is not None:
+                suffix = ""
+            else:
+                stripped_mnemonic = mnemonic.rstrip(DIGITS)
+                short_form = self.short_forms.get(stripped_mnemonic)
+                if short_form is None:
+                    return None
+                suffix = mnemonic[len(stripped_mnemonic) :]
+            key.append(short_form)
+            suffixes.append(suffix)
+        if is_query:
+            key.append(QUERY_MARK)
+        value = self.values_by_key.get(tuple(key))
+        if value is None:
+            return None
+        return value, tuple(suffixes)
+
+
+def split_outside_quotes(text: str, separator: str) -> list[str]:
+    # Splits at the separators that aren't inside a quoted string, stripping each part
+    if '"' not in text and "'" not in text:
+        parts = text.split(separator)
+    else:
+        parts = []
+        start = 0
+        quote = None
+        for index, character in enumerate(text):
+            if quote is not None:
+                if character == quote:
+                    quote = None
+            elif character in "\"'":
+                quote = character
+            elif character == separator:
+                parts.append(text[start:index])
+                start = index + 1
+        parts.append(text[start:])
+    return [part.strip() for part in parts]
+
+
+def split_program_message(message: str) -> list[str]:
+    # Splits a program message into its units, e.g. ":CHAN1:SCAL 1;OFFS 0"
+    return [unit for unit in split_outside_quotes(message, UNIT_SEPARATOR) if unit]
+
+
+def resolve_relative_headers(units: list[str]) -> list[str]:
+    # Within a program message, a unit that doesn't start with ":" continues from the path of the unit before it
+    # (its header up to the last colon), e.g. ":CHAN1:SCAL 1;OFFS 0" sets :CHAN1:OFFS. The first unit starts from
+    # the root, and common commands (*RST, *OPC?, ...) leave the path unchanged.
+    resolved_units = []
+    path = HEADER_SEPARATOR
+    for unit in units:
+        if unit.startswith("*"):
+            resolved_units.append(unit)
+            continue
+        if not unit.startswith(HEADER_SEPARATOR):
+            unit = path + unit
+        header = get_header(unit)
+        path = header[: header.rfind(HEADER_SEPARATOR) + 1]
+        resolved_units.append(unit)
+    return resolved_units
@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import logging
+
+from collections import deque
+from typing import Final, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Instruments speak SCPI over a raw TCP socket (port 5025 by convention): every program message ends with a newline,
+# and so does every response. Block responses (#<digit count><byte count><bytes>) can hold newlines in their data,
+# so they're read by their length instead.
+DEFAULT_PORT: Final = 5025
+DEFAULT_TIMEOUT: Final = 5.0
+MESSAGE_TERMINATOR: Final = b"\n"
+BLOCK_START: Final = b"#"
+# The longest response line the reader buffers, which ASCII waveform responses get close to
+READ_LIMIT: Final = 64 * 1024 * 1024
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    # "host" or "host:port"
+    host, _, port = address.rpartition(":")
+    if not host:
+        return address, DEFAULT_PORT
+    return host, int(port)
+
+
+class ScpiConnection:
+    # One socket connection to an instrument. Queries are pipelined: every query's response future joins a queue,
+    # and a single reader task hands the responses out in the order they arrive, so a batch of queries (from one or
+    # several coroutines) costs one round trip instead of one each. Commands sent with write() must not produce a
+    # response, or the responses would no longer line up with their queries.
+    def __init__(
+        self, host: str, port: int = DEFAULT_PORT, timeout: float = DEFAULT_TIMEOUT
+    ):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        self._pending: deque[asyncio.Future] = deque()
+        self._error: Exception | None = None
+
+    @property
+    def is_closed(self) -> bool:
+        return self._writer is None or self._error is not None
+
+    async def open(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=READ_LIMIT),
+            self.timeout,
+        )
+        self._error = None
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def close(self) -> None:
+        if self._writer is None:
+            return
+        self._fail(ConnectionError(f"Connection to {self.host}:{self.port} closed"))
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._writer = None
+
+    async def __aenter__(self) -> "ScpiConnection":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _fail(self, error: Exception) -> None:
+        # Once a response is lost or late, the ones after it can't be matched to their queries anymore, so every
+        # outstanding query fails and the connection can't be used again
+        if self._error is None:
+            self._error = error
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+        if self._writer is not None:
+            self._writer.close()
+
+    def _check_open(self) -> None:
+        if self._writer is None:
+            raise ConnectionError(f"Connection to {self.host}:{self.port} isn't open")
+        if self._error is not None:
+            raise ConnectionError(
+                f"Connection to {self.host}:{self.port} failed: {self._error}"
+            )
+
+    async def _read_response(self) -> bytes:
+        first_bytes = await self._reader.readexactly(1)
+        if first_bytes == MESSAGE_TERMINATOR:
+            return b""
+        if first_bytes == BLOCK_START:
+            next_byte = await self._reader.readexactly(1)
+            if next_byte.isdigit():
+                digit_count = int(next_byte)
+                if digit_count == 0:
+                    # Indefinite length blocks run up to the terminator
+                    return (await self._reader.readuntil(MESSAGE_TERMINATOR))[:-1]
+                byte_count = int(await self._reader.readexactly(digit_count))
+                # Definite length blocks only come back as their data
+                data = await self._reader.readexactly(byte_count)
+                await self._reader.readuntil(MESSAGE_TERMINATOR)
+                return data
+            if next_byte == MESSAGE_TERMINATOR:
+                return first_bytes
+            # Not a block, e.g. a #H1F hexadecimal number
+            first_bytes += next_byte
+        line = await self._reader.readuntil(MESSAGE_TERMINATOR)
+        return (first_bytes + line[:-1]).rstrip(b"\r")
+
+    async def _read_responses(self) -> None:
+        try:
+            while True:
+                response = await self._read_response()
+                if not self._pending:
+                    logger.warning(
+                        "Unexpected response from %s:%d: %r",
+                        self.host,
+                        self.port,
+                        response[:80],
+                    )
+                    continue
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(response)
+        except (
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+            ConnectionError,
+            ValueError,
+        ) as e:
+            self._fail(
+                ConnectionError(
+                    f"Lost the connection to {self.host}:{self.port}: {e!r}"
+                )
+            )
+
+    async def write(self, *messages: str) -> None:
+        # Sends program messages that don't have a response
+        self._check_open()
+        self._writer.write(
+            b"".join(
+                message.encode("ascii") + MESSAGE_TERMINATOR for message in messages
+            )
+        )
+        await self._writer.drain()
+
+    async def send_many_raw(self, messages: Iterable[tuple[str, bool]]) -> list[bytes]:
+        # Sends (program message, has a response) pairs in order, before waiting for the first response, and returns
+        # the responses of the messages that have one
+        self._check_open()
+        loop = asyncio.get_running_loop()
+        futures = []
+        encoded_messages = []
+        for message, has_response in messages:
+            if has_response:
+                future = loop.create_future()
+                futures.append(future)
+                self._pending.append(future)
+            encoded_messages.append(message.encode("ascii") + MESSAGE_TERMINATOR)
+        self._writer.write(b"".join(encoded_messages))
+        try:
+            await self._writer.drain()
+            if not futures:
+                return []
+            return await asyncio.wait_for(asyncio.gather(*futures), self.timeout)
+        except TimeoutError:
+            self._fail(
+                TimeoutError(
+                    f"{self.host}:{self.port} didn't answer within {self.timeout}s"
+                )
+            )
+            raise
+
+    async def query_many_raw(self, queries: Iterable[str]) -> list[bytes]:
+        # Sends every query before waiting for the first response
+        return await self.send_many_raw((query, True) for query in queries)
+
+    async def query_many(self, queries: Iterable[str]) -> list[str]:
+        return [
+            response.decode("ascii") for response in await self.query_many_raw(queries)
+        ]
+
+    async def query_raw(self, query: str) -> bytes:
+        return (await self.query_many_raw([query]))[0]
+
+    async def query(self, query: str) -> str:
+        return (await self.query_many([query]))[0]
+
+
+class ScpiConnectionPool:
+    # Keeps one connection per instrument, opened on first use and reopened after it failed, so a script talking to
+    # several instruments doesn't pay for a new connection per query. Queries to different instruments run
+    # concurrently, while the queries to one instrument still share its pipeline.
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.connections: dict[tuple[str, int], ScpiConnection] = {}
+        self._locks: dict[tuple[str, int], asyncio.Lock] = {}
+
+    async def get(self, host: str, port: int = DEFAULT_PORT) -> ScpiConnection:
+        address = (host, port)
+        async with self._locks.setdefault(address, asyncio.Lock()):
+            connection = self.connections.get(address)
+            if connection is None or connection.is_closed:
+                if connection is not None:
+                    await connection.close()
+                connection = ScpiConnection(host, port, self.timeout)
+                await connection.open()
+                self.connections[address] = connection
+        return connection
+
+    async def query_many(
+        self, host: str, port: int, queries: Iterable[str]
+    ) -> list[str]:
+        return await (await self.get(host, port)).query_many(queries)
+
+    async def query_instruments(
+        self, addresses: list[tuple[str, int]], queries: list[str]
+    ) -> list[list[str] | Exception]:
+        # Sends the same queries to every instrument at once, returning each instrument's responses (or error)
+        return await asyncio.gather(
+            *(self.query_many(host, port, queries) for host, port in addresses),
+            return_exceptions=True,
+        )
+
+    async def close(self) -> None:
+        for connection in self.connections.values():
+            await connection.close()
+        self.connections.clear()
+
+    async def __aenter__(self) -> "ScpiConnectionPool":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+async def run_queries(
+    addresses: list[str], queries: list[str], timeout: float
+) -> list[list[str] | Exception]:
+    async with ScpiConnectionPool(timeout) as pool:
+        return await pool.query_instruments(
+            [parse_address(address) for address in addresses], queries
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sends SCPI queries to one or more instruments over TCP, pipelined, and prints the responses."
+    )
+    parser.add_argument(
+        "addresses",
+        type=str,
+        nargs="+",
+        help="Instrument addresses as host or host:port (5025 by default).",
+    )
+    parser.add_argument(
+        "--query",
+        type=str,
+        action="append",
+        required=True,
+        help="A query to send, can be given several times.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Seconds to wait for the responses.",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(levelname)s %(name)s: %(message)s"
+    )
+    results = asyncio.run(run_queries(args.addresses, args.query, args.timeout))
+    is_failed = False
+    for address, responses in zip(args.addresses, results):
+        if isinstance(responses, Exception):
+            print(f"{address}: {responses}")
+            is_failed = True
+            continue
+        for query, response in zip(args.query, responses):
+            print(f"{address} {query} {response}")
+    if is_failed:
+        exit(1)
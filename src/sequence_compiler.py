@@ -0,0 +1,364 @@
+import argparse
+import json
+import os
+
+from dataclasses import asdict, dataclass, field
+from typing import Final
+
+from dotenv import load_dotenv
+
+from catalog_database import read_catalog_file
+from scpi_syntax import (
+    HEADER_SEPARATOR,
+    PARAMETER_SEPARATOR,
+    QUERY_MARK,
+    UNIT_SEPARATOR,
+    ScpiHeaderIndex,
+    expand_header_variants,
+    get_header,
+    get_header_mnemonics,
+    get_short_form,
+    parse_syntax,
+    resolve_relative_headers,
+    split_outside_quotes,
+    split_program_message,
+)
+from scpi_transport import ScpiConnection
+
+# A setup script is a list of program message units. Settings under the same root node (e.g. :TIMebase, or
+# :CHANnel1) can be coupled, like :TIMebase:SCALe and :TIMebase:RANGe, or :CHANnel1:PROBe and :CHANnel1:SCALe, so the
+# compiler only assumes settings under different root nodes are independent. A write is dropped when it sets the
+# value the setting already has, or when a later write replaces it before anything reads it, as long as nothing else
+# under its root node was written in between. Common commands (*RST, ...) and headers the catalog doesn't know could
+# change anything, so nothing is carried across them.
+SYNC_QUERY: Final = "*OPC?"
+DEFAULT_MAX_MESSAGE_BYTES: Final = 256
+SCRIPT_COMMENT: Final = "#"
+
+
+@dataclass
+class SequenceBatch:
+    # Program messages sent back to back, before waiting for any of their responses
+    messages: list[str] = field(default_factory=list)
+    # How many query units each message holds, *OPC? sync points included
+    query_counts: list[int] = field(default_factory=list)
+    # Which of the query units are *OPC? sync points rather than script queries, in the order they're sent
+    is_sync_point: list[bool] = field(default_factory=list)
+
+
+@dataclass
+class SequenceSummary:
+    units: int = 0
+    dropped_writes: int = 0
+    sync_points: int = 0
+    messages: int = 0
+    # A script sends each unit as a message of its own, and waits for it
+    script_round_trips: int = 0
+    # Batches are sent without waiting in between, except for the ones with responses
+    round_trips: int = 0
+    round_trips_saved: int = 0
+
+
+@dataclass
+class CompiledSequence:
+    batches: list[SequenceBatch]
+    summary: SequenceSummary
+
+
+@dataclass(slots=True)
+class SequenceUnit:
+    text: str
+    header: str
+    is_query: bool
+    # (catalog name, numeric suffixes), or None for common commands and unknown headers
+    setting: tuple[str, tuple[str, ...]] | None
+    # (short form, numeric suffix) of the setting's root node, e.g. ("CHAN", "1"), or None along with the setting
+    root: tuple[str, str] | None
+    parameters: tuple[str, ...]
+
+
+def parse_script_lines(lines: list[str]) -> list[str]:
+    # One program message per line, which can hold several units and relative headers. Blank lines and lines
+    # starting with # are skipped.
+    units = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith(SCRIPT_COMMENT):
+            continue
+        units.extend(resolve_relative_headers(split_program_message(line)))
+    return units
+
+
+class SequenceCompiler:
+    def __init__(
+        self, model_catalog: dict, max_message_bytes: int = DEFAULT_MAX_MESSAGE_BYTES
+    ):
+        self.max_message_bytes = max_message_bytes
+        self.header_index = ScpiHeaderIndex()
+        # Setting name -> the short form of its root node, the first mnemonic it can't leave out
+        self.root_nodes: dict[str, str] = {}
+        for command_definitions in model_catalog["Detailed Commands"].values():
+            for command_definition in command_definitions:
+                # The command and the query of a table row read and write the same setting
+                setting_name = (
+                    command_definition["command_name"]
+                    or command_definition["query_name"]
+                )
+                for name in (
+                    command_definition["command_name"],
+                    command_definition["query_name"],
+                ):
+                    if name:
+                        self.header_index.add(name, setting_name)
+                if setting_name:
+                    self.root_nodes[setting_name] = get_root_node(setting_name)
+
+    def parse_unit(self, unit: str) -> SequenceUnit:
+        header = get_header(unit)
+        is_query = header.endswith(QUERY_MARK)
+        setting = None
+        root = None
+        if not header.startswith("*") and (match := self.header_index.find(header)):
+            setting = match
+            root_node = self.root_nodes[match[0]]
+            header_path = header.rstrip(QUERY_MARK).upper()
+            mnemonics = [
+                mnemonic for mnemonic in header_path.split(HEADER_SEPARATOR) if mnemonic
+            ]
+            for mnemonic, suffix in zip(mnemonics, match[1]):
+                if (
+                    self.header_index.short_forms[
+                        mnemonic[: len(mnemonic) - len(suffix)]
+                    ]
+                    == root_node
+                ):
+                    root = (root_node, suffix)
+                    break
+            else:
+                root = (root_node, "")
+        parameters = tuple(
+            parameter.upper()
+            for parameter in split_outside_quotes(
+                unit[len(header) :].strip(), PARAMETER_SEPARATOR
+            )
+            if parameter
+        )
+        return SequenceUnit(unit, header, is_query, setting, root, parameters)
+
+    def drop_redundant_writes(
+        self, units: list[SequenceUnit]
+    ) -> tuple[list[SequenceUnit], int]:
+        is_dropped = [False] * len(units)
+        # Setting -> the index of its last write nothing has read since
+        unread_writes: dict[tuple, int] = {}
+        # Setting -> the parameters it was last set to, as far as the script shows
+        known_values: dict[tuple, tuple[str, ...]] = {}
+        # Root node -> the settings under it that have an entry above
+        settings_by_root: dict[tuple, set[tuple]] = {}
+        for index, unit in enumerate(units):
+            if unit.setting is None:
+                unread_writes.clear()
+                known_values.clear()
+                settings_by_root.clear()
+                continue
+            if unit.is_query:
+                unread_writes.pop(unit.setting, None)
+                continue
+            if known_values.get(unit.setting) == unit.parameters:
+                is_dropped[index] = True
+                continue
+            # The write could change any other setting under its root node, and the writes to them before it
+            # could change what it means
+            root_settings = settings_by_root.setdefault(unit.root, set())
+            for setting in root_settings:
+                if setting != unit.setting:
+                    unread_writes.pop(setting, None)
+                    known_values.pop(setting, None)
+            root_settings.clear()
+            if (previous_index := unread_writes.get(unit.setting)) is not None:
+                is_dropped[previous_index] = True
+            unread_writes[unit.setting] = index
+            known_values[unit.setting] = unit.parameters
+            root_settings.add(unit.setting)
+        return [
+            unit for unit, dropped in zip(units, is_dropped) if not dropped
+        ], is_dropped.count(True)
+
+    def compile(self, script_units: list[str]) -> CompiledSequence:
+        units, dropped_writes = self.drop_redundant_writes(
+            [self.parse_unit(unit) for unit in script_units]
+        )
+        summary = SequenceSummary(
+            units=len(script_units),
+            dropped_writes=dropped_writes,
+            script_round_trips=len(script_units),
+        )
+        batches = [SequenceBatch()]
+        message_units: list[str] = []
+        message_length = 0
+        message_query_count = 0
+        # Where the next relative header would start from, within the current message
+        path = None
+        # The root nodes of the writes sent since the last sync point, and whether any of them could have changed
+        # anything
+        unsynced_roots: set[tuple] = set()
+        has_unsynced_barrier = False
+
+        def end_message() -> None:
+            nonlocal message_units, message_length, message_query_count, path
+            if message_units:
+                batches[-1].messages.append(UNIT_SEPARATOR.join(message_units))
+                batches[-1].query_counts.append(message_query_count)
+            message_units = []
+            message_length = 0
+            message_query_count = 0
+            path = None
+
+        def add_unit(text: str, header: str, is_query: bool) -> None:
+            nonlocal message_length, message_query_count, path
+            # A unit in the same subsystem as the one before it can leave out the path they share
+            if (
+                path is not None
+                and not header.startswith("*")
+                and header.upper().startswith(path)
+            ):
+                unit_text = text[len(path) :]
+            else:
+                unit_text = text
+            if message_units and (
+                message_length + len(UNIT_SEPARATOR) + len(unit_text)
+                > self.max_message_bytes
+            ):
+                end_message()
+                unit_text = text
+            if message_units:
+                message_length += len(UNIT_SEPARATOR)
+            message_units.append(unit_text)
+            message_length += len(unit_text)
+            if is_query:
+                message_query_count += 1
+                batches[-1].is_sync_point.append(text == SYNC_QUERY)
+            # Common commands leave the path where it was
+            if not header.startswith("*"):
+                path = header[: header.rfind(HEADER_SEPARATOR) + 1].upper()
+
+        for unit in units:
+            if unit.is_query and (
+                has_unsynced_barrier
+                or unit.root in unsynced_roots
+                # Queries the catalog doesn't know could read anything
+                or (unit.setting is None and unsynced_roots)
+            ):
+                # The query has to see the writes before it applied, so they get confirmed before it's sent
+                add_unit(SYNC_QUERY, SYNC_QUERY, True)
+                end_message()
+                batches.append(SequenceBatch())
+                summary.sync_points += 1
+                unsynced_roots.clear()
+                has_unsynced_barrier = False
+            add_unit(unit.text, unit.header, unit.is_query)
+            if not unit.is_query:
+                if unit.setting is None:
+                    has_unsynced_barrier = True
+                else:
+                    unsynced_roots.add(unit.root)
+        end_message()
+        batches = [batch for batch in batches if batch.messages]
+        summary.messages = sum(len(batch.messages) for batch in batches)
+        summary.round_trips = sum(1 for batch in batches if any(batch.query_counts))
+        summary.round_trips_saved = summary.script_round_trips - summary.round_trips
+        return CompiledSequence(batches, summary)
+
+
+def get_root_node(name: str) -> str:
+    # The first mnemonic of the shortest spelling of a catalog name's header, e.g. CHAN for :CHANnel<n>:SCALe, and
+    # FREQ for [:SENSe]:FREQuency
+    variant = min(
+        expand_header_variants(parse_syntax(get_header(name))),
+        key=lambda variant: len(variant),
+    )
+    mnemonics = get_header_mnemonics(variant)
+    return get_short_form(mnemonics[0][0]) if mnemonics else ""
+
+
+async def run_compiled_sequence(
+    connection: ScpiConnection, compiled_sequence: CompiledSequence
+) -> list[str]:
+    # Returns the responses of the script's own queries, in order
+    responses = []
+    for batch in compiled_sequence.batches:
+        message_responses = await connection.send_many_raw(
+            (message, query_count > 0)
+            for message, query_count in zip(batch.messages, batch.query_counts)
+        )
+        query_responses = [
+            query_response
+            for response in message_responses
+            for query_response in split_outside_quotes(
+                response.decode("ascii"), UNIT_SEPARATOR
+            )
+        ]
+        responses.extend(
+            query_response
+            for query_response, is_sync_point in zip(
+                query_responses, batch.is_sync_point
+            )
+            if not is_sync_point
+        )
+    return responses
+
+
+async def run_script(connection: ScpiConnection, script_units: list[str]) -> list[str]:
+    # How setup scripts send units: one at a time, waiting for each write to complete with *OPC?
+    responses = []
+    for unit in script_units:
+        if get_header(unit).endswith(QUERY_MARK):
+            responses.append(await connection.query(unit))
+        else:
+            await connection.query(f"{unit}{UNIT_SEPARATOR}{SYNC_QUERY}")
+    return responses
+
+
+if __name__ == "__main__":
+    load_dotenv(".env")
+    parser = argparse.ArgumentParser(
+        description="Compiles a SCPI setup script (one program message per line) into as few round trips as possible."
+    )
+    parser.add_argument("script_file_path", type=str)
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="The catalog the script's commands come from.",
+        default=os.environ.get("OUTPUT_FILE_PATH") or "output.json",
+    )
+    parser.add_argument("--model-name", type=str, default=None)
+    parser.add_argument(
+        "--max-message-bytes",
+        type=int,
+        default=DEFAULT_MAX_MESSAGE_BYTES,
+        help="The longest program message to send, which should fit the instrument's input buffer.",
+    )
+    parser.add_argument(
+        "--output-file-path",
+        type=str,
+        default=None,
+        help="Writes the compiled program messages here, one per line, instead of printing them.",
+    )
+    args = parser.parse_args()
+    catalog = read_catalog_file(args.catalog, args.model_name)
+    _, model_catalog = next(iter(catalog.items()))
+    with open(args.script_file_path, "r", encoding="utf8") as f:
+        script_units = parse_script_lines(f.readlines())
+    compiled_sequence = SequenceCompiler(model_catalog, args.max_message_bytes).compile(
+        script_units
+    )
+    messages = [
+        message for batch in compiled_sequence.batches for message in batch.messages
+    ]
+    if args.output_file_path is not None:
+        with open(args.output_file_path, "w", encoding="utf8") as f:
+            f.writelines(f"{message}\n" for message in messages)
+    else:
+        for message in messages:
+            print(message)
+    print(json.dumps(asdict(compiled_sequence.summary), indent=4))
@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import logging
+import os
+
+from collections import deque
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Final
+
+from dotenv import load_dotenv
+
+from catalog_database import read_catalog_file
+from command_details import ReturnElement, get_response_variable
+from scpi_syntax import (
+    QUERY_MARK,
+    ScpiHeaderIndex,
+    get_header,
+    get_short_form,
+    resolve_relative_headers,
+    split_program_message,
+)
+from scpi_transport import DEFAULT_PORT, MESSAGE_TERMINATOR, READ_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Settings nobody has set yet answer with a placeholder of the type their catalog entry describes
+DEFAULT_RESPONSES: Final = {
+    ReturnElement.NR1_FORMAT.value: "1",
+    ReturnElement.NR3_FORMAT.value: "+1.00000E+00",
+    ReturnElement.QUOTED_STRING.value: '""',
+}
+UNKNOWN_DEFAULT_RESPONSE: Final = "0"
+NO_ERROR: Final = '+0,"No error"'
+UNDEFINED_HEADER_ERROR: Final = '-113,"Undefined header"'
+QUEUE_OVERFLOW_ERROR: Final = '-350,"Queue overflow"'
+ERROR_QUEUE_LENGTH: Final = 30
+ERROR_QUERIES: Final = {":SYST:ERR?", ":SYSTEM:ERROR?", ":SYST:ERR:NEXT?"}
+
+
+@dataclass
+class SimulatedSetting:
+    # One table row of the catalog, shared by its command and its query
+    name: str
+    default_response: str
+    # Accepted spelling of each enum value (upper case, long or short form) -> the short form the query answers with
+    enum_responses: dict[str, str] = field(default_factory=dict)
+
+
+def create_simulated_setting(command_definition: dict) -> SimulatedSetting:
+    name = command_definition["query_name"] or command_definition["command_name"]
+    variable = get_response_variable(command_definition)
+    if variable is None:
+        return SimulatedSetting(name, UNKNOWN_DEFAULT_RESPONSE)
+    _, value_type = variable
+    if isinstance(value_type, list):
+        enum_responses = {}
+        for value in value_type:
+            short_form = get_short_form(value)
+            enum_responses.setdefault(value.upper(), short_form)
+            enum_responses.setdefault(short_form, short_form)
+        default_response = (
+            get_short_form(value_type[0]) if value_type else UNKNOWN_DEFAULT_RESPONSE
+        )
+        return SimulatedSetting(name, default_response, enum_responses)
+    return SimulatedSetting(
+        name, DEFAULT_RESPONSES.get(value_type, UNKNOWN_DEFAULT_RESPONSE)
+    )
+
+
+class SimulatedScope:
+    # An instrument that accepts every command and query of a catalog, in any spelling the header allows. Commands
+    # store their parameters per numeric suffix (so :CHAN1:SCAL and :CHAN2:SCAL are separate settings), and queries
+    # answer with what was last set, or with a placeholder of the right type.
+    def __init__(self, model_name: str, model_catalog: dict):
+        self.model_name = model_name
+        self.header_index = ScpiHeaderIndex()
+        self.setting_count = 0
+        for command_definitions in model_catalog["Detailed Commands"].values():
+            for command_definition in command_definitions:
+                setting = create_simulated_setting(command_definition)
+                for name in (
+                    command_definition["command_name"],
+                    command_definition["query_name"],
+                ):
+                    if name:
+                        self.header_index.add(name, setting)
+                self.setting_count += 1
+        self.values: dict[tuple[int, tuple[str, ...]], str] = {}
+        self.errors: deque[str] = deque()
+
+    def add_error(self, error: str) -> None:
+        if len(self.errors) >= ERROR_QUEUE_LENGTH:
+            self.errors[-1] = QUEUE_OVERFLOW_ERROR
+            return
+        self.errors.append(error)
+
+    def handle_common_unit(self, header: str) -> str | None:
+        # IEEE 488.2 common commands, and the error queue
+        if header == "*IDN?":
+            return f"SIMULATED,{self.model_name},0,1.0"
+        if header == "*OPC?":
+            return "1"
+        if header == "*ESR?":
+            return "+0"
+        if header == "*RST":
+            self.values.clear()
+        elif header == "*CLS":
+            self.errors.clear()
+        elif header in ERROR_QUERIES:
+            return self.errors.popleft() if self.errors else NO_ERROR
+        return None
+
+    def handle_unit(self, unit: str) -> str | None:
+        header = get_header(unit)
+        upper_header = header.upper()
+        if upper_header.startswith("*") or upper_header in ERROR_QUERIES:
+            return self.handle_common_unit(upper_header)
+        match = self.header_index.find(header)
+        if match is None:
+            self.add_error(UNDEFINED_HEADER_ERROR)
+            return None
+        setting, suffixes = match
+        key = (id(setting), suffixes)
+        if header.endswith(QUERY_MARK):
+            return self.values.get(key, setting.default_response)
+        parameters = unit[len(header) :].strip()
+        self.values[key] = setting.enum_responses.get(parameters.upper(), parameters)
+        return None
+
+    def handle_message(self, message: str) -> str | None:
+        # The responses of every query in a message come back as one line, separated by semicolons
+        responses = []
+        for unit in resolve_relative_headers(split_program_message(message)):
+            response = self.handle_unit(unit)
+            if response is not None:
+                responses.append(response)
+        if not responses:
+            return None
+        return ";".join(responses)
+
+    async def serve_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        latency: float = 0.0,
+    ) -> None:
+        # Responses go out `latency` seconds after their message arrived, from a separate task, so messages that
+        # were sent back to back also get answered back to back, like over a link with that round trip time
+        responses: asyncio.Queue[tuple[float, bytes] | None] = asyncio.Queue()
+
+        async def send_responses() -> None:
+            while (item := await responses.get()) is not None:
+                due_time, response = item
+                if (delay := due_time - monotonic()) > 0:
+                    await asyncio.sleep(delay)
+                writer.write(response)
+                await writer.drain()
+
+        sender_task = asyncio.create_task(send_responses())
+        try:
+            while line := await reader.readline():
+                response = self.handle_message(line.decode("ascii").strip())
+                if response is not None:
+                    responses.put_nowait(
+                        (
+                            monotonic() + latency,
+                            response.encode("ascii") + MESSAGE_TERMINATOR,
+                        )
+                    )
+            responses.put_nowait(None)
+            await sender_task
+        except (ConnectionError, UnicodeDecodeError) as e:
+            logger.info("Closing a connection: %r", e)
+        except asyncio.CancelledError:
+            # The server is shutting down with the connection still open
+            pass
+        finally:
+            sender_task.cancel()
+            writer.close()
+
+    async def start_server(
+        self, host: str, port: int, latency: float = 0.0
+    ) -> asyncio.Server:
+        return await asyncio.start_server(
+            lambda reader, writer: self.serve_connection(reader, writer, latency),
+            host,
+            port,
+            limit=READ_LIMIT,
+        )
+
+
+def parse_command_line_args(env_filepath: str = ".env"):
+    load_dotenv(env_filepath)
+    parser = argparse.ArgumentParser(
+        description="Serves a simulated instrument over TCP, which answers the commands and queries of a catalog."
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        help="The catalog to simulate: a catalog database, NDJSON stream, or single or merged JSON catalog.",
+        default=os.environ.get("OUTPUT_FILE_PATH") or "output.json",
+    )
+    parser.add_argument(
+        "--model-name",
+        type=str,
+        help="The model to simulate, the first one in the catalog by default.",
+        default=None,
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="0 picks a free port, which gets printed once the server listens.",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="Delay every response by this long, to simulate a network round trip.",
+    )
+    return parser.parse_args()
+
+
+async def serve(args) -> None:
+    catalog = read_catalog_file(args.catalog, args.model_name)
+    model_name, model_catalog = next(iter(catalog.items()))
+    scope = SimulatedScope(model_name, model_catalog)
+    server = await scope.start_server(args.host, args.port, args.latency_ms / 1000)
+    host, port = server.sockets[0].getsockname()[:2]
+    logger.info(
+        "Simulating %s (%d commands) on %s:%d",
+        model_name,
+        scope.setting_count,
+        host,
+        port,
+    )
+    # The address goes to stdout on its own, for scripts that start the server on a free port
+    print(f"{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    args = parse_command_line_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(levelname)s %(name)s: %(message)s"
+    )
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,361 @@
+import argparse
+import logging
+import math
+import random
+
+from dataclasses import dataclass, field
+from typing import Final
+
+import pymupdf
+
+logger = logging.getLogger(__name__)
+
+# Letter sized pages, with the command tables laid out the same way as the real programmer manuals: a caption
+# line above a ruled three column table, whose first row is the "Command", "Query", "Options and Query Returns"
+# heading row
+PAGE_WIDTH: Final = 612
+PAGE_HEIGHT: Final = 792
+TABLE_CAPTION_Y: Final = 72
+TABLE_TOP: Final = 84
+TABLE_BOTTOM: Final = 740
+TABLE_COLUMNS: Final = [54, 214, 374, 558]
+ROW_HEIGHT: Final = 46
+ROWS_PER_TABLE_PAGE: Final = (TABLE_BOTTOM - TABLE_TOP) // ROW_HEIGHT - 1
+TABLE_FONT_SIZE: Final = 7
+BODY_FONT_SIZE: Final = 10
+COMMAND_TABLE_ROW: Final = ["Command", "Query", "Options and Query Returns"]
+
+SUBSYSTEMS: Final = [
+    "ACQuire",
+    "CHANnel<n>",
+    "DISPlay",
+    "EXTernal",
+    "FUNCtion",
+    "HARDcopy",
+    "MARKer",
+    "MEASure",
+    "MTESt",
+    "POD<n>",
+    "RECall",
+    "SAVE",
+    "SBUS",
+    "SEARch",
+    "SYSTem",
+    "TIMebase",
+    "TRIGger",
+    "WAVeform",
+    "WGEN",
+    "ZONE",
+]
+MNEMONICS: Final = [
+    "BANDwidth",
+    "COUNt",
+    "COUPling",
+    "DELay",
+    "FILTer",
+    "FORMat",
+    "HOLDoff",
+    "IMPedance",
+    "INVert",
+    "LABel",
+    "LEVel",
+    "MODE",
+    "OFFSet",
+    "POINts",
+    "POSition",
+    "PROBe",
+    "RANGe",
+    "REFerence",
+    "REJect",
+    "SCALe",
+    "SLOPe",
+    "SOURce",
+    "STATe",
+    "TYPE",
+    "UNITs",
+    "VERNier",
+    "WIDTh",
+    "WINDow",
+]
+ENUM_CHOICES: Final = [
+    ["AC", "DC", "GND"],
+    ["NORMal", "AVERage", "HRESolution", "PEAK"],
+    ["MAIN", "WINDow", "XY", "ROLL"],
+    ["POSitive", "NEGative", "EITHer", "ALTernate"],
+    ["BYTE", "WORD", "ASCii"],
+    ["LEFT", "CENTer", "RIGHt"],
+]
+CHANNEL_DEFINITION: Final = "<n> ::= 1 or 2; an integer in NR1 format"
+
+
+@dataclass
+class SyntheticCategory:
+    title: str
+    rows: list[tuple[str, str, str]] = field(default_factory=list)
+
+
+@dataclass
+class SyntheticManualSummary:
+    pdf_file_path: str
+    page_count: int
+    category_count: int
+    command_rows: int
+
+
+def build_command_row(
+    rng: random.Random, subsystem: str, mnemonic: str
+) -> tuple[str, str, str]:
+    # Mixes the syntax the builder has to cope with: named variables, nested and inline enums, variables used
+    # inside enum definitions, NR1/NR3/quoted returns, and command or query only rows
+    header = f":{subsystem}:{mnemonic}"
+    channel_definition = f" {CHANNEL_DEFINITION}" if "<n>" in subsystem else ""
+    row_type = rng.randrange(9)
+    if row_type == 0:
+        return (
+            f"{header} <value>",
+            f"{header}?",
+            f"<value> ::= {rng.choice(['volts', 'seconds', 'divisions'])} in NR3 format{channel_definition}",
+        )
+    if row_type == 1:
+        choices = " | ".join(rng.choice(ENUM_CHOICES))
+        return (
+            f"{header} <mode>",
+            f"{header}?",
+            f"<mode> ::= {{{choices}}}{channel_definition}",
+        )
+    if row_type == 2:
+        return (
+            f"{header} {{{{0 | OFF}} | {{1 | ON}}}}",
+            f"{header}?",
+            "<setting> ::= {0 | 1}",
+        )
+    if row_type == 3:
+        return (
+            f"{header} <count>",
+            f"{header}?",
+            f"<count> ::= 1 to {rng.choice([8, 256, 65536])} in NR1 format{channel_definition}",
+        )
+    if row_type == 4:
+        choices = rng.choice(ENUM_CHOICES)
+        return (
+            f"{header} {{{' | '.join(choices)}}}",
+            f"{header}?",
+            f"<return_value> ::= {{{' | '.join(choice[:4].upper() for choice in choices)}}}",
+        )
+    if row_type == 5:
+        return (
+            "n/a",
+            f"{header}?",
+            f"<return_value> ::= measured value in NR3 format{channel_definition}",
+        )
+    if row_type == 6:
+        return (f"{header}", "n/a", "n/a")
+    if row_type == 7:
+        return (
+            f"{header} <string>",
+            f"{header}?",
+            f"<string> ::= quoted ASCII string, up to {rng.choice([10, 32, 64])} characters",
+        )
+    return (
+        f"{header} <source>",
+        f"{header}?",
+        f"<source> ::= {{CHANnel<n> | EXTernal | LINE | WGEN}} {CHANNEL_DEFINITION}",
+    )
+
+
+def build_categories(
+    rng: random.Random, category_count: int, commands_per_category: int
+) -> list[SyntheticCategory]:
+    categories = []
+    for category_index in range(category_count):
+        subsystem = SUBSYSTEMS[category_index % len(SUBSYSTEMS)]
+        if category_index >= len(SUBSYSTEMS):
+            # Keeps every category name unique, and never a substring of another one
+            subsystem = f"{subsystem}{category_index // len(SUBSYSTEMS) + 1}X"
+        category = SyntheticCategory(title=f":{subsystem} Commands")
+        for command_index in range(commands_per_category):
+            mnemonic = MNEMONICS[command_index % len(MNEMONICS)]
+            if command_index >= len(MNEMONICS):
+                mnemonic = f"{mnemonic}{command_index // len(MNEMONICS) + 1}"
+            category.rows.append(build_command_row(rng, subsystem, mnemonic))
+        categories.append(category)
+    return categories
+
+
+def add_text_page(doc: pymupdf.Document, heading: str, lines: list[str]) -> None:
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_text((54, 72), heading, fontsize=14)
+    page.insert_textbox(
+        pymupdf.Rect(54, 96, PAGE_WIDTH - 54, PAGE_HEIGHT - 54),
+        "\n".join(lines),
+        fontsize=BODY_FONT_SIZE,
+    )
+
+
+def add_table_page(
+    doc: pymupdf.Document, caption: str, rows: list[tuple[str, str, str]]
+) -> None:
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_text((TABLE_COLUMNS[0], TABLE_CAPTION_Y), caption, fontsize=9)
+    for row_index, row in enumerate([tuple(COMMAND_TABLE_ROW)] + rows):
+        top = TABLE_TOP + row_index * ROW_HEIGHT
+        for column_index, cell in enumerate(row):
+            cell_rect = pymupdf.Rect(
+                TABLE_COLUMNS[column_index],
+                top,
+                TABLE_COLUMNS[column_index + 1],
+                top + ROW_HEIGHT,
+            )
+            page.draw_rect(cell_rect, color=(0, 0, 0), width=0.5)
+            page.insert_textbox(
+                cell_rect + (3, 3, -3, -3), cell, fontsize=TABLE_FONT_SIZE
+            )
+
+
+def filler_lines(rng: random.Random, topic: str, line_count: int) -> list[str]:
+    words = [
+        "the",
+        "oscilloscope",
+        "returns",
+        "setting",
+        "when",
+        "sent",
+        "measurement",
+        "channel",
+        "trigger",
+        "is",
+        "value",
+        "default",
+        "instrument",
+        "range",
+    ]
+    return [
+        f"{topic}: " + " ".join(rng.choice(words) for _ in range(12))
+        for _ in range(line_count)
+    ]
+
+
+def generate_synthetic_manual(
+    pdf_file_path: str,
+    page_count: int = 1000,
+    category_count: int = 20,
+    commands_per_category: int = 25,
+    model_name: str = "SYN1000A",
+    seed: int = 0,
+) -> SyntheticManualSummary:
+    rng = random.Random(seed)
+    categories = build_categories(rng, category_count, commands_per_category)
+    table_pages = sum(
+        math.ceil(len(category.rows) / ROWS_PER_TABLE_PAGE) for category in categories
+    )
+    # Introduction, chapter overview and error message pages always exist
+    minimum_pages = table_pages + 3
+    if page_count < minimum_pages:
+        raise ValueError(
+            f"{page_count} pages is too few, the command tables alone need {minimum_pages}"
+        )
+    command_rows = sum(len(category.rows) for category in categories)
+    spare_pages = page_count - minimum_pages
+    # Half of the spare pages describe individual commands, and the rest pad out the front and back matter
+    detail_pages = min(command_rows, spare_pages // 2)
+    front_pages = 1 + (spare_pages - detail_pages) // 2
+    back_pages = page_count - minimum_pages - detail_pages - (front_pages - 1) + 1
+
+    doc = pymupdf.open()
+    table_of_contents = [[1, "Introduction", 1]]
+    for page_index in range(front_pages):
+        add_text_page(
+            doc, "Introduction", filler_lines(rng, f"Getting started {page_index}", 30)
+        )
+    table_of_contents.append([1, "Commands by Subsystem", doc.page_count + 1])
+    add_text_page(
+        doc,
+        "Commands by Subsystem",
+        [category.title for category in categories],
+    )
+    detail_pages_left = detail_pages
+    for category_index, category in enumerate(categories):
+        table_of_contents.append([2, category.title, doc.page_count + 1])
+        first_table_page = doc.page_count + 1
+        for row_start in range(0, len(category.rows), ROWS_PER_TABLE_PAGE):
+            caption = f"Table {category_index + 1} {category.title} Summary"
+            if row_start:
+                caption += " (continued)"
+            add_table_page(
+                doc, caption, category.rows[row_start : row_start + ROWS_PER_TABLE_PAGE]
+            )
+        for command, query, return_description in category.rows:
+            title = (command if command != "n/a" else query).split(" ")[0]
+            if detail_pages_left == 0:
+                table_of_contents.append([3, title, first_table_page])
+                continue
+            table_of_contents.append([3, title, doc.page_count + 1])
+            # Detail pages mention commands and queries, but never hold the full table heading row
+            add_text_page(
+                doc,
+                title,
+                [
+                    f"Command Syntax: {command}",
+                    f"Query Syntax: {query}",
+                    f"Return Format: {return_description}",
+                ]
+                + filler_lines(rng, "Description", 12),
+            )
+            detail_pages_left -= 1
+    table_of_contents.append([1, "Error Messages", doc.page_count + 1])
+    for page_index in range(back_pages):
+        add_text_page(
+            doc, "Error Messages", filler_lines(rng, f"Error {-100 - page_index}", 30)
+        )
+    doc.set_toc(table_of_contents)
+    # Fixed metadata and document ID keep the output byte-identical for the same arguments
+    doc.set_metadata(
+        {
+            "title": f"{model_name} Programmer's Guide",
+            "subject": model_name,
+            "creator": "synthetic_manual.py",
+            "producer": "synthetic_manual.py",
+            "creationDate": "",
+            "modDate": "",
+        }
+    )
+    doc.save(pdf_file_path, garbage=3, deflate=True, no_new_id=True)
+    summary = SyntheticManualSummary(
+        pdf_file_path=pdf_file_path,
+        page_count=doc.page_count,
+        category_count=len(categories),
+        command_rows=command_rows,
+    )
+    doc.close()
+    logger.info(
+        "Generated %s with %d pages, %d categories and %d command rows",
+        pdf_file_path,
+        summary.page_count,
+        summary.category_count,
+        summary.command_rows,
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generates a synthetic programmer manual PDF, laid out like the real ones, for benchmarking."
+    )
+    parser.add_argument("pdf_file_path", type=str, help="The PDF file to write.")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--commands-per-category", type=int, default=25)
+    parser.add_argument("--model-name", type=str, default="SYN1000A")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(levelname)s %(name)s: %(message)s"
+    )
+    generate_synthetic_manual(
+        args.pdf_file_path,
+        args.pages,
+        args.categories,
+        args.commands_per_category,
+        args.model_name,
+        args.seed,
+    )
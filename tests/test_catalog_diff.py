@@ -0,0 +1,178 @@
+import json
+
+from catalog_diff import (
+    TableFingerprint,
+    TableFingerprintIndex,
+    TableFingerprintWriter,
+    diff_catalogs,
+    get_fingerprint_file_path,
+)
+from command_details import CommandDetails
+
+
+def make_command_definition(
+    command_name: str | None, query_name: str | None, return_description: str = ""
+) -> dict:
+    return {
+        "command_name": command_name,
+        "query_name": query_name,
+        "return_description": return_description,
+        "variable_list": [],
+    }
+
+
+def test_diff_catalogs():
+    old_model_catalog = {
+        "Detailed Commands": {
+            "Timebase": [
+                make_command_definition(":TIMebase:MODE <value>", ":TIMebase:MODE?"),
+                make_command_definition(":TIMebase:RANGe <range>", ":TIMebase:RANGe?"),
+                make_command_definition(None, ":TIMebase:POSition?", "time"),
+            ],
+            # The same row twice in a category, as manuals do when a table carries on over a page break
+            "Channel": [
+                make_command_definition(":CHANnel<n>:SCALe <scale>", None, "first"),
+                make_command_definition(":CHANnel<n>:SCALe <scale>", None, "second"),
+            ],
+        }
+    }
+    new_model_catalog = {
+        "Detailed Commands": {
+            "Timebase": [
+                make_command_definition(":TIMebase:MODE <value>", ":TIMebase:MODE?"),
+                make_command_definition(None, ":TIMebase:POSition?", "time in seconds"),
+                make_command_definition(":TIMebase:SCALe <scale>", ":TIMebase:SCALe?"),
+            ],
+            "Channel": [
+                make_command_definition(":CHANnel<n>:SCALe <scale>", None, "first"),
+                make_command_definition(":CHANnel<n>:SCALe <scale>", None, "changed"),
+                make_command_definition(":CHANnel<n>:SCALe <scale>", None, "third"),
+            ],
+        }
+    }
+    changelog = diff_catalogs(old_model_catalog, new_model_catalog)
+    assert changelog["summary"] == {
+        "old_commands": 5,
+        "new_commands": 6,
+        "added": 2,
+        "removed": 1,
+        "changed": 2,
+    }
+    assert changelog["added"] == [
+        {"category": "Timebase", "name": ":TIMebase:SCALe <scale>"},
+        {"category": "Channel", "name": ":CHANnel<n>:SCALe <scale>"},
+    ]
+    assert changelog["removed"] == [
+        {"category": "Timebase", "name": ":TIMebase:RANGe <range>"}
+    ]
+    assert changelog["changed"] == [
+        {
+            "category": "Timebase",
+            "name": ":TIMebase:POSition?",
+            "fields": {"return_description": {"old": "time", "new": "time in seconds"}},
+        },
+        {
+            "category": "Channel",
+            "name": ":CHANnel<n>:SCALe <scale>",
+            "fields": {"return_description": {"old": "second", "new": "changed"}},
+        },
+    ]
+
+
+def test_identical_catalogs_have_no_changes():
+    model_catalog = {
+        "Detailed Commands": {
+            "Timebase": [
+                make_command_definition(":TIMebase:MODE <value>", ":TIMebase:MODE?")
+            ]
+        }
+    }
+    changelog = diff_catalogs(model_catalog, model_catalog)
+    assert changelog["added"] == changelog["removed"] == changelog["changed"] == []
+
+
+def make_command_details(command_name: str, query_name: str) -> CommandDetails:
+    return CommandDetails(
+        has_variables_in_command=True,
+        has_inline_variables_in_command=False,
+        has_variables_in_query=False,
+        has_inline_variables_in_query=False,
+        command_variable_names=["value"],
+        query_variable_names=[],
+        variable_list=[{"value": ["MAIN", "WINDow", "XY", "ROLL"]}],
+        command_name=command_name,
+        query_name=query_name,
+        return_description="<value> ::= {MAIN | WINDow | XY | ROLL}",
+        is_implemented=True,
+    )
+
+
+def write_fingerprints(catalog_file_path: str) -> str:
+    fingerprint_file_path = get_fingerprint_file_path(catalog_file_path)
+    writer = TableFingerprintWriter(fingerprint_file_path)
+    writer.write_page(
+        11,
+        TableFingerprint(["Timebase"], "text-hash", "row-hash"),
+        [
+            (
+                "Timebase",
+                ":TIMebase:MODE <value>",
+                ":TIMebase:MODE?",
+                make_command_details(":TIMebase:MODE <value>", ":TIMebase:MODE?"),
+            )
+        ],
+    )
+    # Pages without a command table have no row hash
+    writer.write_page(12, TableFingerprint(["Timebase"], "other-text-hash"), [])
+    writer.close()
+    return fingerprint_file_path
+
+
+def test_fingerprint_round_trip(tmp_path):
+    fingerprint_file_path = write_fingerprints(str(tmp_path / "catalog.json"))
+    assert [path.name for path in tmp_path.iterdir()] == ["catalog.json.tables.ndjson"]
+    index = TableFingerprintIndex.load(fingerprint_file_path)
+    expected_commands = [
+        (
+            "Timebase",
+            ":TIMebase:MODE <value>",
+            ":TIMebase:MODE?",
+            make_command_details(":TIMebase:MODE <value>", ":TIMebase:MODE?"),
+        )
+    ]
+    assert index.find_by_text(TableFingerprint(["Timebase"], "text-hash")) == (
+        "row-hash",
+        expected_commands,
+    )
+    assert (
+        index.find_by_rows(TableFingerprint(["Timebase"], "changed-text", "row-hash"))
+        == expected_commands
+    )
+    assert index.find_by_text(TableFingerprint(["Timebase"], "other-text-hash")) == (
+        None,
+        [],
+    )
+    # Pages are only reused within the categories they could belong to
+    assert index.find_by_text(TableFingerprint(["Channel"], "text-hash")) is None
+    assert (
+        index.find_by_rows(TableFingerprint(["Timebase"], "text-hash", "other-rows"))
+        is None
+    )
+
+
+def test_fingerprints_of_another_parser_are_ignored(tmp_path):
+    fingerprint_file_path = write_fingerprints(str(tmp_path / "catalog.json"))
+    with open(fingerprint_file_path, "r", encoding="utf8") as f:
+        lines = f.readlines()
+    lines[0] = json.dumps({"parser_hash": "an older parser"}) + "\n"
+    with open(fingerprint_file_path, "w", encoding="utf8") as f:
+        f.writelines(lines)
+    assert TableFingerprintIndex.load(fingerprint_file_path) is None
+
+
+def test_missing_or_unreadable_fingerprints_are_ignored(tmp_path):
+    fingerprint_file_path = str(tmp_path / "catalog.json.tables.ndjson")
+    assert TableFingerprintIndex.load(fingerprint_file_path) is None
+    with open(fingerprint_file_path, "w", encoding="utf8") as f:
+        f.write("not json\n")
+    assert TableFingerprintIndex.load(fingerprint_file_path) is None
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+
+import pytest
+
+from catalog_database import connect_catalog_database, write_model_catalog
+from catalog_service import CatalogService
+
+POLL_INTERVAL = 0.02
+
+
+def make_model_catalog(command_name: str) -> dict:
+    return {
+        "Scope Queries": {"Timebase": [f"{command_name}?"]},
+        "Scope Commands": {"Timebase": [f"{command_name} <value>"]},
+        "Detailed Commands": {
+            "Timebase": [
+                {
+                    "has_variables_in_command": True,
+                    "has_inline_variables_in_command": False,
+                    "has_variables_in_query": False,
+                    "has_inline_variables_in_query": False,
+                    "command_variable_names": ["value"],
+                    "query_variable_names": [],
+                    "variable_list": [{"value": ["MAIN", "WINDow"]}],
+                    "command_name": f"{command_name} <value>",
+                    "query_name": f"{command_name}?",
+                    "return_description": "<value> ::= {MAIN | WINDow}",
+                    "is_implemented": True,
+                }
+            ]
+        },
+    }
+
+
+def write_catalog_database(database_file_path: str, command_name: str) -> None:
+    temporary_path = database_file_path + ".tmp"
+    connection = connect_catalog_database(temporary_path)
+    write_model_catalog(connection, "TEST1000A", make_model_catalog(command_name))
+    connection.commit()
+    connection.close()
+    os.replace(temporary_path, database_file_path)
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(POLL_INTERVAL)
+    return condition()
+
+
+def test_corrupt_catalog_keeps_snapshot_and_reloads_once_restored(tmp_path):
+    database_file_path = str(tmp_path / "catalog.db")
+    write_catalog_database(database_file_path, ":TIMebase:MODE")
+    service = CatalogService(database_file_path, POLL_INTERVAL)
+    service.start_watching()
+    try:
+        version = service.snapshot.version
+        with open(database_file_path, "wb") as f:
+            f.write(b"not a database" * 100)
+        # A few polls for the file to settle and the load to fail
+        time.sleep(POLL_INTERVAL * 10)
+        assert service.watcher.is_alive()
+        assert service.reloads == 0
+        assert service.snapshot.version == version
+        write_catalog_database(database_file_path, ":TIMebase:RANGe")
+        assert wait_until(lambda: service.reloads == 1)
+        assert service.watcher.is_alive()
+        assert service.snapshot.find_command("TEST1000A", ":TIM:RANG")
+    finally:
+        service.stop()
+
+
+@pytest.mark.parametrize(
+    "wrongly_shaped_catalog",
+    [
+        [1, 2],
+        {"TEST1000A": ["not", "a", "model"]},
+        {"TEST1000A": {"Detailed Commands": []}},
+        {"TEST1000A": {"Detailed Commands": {"Timebase": {}}}},
+        {"TEST1000A": {"Detailed Commands": {"Timebase": [1]}}},
+        {
+            "TEST1000A": {
+                "Detailed Commands": {
+                    "Timebase": [
+                        {"command_name": None, "query_name": None, "variable_list": [1]}
+                    ]
+                }
+            }
+        },
+    ],
+)
+def test_wrongly_shaped_json_catalog_keeps_snapshot(tmp_path, wrongly_shaped_catalog):
+    catalog_file_path = str(tmp_path / "catalog.json")
+    with open(catalog_file_path, "w", encoding="utf8") as f:
+        json.dump({"TEST1000A": make_model_catalog(":TIMebase:MODE")}, f)
+    service = CatalogService(catalog_file_path, POLL_INTERVAL)
+    service.start_watching()
+    try:
+        with open(catalog_file_path, "w", encoding="utf8") as f:
+            json.dump(wrongly_shaped_catalog, f)
+        time.sleep(POLL_INTERVAL * 10)
+        assert service.watcher.is_alive()
+        assert service.reloads == 0
+        with open(catalog_file_path, "w", encoding="utf8") as f:
+            json.dump({"TEST1000A": make_model_catalog(":TIMebase:RANGe")}, f)
+        assert wait_until(lambda: service.reloads == 1)
+    finally:
+        service.stop()
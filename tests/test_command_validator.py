@@ -0,0 +1,125 @@
+import pytest
+
+from command_validator import CommandValidator
+
+
+def make_command_definition(
+    command_name: str, query_name: str, return_description: str, variable_list: list
+) -> dict:
+    return {
+        "command_name": command_name,
+        "query_name": query_name,
+        "return_description": return_description,
+        "variable_list": variable_list,
+    }
+
+
+# Rows of the DSO5000 series catalog, a two channel scope
+MODEL_CATALOG = {
+    "Detailed Commands": {
+        "Channel": [
+            make_command_definition(
+                ":CHANnel<n>:SCALe <scale>[suffix]",
+                ":CHANnel<n>:SCALe?",
+                "<scale> ::= vertical units per division in NR3format <n> ::= 1 or 2; an integer in NR1 format",
+                [{"scale": "NR3"}, {"n": "NR1"}],
+            ),
+        ],
+        "Timebase": [
+            make_command_definition(
+                ":TIMebase:REFerence {LEFT | CENTer | RIGHt}",
+                ":TIMebase:REFerence?",
+                "<return_value> ::= {LEFT | CENT | RIGH}",
+                [{"INLINE_COMMAND_PARAMS": ["LEFT", "CENTer", "RIGHt"]}],
+            ),
+        ],
+        "Trigger": [
+            make_command_definition(
+                ":TRIGger:SOURce <source>",
+                ":TRIGger:SOURce?",
+                "<source> ::= {CHANnel<n> | EXTernal | LINE}<n> ::= 1 or 2 in NR1 format",
+                [{"source": ["CHANnel<n>", "EXTernal", "LINE"]}, {"n": "NR1"}],
+            ),
+        ],
+    }
+}
+
+
+@pytest.fixture
+def command_validator():
+    return CommandValidator(MODEL_CATALOG)
+
+
+@pytest.mark.parametrize(
+    "unit",
+    [
+        ":CHAN1:SCAL 0.5",
+        ":channel2:scale 500mV",
+        ":CHAN2:SCAL?",
+        ":TIM:REF CENT",
+        ":TRIG:SOUR CHAN2",
+        ":trigger:source channel1",
+        ":TRIG:SOUR EXT",
+    ],
+)
+def test_valid_units(command_validator, unit):
+    command_validator.validate(unit)
+
+
+@pytest.mark.parametrize(
+    "unit",
+    [
+        # Enum values that take a numeric suffix need one, in range
+        ":TRIG:SOUR CHAN",
+        ":TRIG:SOUR CHAN3",
+        ":TRIG:SOUR CHAN0",
+        ":TRIG:SOUR EXT1",
+        # And so do header mnemonics
+        ":CHAN:SCAL 0.5",
+        ":CHAN9:SCAL 0.5",
+        ":CHAN9:SCAL?",
+        # Mnemonics without a numeric suffix don't take one
+        ":TIM1:REF CENT",
+        ":CHAN1:SCAL1 0.5",
+        ":TIM:REF MIDDLE",
+        ":CHAN1:SCAL 0.5,1",
+    ],
+)
+def test_invalid_units(command_validator, unit):
+    with pytest.raises(ValueError):
+        command_validator.validate(unit)
+
+
+def test_format(command_validator):
+    assert (
+        command_validator.format(":CHANnel<n>:SCALe <scale>[suffix]", n=2, scale=0.5)
+        == ":CHANnel2:SCALe 0.5"
+    )
+    assert (
+        command_validator.format(":TRIGger:SOURce <source>", source="CHAN1")
+        == ":TRIGger:SOURce CHAN1"
+    )
+    assert (
+        command_validator.format(
+            ":TIMebase:REFerence {LEFT | CENTer | RIGHt}", value="LEFT"
+        )
+        == ":TIMebase:REFerence LEFT"
+    )
+
+
+@pytest.mark.parametrize(
+    "name, values",
+    [
+        (":CHANnel<n>:SCALe <scale>[suffix]", {"n": 3, "scale": 0.5}),
+        (":CHANnel<n>:SCALe <scale>[suffix]", {"n": "x", "scale": 0.5}),
+        (":CHANnel<n>:SCALe <scale>[suffix]", {"n": -1, "scale": 0.5}),
+        (":CHANnel<n>:SCALe <scale>[suffix]", {"scale": 0.5}),
+        (":CHANnel<n>:SCALe?", {"n": 0}),
+        (":TRIGger:SOURce <source>", {"source": "CHAN"}),
+        (":TRIGger:SOURce <source>", {"source": "CHAN3"}),
+        (":TIMebase:REFerence {LEFT | CENTer | RIGHt}", {"value": "UP"}),
+    ],
+)
+def test_format_rejects_invalid_values(command_validator, name, values):
+    with pytest.raises(ValueError):
+        command_validator.format(name, **values)
@@ -0,0 +1,131 @@
+import copy
+import json
+
+import pytest
+
+from compact_catalog import CompactCatalog, ColumnarCatalog
+
+
+def make_command_definition(
+    command_name: str | None,
+    query_name: str | None,
+    variable_list: list[dict],
+    return_description: str | None,
+) -> dict:
+    command_variable_names = [
+        name for variable in variable_list for name in variable if command_name
+    ]
+    return {
+        "has_variables_in_command": bool(command_variable_names),
+        "has_inline_variables_in_command": False,
+        "has_variables_in_query": False,
+        "has_inline_variables_in_query": False,
+        "command_variable_names": command_variable_names,
+        "query_variable_names": [],
+        "variable_list": variable_list,
+        "command_name": command_name,
+        "query_name": query_name,
+        "return_description": return_description,
+        "is_implemented": True,
+    }
+
+
+def make_model_catalog(detailed_commands: dict[str, list[dict]]) -> dict:
+    # The builders list a category's commands and queries in the same order as its detailed commands
+    return {
+        "Scope Queries": {
+            category: [
+                command_definition["query_name"]
+                for command_definition in command_definitions
+                if command_definition["query_name"] is not None
+            ]
+            for category, command_definitions in detailed_commands.items()
+        },
+        "Scope Commands": {
+            category: [
+                command_definition["command_name"]
+                for command_definition in command_definitions
+                if command_definition["command_name"] is not None
+            ]
+            for category, command_definitions in detailed_commands.items()
+        },
+        "Detailed Commands": detailed_commands,
+    }
+
+
+TIMEBASE_COMMANDS = [
+    make_command_definition(
+        ":TIMebase:MODE <value>",
+        ":TIMebase:MODE?",
+        [{"value": ["MAIN", "WINDow", "XY", "ROLL"]}],
+        "<value> ::= {MAIN | WINDow | XY | ROLL}",
+    ),
+    # Query-only rows have no command name
+    make_command_definition(
+        None, ":TIMebase:POSition?", [], "<pos> ::= time in seconds in NR3 format"
+    ),
+    make_command_definition(
+        ":TIMebase:REFerence {LEFT | CENTer | RIGHt}",
+        ":TIMebase:REFerence?",
+        [{"INLINE_COMMAND_PARAMS": ["LEFT", "CENTer", "RIGHt"]}],
+        None,
+    ),
+]
+CHANNEL_COMMANDS = [
+    make_command_definition(
+        ":CHANnel<n>:SCALe <scale>[suffix]",
+        ":CHANnel<n>:SCALe?",
+        [{"scale": "NR3"}, {"n": "NR1"}],
+        "<scale> ::= vertical units per division in NR3format <n> ::= 1 or 2; an integer in NR1 format",
+    ),
+    make_command_definition(
+        ":CHANnel<n>:COUPling <coupling>",
+        None,
+        [{"coupling": ["AC", "DC"]}, {"n": "NR1"}],
+        "<coupling> ::= {AC | DC} <n> ::= 1 or 2; an integerin NR1 format",
+    ),
+]
+# Models of a family share most of their records, and categories can come out of a manual empty
+CATALOG = {
+    "DSO5012A": make_model_catalog(
+        {"Timebase": TIMEBASE_COMMANDS, "Channel": CHANNEL_COMMANDS, "Marker": []}
+    ),
+    "DSO5014A": make_model_catalog(
+        {
+            "Timebase": TIMEBASE_COMMANDS,
+            "Channel": CHANNEL_COMMANDS
+            + [
+                make_command_definition(
+                    ":CHANnel<n>:INVert {{0 | OFF} | {1 | ON}}",
+                    ":CHANnel<n>:INVert?",
+                    [{"n": "NR1"}],
+                    "<n> ::= 1 to 4 in NR1 format",
+                )
+            ],
+        }
+    ),
+    "EMPTY1000A": make_model_catalog({}),
+}
+
+
+@pytest.mark.parametrize("catalog_class", [CompactCatalog, ColumnarCatalog])
+def test_catalog_converts_back(catalog_class):
+    # Each model gets its own copy, as read from a file, so sharing is up to the catalog
+    catalog = json.loads(json.dumps(CATALOG))
+    compact_catalog = catalog_class.from_catalog(copy.deepcopy(catalog))
+    assert compact_catalog.to_catalog() == catalog
+    for model_name, model_catalog in catalog.items():
+        assert compact_catalog.to_model_catalog(model_name) == model_catalog
+    # Key order matters to anything that writes the catalog back out
+    assert json.dumps(compact_catalog.to_catalog()) == json.dumps(catalog)
+
+
+def test_compact_catalog_shares_records_between_models():
+    compact_catalog = CompactCatalog.from_catalog(json.loads(json.dumps(CATALOG)))
+    first_model = compact_catalog.models["DSO5012A"]
+    second_model = compact_catalog.models["DSO5014A"]
+    assert first_model.get_commands("Timebase") == second_model.get_commands("Timebase")
+    for first_command, second_command in zip(
+        first_model.get_commands("Timebase"), second_model.get_commands("Timebase")
+    ):
+        assert first_command is second_command
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from response_decoder import decode_number_list, parse_fixed_width_numbers
+
+
+def decode_with_float(data: bytes) -> list[float]:
+    return [float(number) for number in data.split(b",")]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"+1.5,12.5",
+        b"-1.5,12.5",
+        b"+1.5,-2.5,33.5",
+        b"+1.0E+01,+2.0E101",
+        b"1.5,-2.5",
+        b"1.50,12.5",
+    ],
+)
+def test_mixed_width_records_match_float(data):
+    values = decode_number_list(data)
+    assert values.tolist() == decode_with_float(data)
+
+
+def test_mixed_width_records_fall_back():
+    assert parse_fixed_width_numbers(b"+1.5,12.5") is None
+    assert parse_fixed_width_numbers(b"+1.0E+01,+2.0E101") is None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"+1.23456789012345E-19,-9.87654321098765E-19",
+        b"+1.23456789012345E+29,-9.87654321098765E+29",
+        b"+4.94065645841247E-300,+1.79769313486231E+300",
+        b"+1.00000000000000E-22,+1.00000000000000E+22",
+        b"+1.2345678901234567E+05,+9.8765432109876543E-05",
+        b"0.1234567890123456789,0.9876543210987654321",
+    ],
+)
+def test_extreme_exponents_and_long_mantissas_match_float(data):
+    assert decode_number_list(data).tolist() == decode_with_float(data)
+
+
+def test_fixed_width_nr3_matches_float():
+    rng = np.random.default_rng(0)
+    values = rng.normal(scale=10.0 ** rng.integers(-15, 15, 2000))
+    data = ",".join(f"{value:+.5E}" for value in values).encode("ascii")
+    assert parse_fixed_width_numbers(data) is not None
+    assert decode_number_list(data).tolist() == decode_with_float(data)
+
+
+def test_fixed_width_space_sign():
+    assert decode_number_list(b"1.5, 2.5,-3.5").tolist() == [1.5, 2.5, -3.5]
+    assert parse_fixed_width_numbers(b" 1.5,+2.5,-3.5").tolist() == [1.5, 2.5, -3.5]
+
+
+def test_fixed_width_integers():
+    assert decode_number_list(b"+12,-34,+56", np.int64).tolist() == [12, -34, 56]
@@ -0,0 +1,181 @@
+import pytest
+
+from pdf_command_builder import parse_command_row
+from scpi_syntax import (
+    Definition,
+    EnumGroup,
+    Literal,
+    OptionalGroup,
+    ScpiHeaderIndex,
+    Variable,
+    find_first_enum,
+    get_concrete_header,
+    get_enum_values,
+    get_variable_names,
+    parse_syntax,
+    render_syntax,
+    split_variable_definitions,
+)
+
+
+@pytest.mark.parametrize(
+    "formatted_string",
+    [
+        ":CHANnel<n>:SCALe <scale>[suffix]",
+        ":CHANnel<n>:DISPlay {{0 | OFF} | {1 | ON}}",
+        ":TIMebase:REFerence {LEFT | CENTer | RIGHt}",
+        "[:SENSe]:FREQuency[:CW] {<freq> | MIN | [MAX | DEF]}",
+        "<source> ::= {CHANnel<n> | EXTernal | LINE}<n> ::= 1 or 2 in NR1 format",
+        ":TIMebase:RANGe <range_value>",
+    ],
+)
+def test_well_formed_syntax_renders_back_unchanged(formatted_string):
+    assert render_syntax(parse_syntax(formatted_string)) == formatted_string
+
+
+def test_nested_groups():
+    nodes = parse_syntax("[:SENSe]:FREQuency[:CW] {<freq> | MIN | [MAX | DEF]}")
+    assert nodes[0] == OptionalGroup([Literal(":SENSe")])
+    assert nodes[2] == OptionalGroup([Literal(":CW")])
+    enum_group = find_first_enum(nodes)
+    assert enum_group.options == [
+        [Variable("freq"), Literal(" ")],
+        [Literal(" MIN ")],
+        [Literal(" "), OptionalGroup([Literal("MAX | DEF")])],
+    ]
+    assert get_variable_names(nodes) == ["freq"]
+
+
+def test_nested_enums_are_flattened():
+    enum_group = find_first_enum(
+        parse_syntax(":CHANnel<n>:DISPlay {{0 | OFF} | {1 | ON}}")
+    )
+    assert get_enum_values(enum_group) == ["0", "OFF", "1", "ON"]
+
+
+def test_stray_closing_brackets_are_kept_as_text():
+    nodes = parse_syntax("<a> [b]] c} {x | [y}")
+    assert nodes == [
+        Variable("a"),
+        Literal(" "),
+        OptionalGroup([Literal("b")]),
+        Literal("] c} "),
+        # The "}" closes the enum, and the optional group left open inside it with it
+        EnumGroup([[Literal("x ")], [Literal(" "), OptionalGroup([Literal("y")])]]),
+    ]
+
+
+def test_unclosed_groups_end_with_the_string():
+    nodes = parse_syntax("[:X {A | B")
+    assert nodes == [
+        OptionalGroup([Literal(":X "), EnumGroup([[Literal("A ")], [Literal(" B")]])])
+    ]
+    assert get_enum_values(find_first_enum(nodes)) == ["A", "B"]
+
+
+def test_variables_used_inside_a_definition_stay_part_of_it():
+    nodes = parse_syntax(
+        "<source> ::= {CHANnel<n> | EXTernal | LINE}<n> ::= 1 or 2 in NR1 format"
+    )
+    assert sum(isinstance(node, Definition) for node in nodes) == 2
+    variable_definitions = split_variable_definitions(nodes)
+    assert [definition.name for definition in variable_definitions] == [
+        "source",
+        "n",
+    ]
+    assert get_enum_values(find_first_enum(variable_definitions[0].body)) == [
+        "CHANnel<n>",
+        "EXTernal",
+        "LINE",
+    ]
+    assert render_syntax(variable_definitions[1].body).strip() == "1 or 2 in NR1 format"
+
+
+def test_numeric_suffix_variables():
+    index = ScpiHeaderIndex()
+    index.add(":CHANnel<n>:SCALe <scale>[suffix]", "scale")
+    index.add(":CHANnel<n>:SCALe?", "scale query")
+    index.add("[:SENSe]:FREQuency[:CW] <freq>", "frequency")
+    assert index.find(":CHAN1:SCAL") == ("scale", ("1", ""))
+    assert index.find(":channel2:scale?") == ("scale query", ("2", ""))
+    assert index.find(":FREQ") == ("frequency", ("",))
+    assert index.find(":SENS:FREQ:CW") == ("frequency", ("", "", ""))
+    assert index.find(":CHAN1:RANG") is None
+    assert get_concrete_header(":CHANnel<n>:SCALe <scale>[suffix]") == ":CHANnel1:SCALe"
+    assert get_concrete_header("[:SENSe]:FREQuency[:CW] <freq>") == ":FREQuency"
+
+
+# Rows of the DSO5000 series catalog, and what the builder makes of them
+CATALOG_ROWS = [
+    (
+        (
+            ":TIMebase:MODE <value>",
+            ":TIMebase:MODE?",
+            "<value> ::= {MAIN | WINDow | XY | ROLL}",
+        ),
+        {
+            "command_variable_names": ["value"],
+            "query_variable_names": [],
+            "variable_list": [{"value": ["MAIN", "WINDow", "XY", "ROLL"]}],
+        },
+    ),
+    (
+        (
+            ":TIMebase:REFerence {LEFT | CENTer | RIGHt}",
+            ":TIMebase:REFerence?",
+            "<return_value> ::= {LEFT | CENT | RIGH}",
+        ),
+        {
+            "command_variable_names": [],
+            "query_variable_names": [],
+            "variable_list": [{"INLINE_COMMAND_PARAMS": ["LEFT", "CENTer", "RIGHt"]}],
+        },
+    ),
+    (
+        (
+            ":CHANnel<n>:SCALe <scale>[suffix]",
+            ":CHANnel<n>:SCALe?",
+            "<scale> ::= vertical units per division in NR3format <n> ::= 1 or 2; an integer in NR1 format",
+        ),
+        {
+            "command_variable_names": ["n", "scale"],
+            "query_variable_names": ["n"],
+            "variable_list": [{"scale": "NR3"}, {"n": "NR1"}],
+        },
+    ),
+    (
+        (
+            ":CHANnel<n>:DISPlay {{0 | OFF} | {1 | ON}}",
+            ":CHANnel<n>:DISPlay?",
+            "<n> ::= 1 or 2 in NR1 format <return_value> ::= {0| 1}",
+        ),
+        {
+            "command_variable_names": ["n"],
+            "query_variable_names": ["n"],
+            "variable_list": [{"n": "NR1"}],
+        },
+    ),
+    (
+        (
+            ":TRIGger:SOURce <source>",
+            ":TRIGger:SOURce?",
+            "<source> ::= {CHANnel<n> | EXTernal | LINE}<n> ::= 1 or 2 in NR1 format",
+        ),
+        {
+            "command_variable_names": ["source"],
+            "query_variable_names": [],
+            "variable_list": [
+                {"source": ["CHANnel<n>", "EXTernal", "LINE"]},
+                {"n": "NR1"},
+            ],
+        },
+    ),
+]
+
+
+@pytest.mark.parametrize("row, expected", CATALOG_ROWS)
+def test_catalog_rows(row, expected):
+    _, _, command_details = parse_command_row(*row)
+    for field_name, value in expected.items():
+        assert getattr(command_details, field_name) == value
+    assert command_details.is_implemented
@@ -0,0 +1,81 @@
+import pytest
+
+from sequence_compiler import SequenceCompiler, parse_script_lines
+
+
+def make_command_definition(command_name: str, query_name: str) -> dict:
+    return {
+        "command_name": command_name,
+        "query_name": query_name,
+        "return_description": "",
+        "variable_list": [],
+    }
+
+
+MODEL_CATALOG = {
+    "Detailed Commands": {
+        "Channel": [
+            make_command_definition(
+                ":CHANnel<n>:PROBe <attenuation>", ":CHANnel<n>:PROBe?"
+            ),
+            make_command_definition(
+                ":CHANnel<n>:SCALe <scale>[suffix]", ":CHANnel<n>:SCALe?"
+            ),
+        ],
+        "Timebase": [
+            make_command_definition(
+                ":TIMebase:RANGe <range_value>", ":TIMebase:RANGe?"
+            ),
+            make_command_definition(
+                ":TIMebase:SCALe <scale_value>", ":TIMebase:SCALe?"
+            ),
+        ],
+    }
+}
+
+
+def compile_units(script_lines: list[str]) -> list[str]:
+    compiled_sequence = SequenceCompiler(MODEL_CATALOG).compile(
+        parse_script_lines(script_lines)
+    )
+    return [
+        message for batch in compiled_sequence.batches for message in batch.messages
+    ]
+
+
+@pytest.mark.parametrize(
+    "script_lines, expected_messages",
+    [
+        # :TIMebase:SCALe changes :TIMebase:RANGe, so setting the range again isn't a no-op
+        (
+            [":TIM:RANG 1E-3", ":TIM:SCAL 1E-6", ":TIM:RANG 1E-3", ":TIM:RANG?"],
+            [":TIM:RANG 1E-3;SCAL 1E-6;RANG 1E-3;*OPC?", ":TIM:RANG?"],
+        ),
+        # The scale is in probe units, so the first probe setting can't be dropped
+        (
+            [":CHAN1:PROB 10;:CHAN1:SCAL 1;:CHAN1:PROB 1"],
+            [":CHAN1:PROB 10;SCAL 1;PROB 1"],
+        ),
+    ],
+)
+def test_coupled_writes_are_kept(script_lines, expected_messages):
+    assert compile_units(script_lines) == expected_messages
+
+
+def test_writes_under_other_root_nodes_are_dropped():
+    assert compile_units(
+        [
+            ":CHAN1:PROB 10",
+            ":TIM:RANG 1E-3",
+            ":CHAN2:SCAL 1",
+            ":CHAN1:PROB 10",
+            ":TIM:RANG 2E-3",
+        ]
+    ) == [":CHAN1:PROB 10;:CHAN2:SCAL 1;:TIM:RANG 2E-3"]
+
+
+def test_queries_sync_after_a_write_under_their_root_node():
+    assert compile_units([":TIM:SCAL 1E-6", ":CHAN1:SCAL?", ":TIM:RANG?"]) == [
+        ":TIM:SCAL 1E-6;:CHAN1:SCAL?;*OPC?",
+        ":TIM:RANG?",
+    ]